@@ -0,0 +1,151 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.Assets extension of Sphinx bundles and minifies the style sheets and
+scripts that the rosin extensions add from the `html_static_path`, e.g.
+`style/didactic.css` and `style/gui.css`. Each bundle is written to `_static`
+with the hash of its content in the file name, and the pages reference the
+bundle instead of the single files. A changed bundle gets a new file name, so
+deployed sites can serve the bundles with far-future cache headers.
+
+Example:
+`conf.py`
+```
+extensions = [
+    'rosin.assets',
+    'rosin.gui',
+]
+asset_bundling = True  # optional, disable to debug single files
+```
+
+A page that referenced `_static/style/didactic.css` and `_static/style/gui.css`
+before now references `_static/rosin.0123456789ab.min.css`.
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import glob
+import hashlib
+import os
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+from sphinx.application import Sphinx
+from sphinx.config import Config
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_PREFIX: str = 'rosin'
+STRING_PATTERN = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+URL_PATTERN = re.compile(r'url\(\s*(["\']?)(?!data:|[a-z]+://|/|#)([^"\')]+)\1'
+                         r'\s*\)')
+
+bundles: Dict[str, Tuple[str, str]] = {}
+
+
+def minify_css(content: str) -> str:
+    parts: List[str] = STRING_PATTERN.split(content)
+    # every odd part is a quoted string, which is kept as it is
+    for index in range(0, len(parts), 2):
+        part: str = re.sub(r'/\*.*?\*/', '', parts[index], flags=re.DOTALL)
+        part = re.sub(r'\s+', ' ', part)
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        part = re.sub(r':\s+', ':', part)
+        parts[index] = part.replace(';}', '}')
+
+    return ''.join(parts).strip()
+
+
+def minify_js(content: str) -> str:
+    # conservative, without parsing the scripts
+    return '\n'.join(line.strip() for line in content.splitlines()
+                     if line.strip() and not line.strip().startswith('//'))
+
+
+def relocate_css(content: str, file_name: str) -> str:
+    # the bundle is placed in the root of `_static` instead of a subdirectory
+    directory: str = os.path.dirname(file_name)
+    return URL_PATTERN.sub(
+        lambda match: 'url(%s%s%s)' % (match.group(1), os.path.normpath(
+            os.path.join(directory, match.group(2))).replace(os.sep, '/'),
+                                       match.group(1)),
+        content) if directory else content
+
+
+def find_static_file(config: Config, confdir: str, file_name: str) -> str:
+    for static_path in config.html_static_path:
+        full_file_name: str = os.path.join(confdir, static_path, file_name)
+        if os.path.isfile(full_file_name):
+            return full_file_name
+
+    return None
+
+
+def bundle(app: Sphinx, config: Config, extension: str,
+           files: List[Tuple[str, Dict[str, Any]]],
+           minify: Callable[[str], str]) -> None:
+    contents: List[str] = []
+    position: int = None
+    for index, (file_name, attributes) in reversed(list(enumerate(files))):
+        # only plain local files are bundled, not e.g. 'async' scripts
+        if '://' in file_name or not file_name.endswith(extension) or any(
+                key not in ['rel', 'type', 'priority'] for key in attributes):
+            continue
+        full_file_name: str = find_static_file(config, app.confdir, file_name)
+        if full_file_name is None:
+            logger.info("asset %s not found, removed from the pages"
+                        % file_name)
+        else:
+            with open(full_file_name, 'r', encoding='utf-8') as file:
+                content: str = file.read()
+            contents.insert(0, relocate_css(content, file_name)
+                            if extension == '.css' else content)
+        position = index
+        del files[index]
+
+    if position is None:
+        return
+
+    content: str = minify('\n'.join(contents))
+    digest: str = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    bundle_name: str = '%s.%s.min%s' % (BUNDLE_PREFIX, digest[:12], extension)
+    bundles[extension] = (bundle_name, content)
+    files.insert(position, (bundle_name, {}))
+
+
+def config_inited(app: Sphinx, config: Config) -> None:
+    bundles.clear()
+    if not config.asset_bundling:
+        return
+
+    bundle(app, config, '.css', app.registry.css_files, minify_css)
+    bundle(app, config, '.js', app.registry.js_files, minify_js)
+    # pages that reference an outdated bundle are written again
+    config.asset_bundles = sorted(name for name, _ in bundles.values())
+
+
+def build_finished(app: Sphinx, exception: Exception) -> None:
+    if exception is not None or app.builder.format != 'html' or not bundles:
+        return
+
+    static_directory: str = os.path.join(app.outdir, '_static')
+    os.makedirs(static_directory, exist_ok=True)
+    for extension, (bundle_name, content) in bundles.items():
+        for file_name in glob.glob(os.path.join(
+                static_directory, '%s.*.min%s' % (BUNDLE_PREFIX, extension))):
+            if os.path.basename(file_name) != bundle_name:
+                os.remove(file_name)
+        file_name: str = os.path.join(static_directory, bundle_name)
+        if not os.path.isfile(file_name):
+            with open(file_name, 'w', encoding='utf-8') as file:
+                file.write(content)
+
+
+def setup(app: Sphinx) -> None:
+    app.add_config_value('asset_bundling', True, 'html')
+    app.add_config_value('asset_bundles', [], 'html')
+    app.connect('config-inited', config_inited)
+    app.connect('build-finished', build_finished)
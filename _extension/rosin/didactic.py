@@ -39,10 +39,10 @@ While this text is shown normal, :strike:`this text will be crossed out`.
 
 __author__ = "Meeßen, Marcus"
 __copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
-__version__ = "1.5"
+__version__ = "1.6"
 
 import re
-from typing import Any, Dict, List, Tuple, Type, Match
+from typing import Any, Dict, List, Pattern, Tuple, Type, Match
 
 from docutils.nodes import Admonition, Element, General, Inline, Node, \
     TextElement, inline, title
@@ -56,6 +56,9 @@ from sphinx.errors import ExtensionError
 from sphinx.writers.html import HTMLTranslator
 from sphinx.writers.latex import LaTeXTranslator
 
+SELECTOR_PATTERN: Pattern = re.compile(
+    r'^(([ ]*)\.\. (level|scenario):: )([\n\w\- ]+)')
+
 
 # noinspection PyPep8Naming
 class strike(Inline, TextElement):
@@ -304,8 +307,8 @@ class Scenario(Only):
 
 def generate_expression(app: Sphinx, doc_name: str, directive: str,
                         original: str) -> str:
-    invalid_keywords: Match = re.search(r'(all|not|and|or|is|True|False|None)',
-                                        original)
+    invalid_keywords: Match = re.search(
+        r'\b(all|not|and|or|is|True|False|None)\b', original)
     if invalid_keywords is not None:
         raise ExtensionError("Invalid keyword '%s' in %s expression."
                              % (invalid_keywords.group(1), directive))
@@ -339,8 +342,7 @@ def process_selectors(app: Sphinx, doc_name, source: List[str]) -> None:
     line_groups: List[str] = re.split(r'(\n{2,})', source[0])
 
     for index, line_group in enumerate(line_groups):
-        line_groups[index]: str = re.sub(
-            r'^(([ ]*)\.\. (level|scenario):: )([\n\w\- ]+)',
+        line_groups[index]: str = SELECTOR_PATTERN.sub(
             lambda x: '%s%s\n%s   :raw: %s' % (x.group(1),
                                                generate_expression(app,
                                                                    doc_name,
@@ -360,7 +362,7 @@ def config_inited(_app, config: Config) -> None:
 
 def setup(app: Sphinx) -> None:
     if 'hex_hash' not in app.config:
-        app.add_config_value('hex_hash', None, 'env')
+        app.add_config_value('hex_hash', None, '')
     app.add_config_value('didactic_levels', {}, 'env')
     app.add_config_value('didactic_scenarios', {}, 'env')
 
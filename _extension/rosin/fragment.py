@@ -0,0 +1,172 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.Fragment extension of Sphinx splits the LaTeX output of a course into
+one standalone document per unit. Each of these fragments keeps the styling of
+`latex_elements`, but has neither a title page, a table of contents nor page
+numbers. A `fragments.json` file describes the order and the hierarchy of the
+fragments, which is used by `_script/latex_pipeline.py` to compile each fragment
+only once and to assemble the course PDF with a cover, a table of contents and
+continuous page numbers. The fragment of a unit with a toctree only contains its
+own content, and a unit with nothing but a title and toctrees, e.g. a generated
+index, becomes an entry of the table of contents without a fragment.
+
+Example:
+```
+sphinx-build -M latex . build/learner -D latex_fragments=1
+_script/latex_pipeline.py build/learner/latex
+```
+
+The footer of the course PDF shows the page number via `\\rosinpagenumber`,
+which is empty in the fragments and replaced by the assembled PDF.
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.1"
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Set
+
+from docutils import nodes
+from docutils.nodes import Element
+from sphinx import addnodes
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+
+MANIFEST: str = 'fragments.json'
+
+target: str = ''
+entries: List[Dict[str, Any]] = []
+
+
+def flatten(doc_name: str) -> str:
+    return re.sub(r'\W+', '_', doc_name)
+
+
+def is_enabled(app: Sphinx) -> bool:
+    return bool(app.config.latex_fragments) and app.builder.name == 'latex'
+
+
+def has_content(node: Element) -> bool:
+    """Returns if a document has more than its titles, toctrees, and meta data,
+    which the table of contents of the course PDF shows anyway."""
+    for child in node.children:
+        if isinstance(child, nodes.section):
+            if has_content(child):
+                return True
+        elif not (isinstance(child, (nodes.title, nodes.Invisible,
+                                     nodes.Special))
+                  or 'toctree-wrapper' in child.get('classes', [])):
+            return True
+
+    return False
+
+
+def collect_entries(env: BuildEnvironment) -> List[Dict[str, Any]]:
+    collected: List[Dict[str, Any]] = []
+    visited: Set[str] = {env.config.master_doc}
+
+    def visit(doc_name: str, level: int) -> None:
+        if doc_name in visited or doc_name not in env.all_docs:
+            return
+        visited.add(doc_name)
+        children: List[str] = env.toctree_includes.get(doc_name, [])
+        collected.append({
+            'doc_name': doc_name,
+            'title': env.titles[doc_name].astext(),
+            'level': level,
+            # documents that only structure the course become TOC entries
+            'fragment': (flatten(doc_name) if not children or has_content(
+                env.get_doctree(doc_name)) else None),
+        })
+        for child in children:
+            visit(child, level + 1)
+
+    # the entries of the main document include the required and mentioned
+    # documents, which are not listed as regular includes of its toctrees
+    for toc_tree in env.get_doctree(env.config.master_doc).traverse(
+            addnodes.toctree):
+        for _, reference in toc_tree['entries']:
+            visit(reference, 0)
+
+    return collected
+
+
+def builder_inited(app: Sphinx) -> None:
+    global target
+
+    if not is_enabled(app):
+        return
+
+    # the fragments replace the documents, so keep the name of the course PDF
+    target = os.path.splitext(app.config.latex_documents[0][1])[0]
+    app.builder.context['maketitle'] = ''
+    app.builder.context['tableofcontents'] = ''
+    app.builder.context['preamble'] = '\n'.join([
+        r'\newcommand{\rosinpagenumber}{}',  # numbered by the course PDF
+        app.builder.context['preamble'],
+        r'\setcounter{secnumdepth}{-1}',
+    ])
+
+
+def env_updated(app: Sphinx, env: BuildEnvironment) -> List[str]:
+    global entries
+
+    if not is_enabled(app):
+        return []
+
+    entries = collect_entries(env)
+    app.config.latex_documents = [
+        (entry['doc_name'], '%s.tex' % entry['fragment'], app.config.project,
+         app.config.author, 'manual')
+        for entry in entries
+        if entry['fragment'] is not None
+    ]
+    app.builder.init_document_data()
+
+    return []
+
+
+def doctree_resolved(app: Sphinx, doc_tree: Element, doc_name: str) -> None:
+    if not is_enabled(app) or not any(entry['doc_name'] == doc_name
+                                      and entry['fragment'] is not None
+                                      for entry in entries):
+        return
+
+    # the fragment of a document only keeps its own content, the documents of
+    # its toctrees, which were inlined by the builder, have their own fragments
+    for node in list(doc_tree.traverse(addnodes.start_of_file)):
+        node.parent.remove(node)
+
+
+def build_finished(app: Sphinx, exception: Exception) -> None:
+    manifest_file_name: str = os.path.join(app.outdir, MANIFEST)
+
+    if exception is not None or app.builder.name != 'latex':
+        return
+    elif not is_enabled(app):
+        # a former build of fragments must not be assembled again
+        if os.path.isfile(manifest_file_name):
+            os.remove(manifest_file_name)
+        return
+
+    with open(manifest_file_name, 'w') as file:
+        json.dump({
+            'target': target,
+            'title': app.config.project,
+            'author': app.config.author,
+            'release': app.config.release,
+            'tags': sorted(app.tags),
+            'entries': entries,
+        }, file, indent=2)
+
+
+def setup(app: Sphinx) -> None:
+    app.add_config_value('latex_fragments', False, '')
+    app.connect('builder-inited', builder_inited)
+    app.connect('env-updated', env_updated)
+    app.connect('doctree-resolved', doctree_resolved)
+    app.connect('build-finished', build_finished)
@@ -28,7 +28,7 @@ cursor.
 
 __author__ = "Meeßen, Marcus"
 __copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
-__version__ = "1.0"
+__version__ = "1.1"
 
 from typing import List, Dict, Tuple
 
@@ -88,15 +88,8 @@ class radio(Inline, TextElement):
 
 
 def visit_radio_html(self: HTMLTranslator, _node) -> None:
-    # noinspection SpellCheckingInspection
     self.body.append('<span class="gui-radio">'
-                     '<img src="data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0c'
-                     'DovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIyNCIgaGVpZ2h0PS'
-                     'IyNCIgdmlld0JveD0iMCAwIDI0IDI0Ij48cGF0aCBmaWxsPSJub25lIiB'
-                     'kPSJNMCAwaDI0djI0SDBWMHoiLz48cGF0aCBkPSJNMTIgMkM2LjQ4IDIg'
-                     'MiA2LjQ4IDIgMTJzNC40OCAxMCAxMCAxMCAxMC00LjQ4IDEwLTEwUzE3L'
-                     'jUyIDIgMTIgMnptMCAxOGMtNC40MiAwLTgtMy41OC04LThzMy41OC04ID'
-                     'gtOCA4IDMuNTggOCA4LTMuNTggOC04IDh6Ii8+PC9zdmc+"/>')
+                     '<span class="gui-icon gui-icon-radio"></span>')
 
 
 def depart_radio_html(self: HTMLTranslator, _node) -> None:
@@ -117,16 +110,8 @@ class radio_selected(Inline, TextElement):
 
 
 def visit_radio_selected_html(self: HTMLTranslator, _node) -> None:
-    # noinspection SpellCheckingInspection
     self.body.append('<span class="gui-radio">'
-                     '<img src="data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0c'
-                     'DovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIyNCIgaGVpZ2h0PS'
-                     'IyNCIgdmlld0JveD0iMCAwIDI0IDI0Ij48cGF0aCBmaWxsPSJub25lIiB'
-                     'kPSJNMCAwaDI0djI0SDBWMHoiLz48cGF0aCBkPSJNMTIgMkM2LjQ4IDIg'
-                     'MiA2LjQ4IDIgMTJzNC40OCAxMCAxMCAxMCAxMC00LjQ4IDEwLTEwUzE3L'
-                     'jUyIDIgMTIgMnptMCAxOGMtNC40MiAwLTgtMy41OC04LThzMy41OC04ID'
-                     'gtOCA4IDMuNTggOCA4LTMuNTggOC04IDh6Ii8+PGNpcmNsZSBjeD0iMTI'
-                     'iIGN5PSIxMiIgcj0iNSIvPjwvc3ZnPg=="/>')
+                     '<span class="gui-icon gui-icon-radio-selected"></span>')
 
 
 def depart_radio_selected_html(self: HTMLTranslator, _node) -> None:
@@ -147,15 +132,8 @@ class checkbox(Inline, TextElement):
 
 
 def visit_checkbox_html(self: HTMLTranslator, _node) -> None:
-    # noinspection SpellCheckingInspection
     self.body.append('<span class="gui-checkbox">'
-                     '<img src="data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0c'
-                     'DovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIyNCIgaGVpZ2h0PS'
-                     'IyNCIgdmlld0JveD0iMCAwIDI0IDI0Ij48cGF0aCBmaWxsPSJub25lIiB'
-                     'kPSJNMCAwaDI0djI0SDBWMHoiLz48cGF0aCBkPSJNMTkgNXYxNEg1VjVo'
-                     'MTRtMC0ySDVjLTEuMSAwLTIgLjktMiAydjE0YzAgMS4xLjkgMiAyIDJoM'
-                     'TRjMS4xIDAgMi0uOSAyLTJWNWMwLTEuMS0uOS0yLTItMnoiLz48L3N2Zz'
-                     '4="/>')
+                     '<span class="gui-icon gui-icon-checkbox"></span>')
 
 
 def depart_checkbox_html(self: HTMLTranslator, _node) -> None:
@@ -176,16 +154,9 @@ class checkbox_selected(Inline, TextElement):
 
 
 def visit_checkbox_selected_html(self: HTMLTranslator, _node) -> None:
-    # noinspection SpellCheckingInspection
     self.body.append('<span class="gui-checkbox">'
-                     '<img src="data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0c'
-                     'DovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIyNCIgaGVpZ2h0PS'
-                     'IyNCIgdmlld0JveD0iMCAwIDI0IDI0Ij48cGF0aCBmaWxsPSJub25lIiB'
-                     'kPSJNMCAwaDI0djI0SDBWMHoiLz48cGF0aCBkPSJNMTkgM0g1Yy0xLjEg'
-                     'MC0yIC45LTIgMnYxNGMwIDEuMS45IDIgMiAyaDE0YzEuMSAwIDItLjkgM'
-                     'i0yVjVjMC0xLjEtLjktMi0yLTJ6bTAgMTZINVY1aDE0djE0ek0xNy45OS'
-                     'A5bC0xLjQxLTEuNDItNi41OSA2LjU5LTIuNTgtMi41Ny0xLjQyIDEuNDE'
-                     'gNCAzLjk5eiIvPjwvc3ZnPg=="/>')
+                     '<span class="gui-icon gui-icon-checkbox-selected">'
+                     '</span>')
 
 
 def depart_checkbox_selected_html(self: HTMLTranslator, _node) -> None:
@@ -206,15 +177,9 @@ class checkbox_indeterminate(Inline, TextElement):
 
 
 def visit_checkbox_indeterminate_html(self: HTMLTranslator, _node) -> None:
-    # noinspection SpellCheckingInspection
     self.body.append('<span class="gui-checkbox">'
-                     '<img src="data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0c'
-                     'DovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIyNCIgaGVpZ2h0PS'
-                     'IyNCIgdmlld0JveD0iMCAwIDI0IDI0Ij48cGF0aCBmaWxsPSJub25lIiB'
-                     'kPSJNMCAwaDI0djI0SDB6Ii8+PHBhdGggZD0iTTE5IDNINWMtMS4xIDAt'
-                     'MiAuOS0yIDJ2MTRjMCAxLjEuOSAyIDIgMmgxNGMxLjEgMCAyLS45IDItM'
-                     'lY1YzAtMS4xLS45LTItMi0yem0wIDE2SDVWNWgxNHYxNHpNNyAxMWgxMH'
-                     'YySDd6Ii8+PC9zdmc+"/>')
+                     '<span class="gui-icon gui-icon-checkbox-indeterminate">'
+                     '</span>')
 
 
 def depart_checkbox_indeterminate_html(self: HTMLTranslator, _node) -> None:
@@ -260,14 +225,7 @@ def visit_dropdown_html(self: HTMLTranslator, _node) -> None:
 
 
 def depart_dropdown_html(self: HTMLTranslator, _node) -> None:
-    # noinspection SpellCheckingInspection
-    self.body.append('<img src="data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0c'
-                     'DovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIyNCIgaGVpZ2h0PS'
-                     'IyNCIgdmlld0JveD0iMCAwIDI0IDI0Ij48cGF0aCBvcGFjaXR5PSIuODc'
-                     'iIGZpbGw9Im5vbmUiIGQ9Ik0yNCAyNEgwVjBoMjR2MjR6Ii8+PHBhdGgg'
-                     'ZD0iTTE2LjU5IDguNTlMMTIgMTMuMTcgNy40MSA4LjU5IDYgMTBsNiA2I'
-                     'DYtNi0xLjQxLTEuNDF6Ii8+PC9zdmc+"/>'
-                     '</span>')
+    self.body.append('<span class="gui-icon gui-icon-dropdown"></span></span>')
 
 
 def visit_dropdown_latex(_self, _node) -> None:
@@ -302,7 +260,7 @@ class GUIDomain(Domain):
 
     # noinspection SpellCheckingInspection
     def resolve_any_xref(self, *args, **kwargs) -> List[Tuple[str, Node]]:
-        pass
+        return []
 
 
 def setup(app: Sphinx) -> None:
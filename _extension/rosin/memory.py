@@ -0,0 +1,254 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.Memory extension of Sphinx shows which extensions and data structures
+hold the memory of a build, and bounds the memory of builds of large catalogs.
+
+If `memory_snapshots` is enabled, the allocations are traced with `tracemalloc`
+and a snapshot is taken after each phase, i.e. after the configuration with the
+pre-scan of rosin.Meta, after the builder was initialized, after reading, and
+after writing. Every allocation is assigned to the innermost extension on its
+traceback, e.g. a node created by docutils for a directive of rosin.Didactic
+counts for `rosin.didactic`. The report lists the memory of each extension, its
+growth during the phase, the largest allocation sites, and the deep size of the
+data kept by the environment and by rosin.Meta. It is logged and written to
+`memory_<builder>.txt` next to the doctree directory.
+
+If `memory_batch_size` is set, the documents are read and written in batches of
+this size, and the doctrees of a batch are released before the next one, e.g.
+the doctrees in reference cycles, which are otherwise kept until the garbage
+collector runs by itself.
+
+Example:
+`conf.py`
+```
+extensions = [
+    'rosin.memory',
+]
+memory_snapshots = True  # optional, or `-D memory_snapshots=1`
+memory_batch_size = 100  # optional, or `-D memory_batch_size=100`
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import gc
+import os
+import resource
+import sys
+import tracemalloc
+from typing import Any, Callable, Dict, List, Set, Tuple, Union
+
+from sphinx.application import Sphinx
+from sphinx.util import logging
+
+from rosin.profiler import table
+
+logger = logging.getLogger(__name__)
+
+TRACEBACK_FRAMES: int = 16
+TOP_SITES: int = 10
+TOP_STRUCTURES: int = 15
+MEBIBYTE: int = 1024 * 1024
+PACKAGES: List[str] = ['sphinx', 'docutils', 'pygments', 'jinja2']
+META_STRUCTURES: List[str] = ['units', 'unused_docs', 'required_docs',
+                              'mentioned_docs', 'providers', 'referenced_by']
+# attributes of the environment that refer to the application
+SKIPPED_ATTRIBUTES: List[str] = ['app', 'config', 'domains', 'events',
+                                 'project', 'settings']
+
+snapshots: List[Tuple[str, tracemalloc.Snapshot, Dict[str, int]]] = []
+
+
+def owner(frames: tracemalloc.Traceback) -> str:
+    """Returns the extension or package that caused an allocation."""
+    package: Union[str, None] = None
+    for frame in reversed(frames):  # innermost frame first
+        parts: List[str] = frame.filename.replace(os.sep, '/').split('/')
+        if 'rosin' in parts[:-1]:
+            return 'rosin.%s' % os.path.splitext(parts[-1])[0]
+        # the builders and events of Sphinx call the extensions, e.g. the
+        # reread of rosin.Meta reads all documents
+        if 'sphinx' in parts[:-1] and ('builders' in parts
+                                       or parts[-1] == 'events.py'):
+            break
+        # frames of the standard library are skipped, e.g. `re` for a pattern
+        # compiled by an extension
+        if package is None:
+            package = next((name for name in PACKAGES if name in parts[:-1]),
+                           None)
+
+    return package or 'python'
+
+
+def deep_size(value: Any, seen: Set[int]) -> int:
+    size: int = 0
+    pending: List[Any] = [value]
+    while pending:
+        item: Any = pending.pop()
+        if id(item) in seen or isinstance(item, (type, type(sys))) \
+                or callable(item):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending += item.keys()
+            pending += item.values()
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            pending += item
+        elif not isinstance(item, (str, bytes, int, float)):
+            pending += getattr(item, '__dict__', {}).values()
+            pending += [getattr(item, name) for name
+                        in getattr(type(item), '__slots__', [])
+                        if hasattr(item, name)]
+
+    return size
+
+
+def structure_sizes(app: Sphinx) -> Dict[str, int]:
+    # the application and the environment are only entry points
+    seen: Set[int] = {id(app), id(app.env), id(app.config), id(app.builder)}
+    sizes: Dict[str, int] = {}
+    for name, value in vars(app.env).items():
+        if name not in SKIPPED_ATTRIBUTES:
+            sizes['env.%s' % name] = deep_size(value, seen)
+    meta: Any = sys.modules.get('rosin.meta')
+    for name in META_STRUCTURES if meta is not None else []:
+        sizes['rosin.meta.%s' % name] = deep_size(getattr(meta, name), seen)
+
+    return sizes
+
+
+def take_snapshot(app: Sphinx, phase: str) -> None:
+    if tracemalloc.is_tracing():
+        gc.collect()  # only count what is still reachable
+        snapshots.append((phase, tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ]), structure_sizes(app) if app.env is not None else {}))
+
+
+def report() -> List[str]:
+    lines: List[str] = []
+    previous: Dict[str, int] = {}
+    for phase, snapshot, sizes in snapshots:
+        owners: Dict[str, List[int]] = {}
+        for statistic in snapshot.statistics('traceback'):
+            counters: List[int] = owners.setdefault(
+                owner(statistic.traceback), [0, 0])
+            counters[0] += statistic.size
+            counters[1] += statistic.count
+        total: int = sum(size for size, _ in owners.values())
+        lines += ["Memory after %s: %.1f MiB traced" % (phase,
+                                                         total / MEBIBYTE), '']
+        lines += table("By extension",
+                       ['', 'MiB', 'growth MiB', 'blocks'],
+                       [[name, '%.2f' % (size / MEBIBYTE),
+                         '%+.2f' % ((size - previous.get(name, 0))
+                                    / MEBIBYTE), count]
+                        for name, (size, count) in sorted(
+                            owners.items(), key=lambda item: -item[1][0])])
+        lines += table("Largest allocation sites",
+                       ['', 'MiB', 'blocks'],
+                       [['%s:%d' % (statistic.traceback[0].filename,
+                                    statistic.traceback[0].lineno),
+                         '%.2f' % (statistic.size / MEBIBYTE),
+                         statistic.count]
+                        for statistic
+                        in snapshot.statistics('lineno')[:TOP_SITES]])
+        if sizes:
+            lines += table("Largest data structures",
+                           ['', 'MiB'],
+                           [[name, '%.2f' % (size / MEBIBYTE)]
+                            for name, size in sorted(
+                                sizes.items(),
+                                key=lambda item: -item[1])[:TOP_STRUCTURES]])
+        previous = {name: size for name, (size, _) in owners.items()}
+
+    return lines
+
+
+def release(app: Sphinx) -> None:
+    # the writer keeps the last document and its translator
+    writer: Any = getattr(app.builder, 'docwriter', None)
+    for attribute in ['document', 'visitor']:
+        if getattr(writer, attribute, None) is not None:
+            setattr(writer, attribute, None)
+    gc.collect()
+
+
+def batched(app: Sphinx, function: Callable) -> Callable:
+    def wrapper(docnames, *args, **kwargs) -> None:
+        docnames = list(docnames)
+        size: int = app.config.memory_batch_size
+        for start in range(0, len(docnames), size):
+            function(docnames[start:start + size], *args, **kwargs)
+            release(app)
+
+    return wrapper
+
+
+def config_inited(app: Sphinx, _config) -> None:
+    if app.config.memory_snapshots and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEBACK_FRAMES)
+
+
+def builder_inited(app: Sphinx) -> None:
+    if app.config.memory_batch_size > 0:
+        # the documents of the reread of rosin.Meta are batched as well
+        for method in ['_read_serial', '_read_parallel', '_write_serial',
+                       '_write_parallel']:
+            setattr(app.builder, method,
+                    batched(app, getattr(app.builder, method)))
+
+
+def build_finished(app: Sphinx, exception: Exception) -> None:
+    if not snapshots:
+        return
+
+    lines: List[str] = report() + [
+        "Maximum resident set size: %.1f MiB"
+        % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)]
+    del snapshots[:]
+    tracemalloc.stop()
+    if exception is not None:
+        return
+
+    file_name: str = os.path.join(app.doctreedir, os.pardir,
+                                  'memory_%s.txt' % app.builder.name)
+    with open(file_name, 'w') as file:
+        file.write('\n'.join(lines))
+    for line in lines:
+        logger.info(line)
+    logger.info("memory report written to %s" % os.path.relpath(file_name))
+
+
+def configured(app: Sphinx, _config) -> None:
+    take_snapshot(app, 'configuration')
+
+
+def initialized(app: Sphinx) -> None:
+    take_snapshot(app, 'builder initialization')
+
+
+def read(app: Sphinx, _env) -> None:
+    take_snapshot(app, 'reading')
+
+
+def written(app: Sphinx, _exception: Exception) -> None:
+    take_snapshot(app, 'writing')
+
+
+def setup(app: Sphinx) -> None:
+    app.add_config_value('memory_snapshots', False, '')
+    app.add_config_value('memory_batch_size', 0, '')
+    # tracing starts before and the snapshots are taken after the handlers of
+    # the other extensions
+    app.connect('config-inited', config_inited, priority=0)
+    app.connect('config-inited', configured, priority=1000)
+    app.connect('builder-inited', builder_inited, priority=0)
+    app.connect('builder-inited', initialized, priority=1000)
+    app.connect('env-updated', read, priority=1000)
+    app.connect('build-finished', written, priority=0)
+    app.connect('build-finished', build_finished, priority=1000)
@@ -31,6 +31,19 @@ tags.add('my_document')
 -  `:unit-provides:` is automatically generated from the glossary and program
     entries that were defined in the document
 
+A document that references a term, program, or option of another document is
+written again if this descriptor was added, removed, or moved to another
+document since the builder wrote its output the last time, e.g. if a term was
+added to the glossary. The descriptors of each output are kept next to the
+doctree directory in `providers_<builder>.json`, so this also holds if the
+doctrees were read by another builder in between. Other changes of a glossary,
+e.g. of a definition, leave the referencing documents untouched, as their links
+stay the same.
+
+The meta data of all documents of the course, including the levels and
+scenarios of each unit, and the tags of the build are written to `units.json`
+in the doctree directory, e.g. for the search service.
+
 Known Issues:
 -  A document that has been removed once will not show up in TOCs anymore even
    if it has been added again. The current workaround is to delete the build
@@ -39,11 +52,14 @@ Known Issues:
 
 __author__ = "Meeßen, Marcus"
 __copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
-__version__ = "2.0"
+__version__ = "2.4"
 
+import json
 import os
 import re
-from typing import Dict, List, Match, Set, Union
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Match, Set, Tuple, \
+    Union
 
 from docutils.nodes import Node, Text, document, inline, option, reference, \
     strong, term
@@ -52,18 +68,45 @@ from docutils.parsers.rst.directives.body import Sidebar
 from sphinx import addnodes
 from sphinx.application import Sphinx
 from sphinx.config import Config
+from sphinx.environment import BuildEnvironment
 from sphinx.errors import ExtensionError
 from sphinx.util import logging
 
 UNIT_TYPE: Set[str] = {'lecture', 'tutorial', 'workshop', 'narrative'}
 UNIT_INTERACTION: Set[str] = {'theory', 'mixed', 'practice'}
 UNIT_DURATION_LEVEL: Set[str] = {'all', 'beginner', 'intermediate', 'advanced'}
+UNITS_FILE: str = 'units.json'
+PROVIDERS_FILE: str = 'providers_%s.json'
 
 logger = logging.getLogger(__name__)
 
 unused_docs: Set[str] = set()
 required_docs: Set[str] = set()
 mentioned_docs: Set[str] = set()
+units: Dict[str, 'Unit'] = {}
+# the descriptors provided by the documents of the course, and the documents
+# referencing each descriptor
+providers: Dict[str, str] = {}
+referenced_by: Dict[str, Set[str]] = {}
+
+
+class Unit(object):
+    """The meta data of a document, compact for catalogs of many units."""
+    __slots__ = ['type', 'interaction', 'durations', 'requires', 'mentions',
+                 'provides', 'levels', 'scenarios']
+
+    def __init__(self):
+        self.type: Union[str, None] = None
+        self.interaction: Union[str, None] = None
+        self.durations: Dict[str, int] = {}
+        self.requires: List[str] = []
+        self.mentions: List[str] = []
+        self.provides: List[str] = []
+        self.levels: List[str] = []
+        self.scenarios: List[str] = []
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.__slots__}
 
 
 class MetaDoc(object):
@@ -73,22 +116,18 @@ class MetaDoc(object):
         app.env.found_docs.difference_update(unused_docs)
 
     @staticmethod
-    def config_inited(app: Sphinx, config: Config) -> None:
-        global unused_docs, required_docs, mentioned_docs
-
-        found_docs: List[str] = []
-        for root, _, files in os.walk(os.curdir):
-            for file in files:
-                if file.endswith(".rst"):
-                    found_docs.append(os.path.splitext(os.path.relpath(
-                        os.path.join(root, file), start=os.curdir))[0])
-
-        # collect meta data
+    def scan(found_docs: List[str]) -> Tuple[Dict[str, Unit],
+                                             Dict[str, Set[str]],
+                                             Dict[str, Set[str]],
+                                             Dict[str, str]]:
+        """Parses the meta data of all documents, independent of a course."""
+        # collect meta data, the names of documents and descriptors are
+        # interned, as they are repeated in the maps of all references
+        scanned: Dict[str, Unit] = {}
         required_by: Dict[str, Set[str]] = {}
         mentioned_by: Dict[str, Set[str]] = {}
         provided_by: Dict[str, str] = {}
-        course_docs: Set[str] = set()
-        for doc in found_docs:
+        for doc in map(sys.intern, found_docs):
             filename: str = '%s.rst' % doc
 
             if not os.path.isfile(filename):
@@ -97,26 +136,34 @@ class MetaDoc(object):
                                "extension." % filename)
                 continue
 
-            if config.hex_hash(doc) in app.tags:
-                course_docs.add(doc)
-
             provided_by[doc] = doc
+            unit: Unit = Unit()
+            scanned[doc] = unit
 
             def new_provided_by(doc_name: str, value: str):
+                value = sys.intern(value)
                 if value in provided_by and doc_name != provided_by[value]:
                     logger.warning("Document '%s' provides '%s' which is "
                                    "already done by '%s'."
                                    % (doc_name, value, provided_by[value]))
                 else:
                     provided_by[value] = doc
+                    if value not in scanned[doc_name].provides:
+                        scanned[doc_name].provides.append(value)
 
             def new_required_by(doc_name: str, value: str):
+                value = sys.intern(value)
                 required_by.setdefault(value, set())
                 required_by[value].add(doc_name)
+                if value not in scanned[doc_name].requires:
+                    scanned[doc_name].requires.append(value)
 
             def new_mentioned_by(doc_name: str, value: str):
+                value = sys.intern(value)
                 mentioned_by.setdefault(value, set())
                 mentioned_by[value].add(doc_name)
+                if value not in scanned[doc_name].mentions:
+                    scanned[doc_name].mentions.append(value)
 
             with open(filename, 'r') as file:
                 content: str = file.read()
@@ -173,14 +220,14 @@ class MetaDoc(object):
                             raise ExtensionError("Invalid token '%s' in option "
                                                  ":unit-type:, allowed tokens "
                                                  "are %s." % (token, UNIT_TYPE))
-                        pass  # currently unused
+                        unit.type = sys.intern(token)
                     elif state == ':unit-interaction:':
                         if token not in UNIT_INTERACTION:
                             raise ExtensionError("Invalid token '%s' in option "
                                                  ":unit-interaction:, allowed "
                                                  "tokens are %s."
                                                  % (token, UNIT_INTERACTION))
-                        pass  # currently unused
+                        unit.interaction = sys.intern(token)
                     elif state == ':unit-duration:':
                         try:
                             level, time = token.split('/')
@@ -197,7 +244,7 @@ class MetaDoc(object):
                                                  ":unit-duration:, allowed "
                                                  "levels are %s."
                                                  % (token, UNIT_DURATION_LEVEL))
-                        pass  # currently unused
+                        unit.durations[sys.intern(level)] = int(time)
                     elif state == ':unit-requires:':
                         new_required_by(doc, token)
                     elif state == ':unit-mentions:':
@@ -267,20 +314,31 @@ class MetaDoc(object):
                             else:
                                 pass  # definitions
 
+        return scanned, required_by, mentioned_by, provided_by
+
+    @staticmethod
+    def resolve(course_docs: Set[str], required_by: Dict[str, Set[str]],
+                mentioned_by: Dict[str, Set[str]],
+                provided_by: Dict[str, str]) -> Tuple[Set[str], Set[str]]:
+        """Returns the required and mentioned documents of a course."""
         # solve soft or "mentioned" and hard or "required" document dependencies
+        required: Set[str] = set()
+        mentioned: Set[str] = set()
         for is_referenced, referenced_by in [
-            (required_docs, required_by),
+            (required, required_by),
             # required references are more important than mentioned ones
-            (mentioned_docs, mentioned_by),
+            (mentioned, mentioned_by),
         ]:
-            # remove unsatisfiable references
+            # ignore unsatisfiable references
             for missing in [referenced
                             for referenced in referenced_by.keys()
                             if referenced not in provided_by]:
                 logger.warning("Document(s) %s uses '%s' which is not provided "
                                "by any other document."
                                % (referenced_by[missing], missing))
-                referenced_by.pop(missing)
+            referenced_by = {referenced: by
+                             for referenced, by in referenced_by.items()
+                             if referenced in provided_by}
             # stop when no change to the set of tagged documents is made
             tagged: Set[str] = course_docs.copy()
             changed: bool = True
@@ -294,7 +352,49 @@ class MetaDoc(object):
                         is_referenced.add(provided_by[referenced])
                         changed = True
 
-        mentioned_docs.difference_update(required_docs)
+        mentioned.difference_update(required)
+
+        return required, mentioned
+
+    @staticmethod
+    def tagged(hex_hash: Callable[[str], str], doc: str,
+               tags: Iterable[str]) -> Dict[str, List[str]]:
+        """Returns the levels and scenarios the course generator tagged."""
+        values: Dict[str, List[str]] = {}
+        for key in ['levels', 'scenarios']:
+            prefix: str = '%s_%s_' % (hex_hash(doc), key)
+            values[key] = sorted(tag[len(prefix):] for tag in tags
+                                 if tag.startswith(prefix))
+
+        return values
+
+    @staticmethod
+    def find_docs() -> List[str]:
+        """Returns all documents in the order they are scanned, in which the
+        first document providing a descriptor wins."""
+        found_docs: List[str] = []
+        for root, _, files in os.walk(os.curdir):
+            for file in files:
+                if file.endswith(".rst"):
+                    found_docs.append(sys.intern(os.path.splitext(
+                        os.path.relpath(os.path.join(root, file),
+                                        start=os.curdir))[0]))
+
+        return found_docs
+
+    @staticmethod
+    def config_inited(app: Sphinx, config: Config) -> None:
+        global unused_docs, required_docs, mentioned_docs
+
+        found_docs: List[str] = MetaDoc.find_docs()
+        scanned, required_by, mentioned_by, provided_by = MetaDoc.scan(
+            found_docs)
+        course_docs: Set[str] = {doc for doc in scanned
+                                 if config.hex_hash(doc) in app.tags}
+        required, mentioned = MetaDoc.resolve(course_docs, required_by,
+                                              mentioned_by, provided_by)
+        required_docs.update(required)
+        mentioned_docs.update(mentioned)
 
         for doc in found_docs:
             if all(doc not in docs for docs in [
@@ -304,14 +404,77 @@ class MetaDoc(object):
             ]):
                 unused_docs.add(doc)
 
+        # only the units of the course are kept for the rest of the build
+        for doc, unit in scanned.items():
+            if doc not in unused_docs:
+                for key, values in MetaDoc.tagged(config.hex_hash, doc,
+                                                  app.tags).items():
+                    setattr(unit, key, values)
+                units[doc] = unit
+
+        providers.update((descriptor, doc)
+                         for descriptor, doc in provided_by.items()
+                         if descriptor != doc and doc not in unused_docs)
+        for references in [required_by, mentioned_by]:
+            for descriptor, docs in references.items():
+                referenced_by.setdefault(descriptor, set()).update(docs)
+
     @staticmethod
-    def env_get_outdated(_app, _env, added: Set[str], changed: Set[str],
-                         removed: Set[str]) -> List[str]:
+    def env_get_outdated(_app, _env: BuildEnvironment, added: Set[str],
+                         changed: Set[str], removed: Set[str]) -> List[str]:
         added.difference_update(unused_docs)
         changed.difference_update(unused_docs)
         removed.update(unused_docs)
         return []
 
+    @staticmethod
+    def providers_file_name(app: Sphinx) -> str:
+        # not in the output, which is published, and not in the doctree
+        # directory, which may be replaced by a copy of another read
+        return os.path.join(app.doctreedir, os.pardir,
+                            PROVIDERS_FILE % app.builder.name)
+
+    @staticmethod
+    def env_get_updated(app: Sphinx, env: BuildEnvironment) -> List[str]:
+        # compare the providers with the last output of this builder, not with
+        # the last read, the documents referencing a changed descriptor are
+        # written again without reading
+        file_name: str = MetaDoc.providers_file_name(app)
+        if not os.path.isfile(file_name):
+            return []
+        with open(file_name, 'r') as file:
+            previous: Dict[str, str] = json.load(file)
+
+        dependent_docs: Set[str] = set()
+        for descriptor in previous.keys() | providers.keys():
+            if previous.get(descriptor) != providers.get(descriptor):
+                dependent_docs.update(referenced_by.get(descriptor, ()))
+        return sorted(doc for doc in dependent_docs
+                      if doc in env.all_docs and doc not in unused_docs)
+
+    @staticmethod
+    def build_finished(app: Sphinx, exception: Exception) -> None:
+        if exception is not None:
+            return
+
+        # the output is up to date with the current providers
+        with open(MetaDoc.providers_file_name(app), 'w') as file:
+            json.dump(providers, file, indent=2, sort_keys=True)
+
+        content: str = json.dumps({
+            'tags': sorted(app.tags),
+            'units': {doc: unit.as_dict() for doc, unit in units.items()
+                      if doc not in unused_docs},
+        }, indent=2, sort_keys=True)
+        file_name: str = os.path.join(app.doctreedir, UNITS_FILE)
+        # an unchanged file keeps its time for incremental consumers
+        if os.path.isfile(file_name):
+            with open(file_name, 'r') as file:
+                if file.read() == content:
+                    return
+        with open(file_name, 'w') as file:
+            file.write(content)
+
     @staticmethod
     def doc_tree_read(_app, doc_tree: document) -> None:
         for toc_tree in doc_tree.traverse(addnodes.toctree):
@@ -367,10 +530,12 @@ class TOCTreeMentioned(Directive):
 def setup(app: Sphinx) -> None:
     app.ignore = []
     if 'hex_hash' not in app.config:
-        app.add_config_value('hex_hash', None, 'env')
+        app.add_config_value('hex_hash', None, '')
     app.connect('builder-inited', MetaDoc.builder_inited)
     app.connect('config-inited', MetaDoc.config_inited)
     app.connect('env-get-outdated', MetaDoc.env_get_outdated)
+    app.connect('env-get-updated', MetaDoc.env_get_updated)
+    app.connect('build-finished', MetaDoc.build_finished)
     app.connect('doc''tree-read', MetaDoc.doc_tree_read)
     app.add_directive('toc''tree_required', TOCTreeRequired)
     app.add_directive('toc''tree_mentioned', TOCTreeMentioned)
@@ -0,0 +1,238 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.Navigation extension of Sphinx renders the global navigation of the
+HTML output, i.e. the `toctree()` of the templates shown in the sidebar, once
+per build instead of once per page. Sphinx resolves the toctrees of all
+documents of a course and renders them with docutils for every page, so the
+time grows with the number of pages times the size of the course.
+
+The toctrees are resolved once without collapsing and rendered with markers at
+the parts that differ between pages, i.e. the `current` classes of the branch
+of the page, the collapsed entries of other branches, and the links, which are
+relative to the page. For each page only these markers are replaced, and the
+output is the same as without the extension.
+
+Example:
+`conf.py`
+```
+extensions = [
+    'rosin.navigation',
+]
+navigation_cache = True  # optional, disable to render every page by Sphinx
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import re
+from typing import Any, Dict, List, Set, Tuple, Union
+
+from docutils import nodes
+from docutils.nodes import Element, Node
+from docutils.writers._html_base import HTMLTranslator
+from sphinx import addnodes
+from sphinx.application import Sphinx
+from sphinx.builders import Builder
+from sphinx.environment.adapters.toctree import TocTree
+from sphinx.util.tags import Tags
+
+BUILDERS: List[str] = ['html', 'dirhtml']
+MARKER_PATTERN = re.compile(
+    # the collapsible list of an entry
+    r'<!--rosin-nav-begin-(?P<begin>\d+)-->|<!--rosin-nav-end-(?P<end>\d+)-->'
+    # the classes of a node, alone, after, or before other classes
+    r'| class="rosin-nav-(?P<attribute>\d+)"| rosin-nav-(?P<after>\d+)'
+    r'|rosin-nav-(?P<before>\d+) '
+    r'|rosin-nav:(?P<link>\d+)')
+CURRENT: Dict[str, str] = {
+    'attribute': ' class="current"',
+    'after': ' current',
+    'before': 'current ',
+}
+
+# kind and value of the parts of a rendered navigation, e.g. ('link', 3)
+Segment = Tuple[str, Union[str, int]]
+
+
+class Targets(object):
+    """Stands in for the builder while resolving, and keeps the document each
+    link refers to instead of its URI, which is relative to a page."""
+
+    def __init__(self, tags: Tags) -> None:
+        self.tags: Tags = tags
+        self.documents: List[str] = []
+
+    def get_relative_uri(self, _from: str, to: str, _type: str = None) -> str:
+        self.documents.append(to)
+        return 'rosin-nav:%d' % (len(self.documents) - 1)
+
+
+class Navigation(object):
+    """The global navigation rendered once for all pages."""
+
+    def __init__(self, builder: Builder, collapse: bool,
+                 arguments: Dict[str, Any]) -> None:
+        self.collapse: bool = collapse
+        self.segments: List[Segment] = []
+        # target, anchor, and marked ancestors of every link
+        self.links: List[Tuple[str, str, List[int]]] = []
+        self.links_by_document: Dict[str, List[int]] = {}
+
+        targets: Targets = Targets(builder.tags)
+        adapter: TocTree = TocTree(builder.env)
+        master_doc: str = builder.config.master_doc
+        maxdepth: int = int(arguments.pop('maxdepth', 0) or 0)
+        arguments.setdefault('includehidden', True)
+        markers: Dict[int, int] = {}  # id of a node to its marker
+
+        def mark(node: Element) -> int:
+            if id(node) not in markers:
+                markers[id(node)] = len(markers)
+                node['classes'] = [name for name in node['classes']
+                                   if name != 'current']
+                node['classes'].append('rosin-nav-%d' % markers[id(node)])
+                node.attributes.pop('iscurrent', None)
+            return markers[id(node)]
+
+        def collect_links(toc_tree: Element) -> None:
+            for reference in toc_tree.traverse(nodes.reference):
+                match = re.match(r'rosin-nav:(\d+)', reference['refuri'])
+                if match is None:
+                    continue  # external links are the same on all pages
+                ancestors: List[int] = [mark(reference)]
+                parent: Node = reference.parent
+                while parent is not None:
+                    if isinstance(parent, (nodes.list_item,
+                                           nodes.bullet_list)):
+                        ancestors.append(mark(parent))
+                    parent = parent.parent
+                document: str = targets.documents[int(match.group(1))]
+                reference['refuri'] = 'rosin-nav:%d' % len(self.links)
+                self.links_by_document.setdefault(document, []).append(
+                    len(self.links))
+                self.links.append((document, reference['anchorname'],
+                                   ancestors))
+
+        # the depth is counted like `TocTree._toctree_prune`
+        def collect(node: Element, depth: int) -> None:
+            for child in node.children[:]:
+                if isinstance(child, (addnodes.compact_paragraph,
+                                      nodes.list_item)):
+                    collect(child, depth)
+                elif isinstance(child, nodes.bullet_list):
+                    mark(child)
+                    if depth > 1 and isinstance(node, nodes.list_item):
+                        entry: int = mark(node)
+                        index: int = node.index(child)
+                        node.insert(index, nodes.raw(
+                            '', '<!--rosin-nav-begin-%d-->' % entry,
+                            format='html'))
+                        node.insert(index + 2, nodes.raw(
+                            '', '<!--rosin-nav-end-%d-->' % entry,
+                            format='html'))
+                    collect(child, depth + 1)
+
+        # like `TocTree.get_toctree_for`, but the states of all links are
+        # collected before pruning, as a page below the maximum depth marks
+        # its ancestors, and the master document is never marked as current
+        toc_trees: List[Element] = []
+        for toc_tree_node in builder.env.get_doctree(master_doc).traverse(
+                addnodes.toctree):
+            toc_tree: Union[Element, None] = adapter.resolve(
+                master_doc, targets, toc_tree_node, prune=False,
+                collapse=False, **arguments)
+            if toc_tree is None:
+                continue
+            collect_links(toc_tree)
+            adapter._toctree_prune(toc_tree, 1, maxdepth
+                                   or toc_tree_node.get('maxdepth', -1))
+            toc_trees.append(toc_tree)
+        if not toc_trees:
+            return
+
+        toc_tree = toc_trees[0]
+        for other in toc_trees[1:]:
+            toc_tree.extend(other.children)
+        collect(toc_tree, 1)
+
+        html: str = builder.render_partial(toc_tree)['fragment']
+        position: int = 0
+        for match in MARKER_PATTERN.finditer(html):
+            if match.start() > position:
+                self.segments.append(('text', html[position:match.start()]))
+            self.segments.append((match.lastgroup,
+                                  int(match.group(match.lastgroup))))
+            position = match.end()
+        self.segments.append(('text', html[position:]))
+
+    def render(self, builder: Builder, page_name: str) -> str:
+        # the same states as `TocTree.resolve` sets for the page
+        current: Set[int] = set()
+        expanded: Set[int] = set()
+        for link in self.links_by_document.get(page_name, []):
+            _, anchor, ancestors = self.links[link]
+            expanded.update(ancestors)
+            if not anchor:
+                current.update(ancestors)
+
+        parts: List[str] = []
+        skipped: Union[int, None] = None
+        for kind, value in self.segments:
+            if skipped is not None:
+                if kind == 'end' and value == skipped:
+                    skipped = None
+            elif kind == 'text':
+                parts.append(value)
+            elif kind == 'begin':
+                if self.collapse and value not in expanded:
+                    skipped = value
+            elif kind == 'link':
+                document, anchor, _ = self.links[value]
+                uri: str = builder.get_relative_uri(page_name, document) \
+                    + anchor
+                parts.append((uri or '#').translate(
+                    HTMLTranslator.special_characters))
+            elif value in current:
+                parts.append(CURRENT.get(kind, ''))
+
+        return ''.join(parts)
+
+
+class NavigationCache(object):
+    def __init__(self) -> None:
+        self.navigations: Dict[Tuple, Navigation] = {}
+
+    def clear(self, *_args) -> None:
+        self.navigations.clear()
+
+    def toc_tree(self, builder: Builder, page_name: str, collapse: bool = True,
+                 **kwargs: Any) -> str:
+        # the same defaults as `StandaloneHTMLBuilder._get_local_toctree`
+        if 'includehidden' not in kwargs:
+            kwargs['includehidden'] = False
+        if kwargs.get('maxdepth') == '':
+            kwargs.pop('maxdepth')
+
+        key: Tuple = (collapse,) + tuple(sorted(kwargs.items()))
+        if key not in self.navigations:
+            self.navigations[key] = Navigation(builder, collapse, kwargs)
+        return self.navigations[key].render(builder, page_name)
+
+    def html_page_context(self, app: Sphinx, page_name: str, _template: str,
+                          context: Dict[str, Any], _doc_tree) -> None:
+        if (app.config.navigation_cache and app.builder.name in BUILDERS
+                and 'toctree' in context):
+            context['toctree'] = lambda **kwargs: self.toc_tree(
+                app.builder, page_name, **kwargs)
+
+
+def setup(app: Sphinx) -> None:
+    app.add_config_value('navigation_cache', True, '')
+
+    cache: NavigationCache = NavigationCache()
+    # the toctrees change with the documents read
+    app.connect('env-updated', cache.clear)
+    app.connect('html-page-context', cache.html_page_context)
@@ -0,0 +1,231 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.Profiler extension of Sphinx measures where the time of a build goes.
+If `profiling` is enabled, every event handler of every extension, e.g. the
+pre-scan of rosin.Meta in `config-inited` or the `source-read` hooks, is timed,
+as well as the phases of the builder, i.e. reading, reading each document,
+resolving the toctrees and references of each document, writing each document,
+and finishing. The times are also summed up per document.
+
+After the build a summary table is logged and written to `profile_<builder>.txt`
+next to the doctree directory, e.g. `build/learner/profile_html.txt`, together
+with `profile_<builder>.json` in the trace event format, which can be opened in
+the trace viewer of Chromium (chrome://tracing) or in https://ui.perfetto.dev.
+
+Only the main process is profiled, i.e. documents read or written by parallel
+processes (`-j`) are missing.
+
+Example:
+`conf.py`
+```
+extensions = [
+    'rosin.profiler',
+]
+profiling = True  # optional, or `-D profiling=1` on the command line
+profiling_directory = 'build/profile'  # optional
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Set, Tuple, Union
+
+from sphinx.application import Sphinx
+from sphinx.events import EventListener
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+BUILDER_PHASES: List[Tuple[str, str, bool]] = [
+    # name of the method, name of the phase, and whether the first argument is
+    # a document
+    ('build', 'build', False),
+    ('read', 'read', False),
+    ('read_doc', 'read document', True),
+    ('prepare_writing', 'prepare writing', False),
+    ('write', 'write', False),
+    ('write_doc', 'write document', True),
+    ('finish', 'finish', False),
+]
+DOCUMENT_COLUMNS: List[str] = ['read document', 'resolve document',
+                               'write document', 'handlers']
+SLOWEST_DOCUMENTS: int = 10
+
+
+def handler_name(handler: Callable) -> str:
+    return '%s.%s' % (getattr(handler, '__module__', None) or '?',
+                      getattr(handler, '__qualname__', None) or repr(handler))
+
+
+def table(title: str, header: List[str], rows: List[List[Any]]) -> List[str]:
+    widths: List[int] = [max(len(str(row[column]))
+                             for row in [header] + rows)
+                         for column in range(len(header))]
+
+    def line(cells: List[Any]) -> str:
+        # the first column is aligned left, numbers are aligned right
+        return '  '.join('%-*s' % (width, cell) if column == 0
+                         else '%*s' % (width, cell)
+                         for column, (width, cell)
+                         in enumerate(zip(widths, cells)))
+
+    return [title, line(header)] + [line(row) for row in rows] + ['']
+
+
+class Profiler(object):
+    def __init__(self, app: Sphinx):
+        self.app = app
+        self.origin: float = time.perf_counter()
+        self.trace_events: List[Dict[str, Any]] = []
+        # calls, total seconds, and maximum seconds of every span
+        self.totals: Dict[Tuple[str, str], List[Union[int, float]]] = {}
+        self.documents: Dict[str, Dict[str, float]] = {}
+        self.document: Union[str, None] = None
+        self.wrapped: Set[int] = set()
+        self.emit: Callable = app.events.emit
+        app.events.emit = self.profiled_emit
+
+    def record(self, category: str, name: str, start: float,
+               end: float) -> None:
+        duration: float = end - start
+        self.trace_events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6, 1),
+            'dur': round(duration * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': {'document': self.document} if self.document else {},
+        })
+        total: List[Union[int, float]] = self.totals.setdefault(
+            (category, name), [0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += duration
+        total[2] = max(total[2], duration)
+        if self.document is not None:
+            key: str = 'handlers' if category == 'handler' else name
+            counters: Dict[str, float] = self.documents.setdefault(
+                self.document, {})
+            counters[key] = counters.get(key, 0.0) + duration
+
+    def timed(self, category: str, name: str, function: Callable,
+              with_document: bool = False) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            document: Union[str, None] = self.document
+            if with_document:
+                self.document = args[0]
+            start: float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(category, name, start, time.perf_counter())
+                self.document = document
+
+        return wrapper
+
+    def profiled_emit(self, name: str, *args, **kwargs) -> List:
+        # handlers are wrapped on their first event, so the handlers of all
+        # extensions are covered, no matter in which order they were loaded
+        if self.app.config.profiling:
+            listeners: List[EventListener] = self.app.events.listeners[name]
+            for position, listener in enumerate(listeners):
+                if (listener.id in self.wrapped
+                        or getattr(listener.handler, '__self__', None) is self):
+                    continue
+                self.wrapped.add(listener.id)
+                listeners[position] = listener._replace(handler=self.timed(
+                    'handler', '%s: %s' % (name, handler_name(
+                        listener.handler)), listener.handler))
+
+        return self.emit(name, *args, **kwargs)
+
+    def builder_inited(self, app: Sphinx) -> None:
+        if not app.config.profiling:
+            return
+
+        # the builder is not pickled, unlike the environment
+        for method, name, with_document in BUILDER_PHASES:
+            setattr(app.builder, method, self.timed(
+                'phase', name, getattr(app.builder, method), with_document))
+
+        resolve: Callable = app.env.get_and_resolve_doctree
+        write: Callable = app.builder.write
+
+        def profiled_write(*args, **kwargs) -> None:
+            # the environment is pickled before writing, so its method is only
+            # replaced while writing
+            app.env.get_and_resolve_doctree = self.timed(
+                'phase', 'resolve document', resolve, with_document=True)
+            try:
+                write(*args, **kwargs)
+            finally:
+                del app.env.get_and_resolve_doctree
+
+        app.builder.write = profiled_write
+
+    def summary(self) -> List[str]:
+        def rows(category: str) -> List[List[Any]]:
+            return [[name, calls, '%.1f' % (total * 1000),
+                     '%.1f' % (total * 1000 / calls), '%.1f' % (maximum * 1000)]
+                    for (kind, name), (calls, total, maximum) in sorted(
+                        self.totals.items(), key=lambda item: -item[1][1])
+                    if kind == category]
+
+        header: List[str] = ['', 'calls', 'total ms', 'mean ms', 'max ms']
+        documents: List[Tuple[str, Dict[str, float]]] = sorted(
+            self.documents.items(), key=lambda item: -sum(item[1].values()))
+
+        return (table("Phases", header, rows('phase'))
+                + table("Event handlers", header, rows('handler'))
+                + table("Slowest documents",
+                        [''] + ['%s ms' % column.replace(' document', '')
+                                for column in DOCUMENT_COLUMNS],
+                        [[document] + ['%.1f' % (counters.get(column, 0.0)
+                                                 * 1000)
+                                       for column in DOCUMENT_COLUMNS]
+                         for document, counters
+                         in documents[:SLOWEST_DOCUMENTS]]))
+
+    def build_finished(self, app: Sphinx, exception: Exception) -> None:
+        if not app.config.profiling:
+            return
+
+        directory: str = os.path.join(app.srcdir, app.config.profiling_directory
+                                      or os.path.join(app.doctreedir,
+                                                      os.pardir))
+        os.makedirs(directory, exist_ok=True)
+        base_name: str = os.path.join(directory, 'profile_%s'
+                                      % app.builder.name)
+        with open('%s.json' % base_name, 'w') as file:
+            json.dump({'traceEvents': self.trace_events,
+                       'displayTimeUnit': 'ms',
+                       'otherData': {'builder': app.builder.name,
+                                     'failed': exception is not None}}, file)
+        lines: List[str] = self.summary()
+        with open('%s.txt' % base_name, 'w') as file:
+            file.write('\n'.join(lines))
+
+        for line in lines:
+            logger.info(line)
+        logger.info("profile written to %s.json and %s.txt"
+                    % (os.path.relpath(base_name), os.path.relpath(base_name)))
+
+
+def setup(app: Sphinx) -> None:
+    app.add_config_value('profiling', False, '')
+    app.add_config_value('profiling_directory', None, '')
+
+    profiler: Profiler = Profiler(app)
+    # before all other handlers, e.g. the reread of rosin.Meta, and after them
+    app.connect('builder-inited', profiler.builder_inited, priority=0)
+    app.connect('build-finished', profiler.build_finished, priority=1000)
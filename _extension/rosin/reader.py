@@ -0,0 +1,84 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.Reader extension of Sphinx separates reading the sources of a build
+from writing its output, so that all formats are written from the same
+doctrees. The `read` builder only reads the sources into the doctree directory
+and stops before the documents are resolved, i.e. nothing is written and no
+image is converted.
+
+A writer that sets `reader_doctrees` to the doctree directory of such a read
+starts from a copy of it in its own doctree directory. The writers of several
+formats may thereby run concurrently without sharing their environment, which
+every builder saves again if it updated some documents.
+
+Example:
+```
+sphinx-build -M read . build/learner
+sphinx-build -M html . build/learner -d build/learner/doctrees_html \\
+             -D reader_doctrees=build/learner/doctrees
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import os
+import shutil
+from typing import Any, List, Set
+
+from docutils.nodes import Node
+from sphinx.application import ENV_PICKLE_FILENAME, Sphinx
+from sphinx.builders import Builder
+from sphinx.config import Config
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReadBuilder(Builder):
+    """Reads the sources into the doctrees without writing any output."""
+    name: str = 'read'
+
+    def init(self) -> None:
+        pass
+
+    def get_outdated_docs(self) -> List[str]:
+        return []  # the documents are read if their sources changed
+
+    def get_target_uri(self, _doc_name: str, _type: str = None) -> str:
+        return ''
+
+    def prepare_writing(self, _doc_names: Set[str]) -> None:
+        pass
+
+    def write_doc(self, _doc_name: str, _doc_tree: Node) -> None:
+        pass
+
+    def write(self, *_args: Any, **_kwargs: Any) -> None:
+        pass  # neither resolved nor written
+
+
+def config_inited(app: Sphinx, config: Config) -> None:
+    if not config.reader_doctrees:
+        return
+
+    # the environment is loaded after this event
+    source: str = os.path.abspath(os.path.join(app.srcdir,
+                                               config.reader_doctrees))
+    if source == app.doctreedir:
+        return
+    if not os.path.isfile(os.path.join(source, ENV_PICKLE_FILENAME)):
+        logger.warning("The doctrees in '%s' have not been read, all sources "
+                       "are read again." % config.reader_doctrees)
+        return
+
+    shutil.rmtree(app.doctreedir, ignore_errors=True)
+    shutil.copytree(source, app.doctreedir)
+
+
+def setup(app: Sphinx) -> None:
+    app.add_config_value('reader_doctrees', None, '')
+    app.add_builder(ReadBuilder)
+    app.connect('config-inited', config_inited)
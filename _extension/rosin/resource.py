@@ -0,0 +1,193 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.Resource extension of Sphinx keeps the HTML output of a course free of
+resources that none of its units uses. While the sources are read, a reference
+graph records for every document which images and downloads, e.g. lecture PDFs,
+audio and video files, it references, including the `only` conditions around
+each reference like levels and scenarios. Before the HTML builder copies the
+downloads, all downloads that are not referenced by a visible part of a document
+of the course are dropped, and images and downloads of former builds that are no
+longer referenced are removed. The saved bytes are reported at the end.
+
+Raw HTML that embeds a download, e.g. a `<video>` element, keeps all downloads
+of its document with the same file name.
+
+Example:
+`conf.py`
+```
+extensions = [
+    'rosin.resource',
+]
+resource_pruning = True  # optional, disable to copy all resources
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import os
+import re
+from typing import Dict, List, Set, Tuple
+
+from docutils import nodes
+from docutils.nodes import Node
+from sphinx import addnodes
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+RAW_REFERENCE_PATTERN = re.compile(r'(?:src|href|data)\s*=\s*["\']([^"\']+)')
+
+# kind of the resource, its name, and the conditions of the enclosing `only`
+Reference = Tuple[str, str, List[str]]
+
+dropped: List[str] = []
+saved: Dict[str, int] = {}
+
+
+def conditions(node: Node) -> List[str]:
+    expressions: List[str] = []
+    while node is not None:
+        if isinstance(node, addnodes.only):
+            expressions.append(node['expr'])
+        node = node.parent
+
+    return expressions
+
+
+def doctree_read(app: Sphinx, doctree: nodes.document) -> None:
+    references: List[Reference] = []
+    for node in doctree.traverse(nodes.image):
+        references += [('image', candidate, conditions(node))
+                       for candidate in node.get('candidates', {}).values()]
+    for node in doctree.traverse(addnodes.download_reference):
+        if 'filename' in node:
+            references.append(('download', node['filename'],
+                               conditions(node)))
+    for node in doctree.traverse(nodes.raw):
+        if 'html' in node.get('format', '').split():
+            references += [('raw', os.path.basename(reference),
+                            conditions(node))
+                           for reference
+                           in RAW_REFERENCE_PATTERN.findall(node.astext())]
+
+    if not hasattr(app.env, 'resource_references'):
+        app.env.resource_references = {}
+    app.env.resource_references[app.env.docname] = references
+
+
+def env_purge_doc(_app: Sphinx, env: BuildEnvironment, doc_name: str) -> None:
+    if hasattr(env, 'resource_references'):
+        env.resource_references.pop(doc_name, None)
+
+
+# noinspection SpellCheckingInspection
+def env_merge_info(_app: Sphinx, env: BuildEnvironment, doc_names: Set[str],
+                   other: BuildEnvironment) -> None:
+    if not hasattr(env, 'resource_references'):
+        env.resource_references = {}
+    for doc_name in doc_names:
+        if doc_name in getattr(other, 'resource_references', {}):
+            env.resource_references[doc_name] = \
+                other.resource_references[doc_name]
+
+
+def referenced(app: Sphinx) -> Tuple[Set[str], Set[str]]:
+    """Returns the output names of all referenced images and downloads."""
+    images: Set[str] = set()
+    downloads: Set[str] = set()
+    raw_names: Dict[str, Set[str]] = {}
+
+    def visible(expressions: List[str]) -> bool:
+        try:
+            return all(app.builder.tags.eval_condition(expression)
+                       for expression in expressions)
+        except ValueError:
+            return True  # keep the resource if in doubt
+
+    references: Dict[str, List[Reference]] = getattr(
+        app.env, 'resource_references', {})
+    for doc_name in app.env.found_docs:
+        for kind, name, expressions in references.get(doc_name, []):
+            if not visible(expressions):
+                continue
+            if kind == 'image' and name in app.env.images:
+                images.add(app.env.images[name][1])
+            elif kind == 'download':
+                downloads.add(name)
+            elif kind == 'raw':
+                raw_names.setdefault(doc_name, set()).add(name)
+
+    # raw HTML references downloads by their file name only
+    for _, (doc_names, name) in app.env.dlfiles.items():
+        if any(os.path.basename(name) in raw_names.get(doc_name, set())
+               for doc_name in doc_names):
+            downloads.add(name)
+
+    return images, downloads
+
+
+def is_enabled(app: Sphinx) -> bool:
+    return app.config.resource_pruning and app.builder.format == 'html'
+
+
+def html_collect_pages(app: Sphinx) -> List[Tuple[str, Dict, str]]:
+    if not is_enabled(app):
+        return []
+
+    # called right before the downloads are copied, after the environment has
+    # been saved, so the dropped downloads are still known to the next build
+    _, downloads = referenced(app)
+    dropped.clear()
+    saved['downloads'] = 0
+    for source in list(app.env.dlfiles):
+        if app.env.dlfiles[source][1] not in downloads:
+            file_name: str = os.path.join(app.srcdir, source)
+            if os.path.isfile(file_name):
+                saved['downloads'] += os.path.getsize(file_name)
+            logger.verbose("resource %s not copied" % source)
+            dropped.append(app.env.dlfiles[source][1])
+            del app.env.dlfiles[source]
+
+    return []
+
+
+def build_finished(app: Sphinx, exception: Exception) -> None:
+    if exception is not None or not is_enabled(app):
+        return
+
+    images, downloads = referenced(app)
+    # only files that are known to the environment are ever removed
+    candidates: List[Tuple[str, bool]] = (
+        [(os.path.join(app.outdir, '_images', name), name in images)
+         for _, name in app.env.images.values()]
+        + [(os.path.join(app.outdir, '_downloads', name), name in downloads)
+           for name in [name for _, name in app.env.dlfiles.values()]
+           + dropped])
+    removed: int = 0
+    for file_name, used in candidates:
+        if not used and os.path.isfile(file_name):
+            removed += os.path.getsize(file_name)
+            os.remove(file_name)
+            if (os.path.dirname(file_name) != os.path.join(app.outdir,
+                                                           '_images')
+                    and not os.listdir(os.path.dirname(file_name))):
+                os.rmdir(os.path.dirname(file_name))
+
+    logger.info("resources: %d images and %d downloads referenced, %d bytes "
+                "not copied, %d bytes removed"
+                % (len(images), len(downloads), saved.get('downloads', 0),
+                   removed))
+
+
+def setup(app: Sphinx) -> None:
+    app.add_config_value('resource_pruning', True, 'html')
+    app.connect('doctree-read', doctree_read)
+    app.connect('env-purge-doc', env_purge_doc)
+    app.connect('env-merge-info', env_merge_info)
+    app.connect('html-collect-pages', html_collect_pages)
+    app.connect('build-finished', build_finished)
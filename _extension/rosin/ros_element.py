@@ -13,6 +13,20 @@ information will be used to generate a "hierarchy" like "Package/Node". Place a
 "short" before the other parameters to omit this behaviour. See the example
 below for further information.
 
+The messages, services, and actions of a curated subset of the official
+packages of a ROS distribution are listed in an inventory, e.g.
+`_resource/data/ros_melodic.yaml`, which also provides the links to their
+documentation. If `ros_inventory` is set, every role of a listed package is
+validated against it while reading, elements that are missing are reported and
+not linked, and the documents are read again if the inventory changes. Packages
+that are not listed are neither validated nor reported, and keep the links of
+the roles.
+
+Every occurrence of an element is recorded by the `:ros:` domain, and listed
+on the page "ROS Element Index" (`ros-elementindex`), which links each element
+to the documents using it. Occurrences hidden by the tags of an edition are
+left out, and only the entries of documents that are read again are replaced.
+
 Example:
 ```
 All text roles:
@@ -41,23 +55,52 @@ Short variants:
 -  :ros:parameter-np:`parameter short node package` will print parameter.
 -  ... and all other roles with more than one parameter.
 ´´´
+
+`conf.py`
+```
+ros_inventory = '_resource/data/ros_melodic.yaml'  # optional
+```
 """
 
 __author__ = "Meeßen, Marcus"
 __copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
-__version__ = "1.2"
+__version__ = "1.5"
 
+import os
 import re
-from typing import Dict, List, Tuple
+import sys
+from typing import Dict, FrozenSet, Iterable, List, Tuple, Type, Union
 
+import yaml
+from docutils import nodes
 from docutils.nodes import Inline, Node, TextElement, reference
+from docutils.parsers.rst.states import Inliner
 from sphinx.application import Sphinx
 from sphinx.config import Config
-from sphinx.domains import Domain
+from sphinx.domains import Domain, Index, IndexEntry
+from sphinx.environment import BuildEnvironment
 from sphinx.errors import ExtensionError
+from sphinx.util import logging
+from sphinx.util.nodes import make_id
+from sphinx.util.tags import Tags
 from sphinx.writers.html import HTMLTranslator
 from sphinx.writers.latex import LaTeXTranslator
 
+from rosin.search import conditions
+
+logger = logging.getLogger(__name__)
+
+# parts of the roles that are looked up in the inventory, and their keys there
+INVENTORY_KINDS: Dict[str, str] = {
+    'message': 'messages',
+    'service': 'services',
+    'action': 'actions',
+}
+INVENTORY_FORMAT: int = 1
+# order of the kinds of elements in the index
+ELEMENT_KINDS: List[str] = ['package', 'node', 'message', 'service', 'action',
+                            'topic', 'parameter']
+
 
 # noinspection PyPep8Naming
 class index_text(Inline, TextElement):
@@ -96,9 +139,11 @@ class literal_text(Inline, TextElement):
 
 
 def visit_literal_text_html(self: HTMLTranslator, node: literal_text) -> None:
-    self.body.append('<code class="%s" style="background: rgb(%d, %d, %d);'
+    self.body.append('<code%s class="%s" style="background: rgb(%d, %d, %d);'
                      ' color: rgb(%d, %d, %d);">'
-                     % (' '.join(node.attributes['classes']),
+                     % (''.join(' id="%s"' % node_id
+                                for node_id in node['ids'][:1]),
+                        ' '.join(node.attributes['classes']),
                         *ROSDomain.box_color,
                         *node.attributes['text_color']))
 
@@ -108,6 +153,7 @@ def depart_literal_text_html(self: HTMLTranslator, _node) -> None:
 
 
 def visit_literal_text_latex(self: LaTeXTranslator, node: literal_text) -> None:
+    self.body.append(self.hypertarget_to(node, anchor=True))
     self.body.append('\\color''box[RGB]{%d,%d,%d}{'
                      '\\v''phantom{Ay}'
                      '\\text''color[RGB]{%d,%d,%d}{'
@@ -142,6 +188,54 @@ def depart_titled_text_latex(_self, _node) -> None:
     pass
 
 
+class Inventory(object):
+    """The elements of the curated packages of a ROS distribution with their
+    links."""
+
+    def __init__(self, file_name: str):
+        with open(file_name, 'r') as file:
+            data: dict = yaml.safe_load(file)
+        if data.get('format') != INVENTORY_FORMAT:
+            raise ExtensionError("ROS inventory '%s' has the format %s, but "
+                                 "%d is supported."
+                                 % (file_name, data.get('format'),
+                                    INVENTORY_FORMAT))
+
+        self.file_name: str = file_name
+        self.modified: float = os.path.getmtime(file_name)
+        self.distro: str = data['distro']
+        self.uris: Dict[str, str] = data.get('uris', {})
+        self.packages: FrozenSet[str] = frozenset(data['packages'])
+        # every element is a key like "message:std_msgs/String"
+        keys: List[str] = []
+        for package, kinds in data['packages'].items():
+            keys.append('package:%s' % package)
+            for kind, key in INVENTORY_KINDS.items():
+                keys += ['%s:%s/%s' % (kind, package, name)
+                         for name in (kinds or {}).get(key, [])]
+        self.elements: FrozenSet[str] = frozenset(map(sys.intern, keys))
+
+    def lists(self, values: Dict[str, str]) -> bool:
+        """Returns if the package of a role is curated in the inventory."""
+        return values.get('package') in self.packages
+
+    def unknown(self, kind: str, values: Dict[str, str]) -> Union[str, None]:
+        """Returns the element of a role if it is not in the inventory."""
+        # the package of e.g. a message has its own role after process_comm
+        if kind == 'package':
+            key: str = 'package:%s' % values[kind]
+        elif kind in INVENTORY_KINDS:
+            key = '%s:%s/%s' % (kind, values['package'], values[kind])
+        else:
+            return None
+
+        return ("%s '%s'" % tuple(key.split(':', 1))
+                if key not in self.elements else None)
+
+
+inventory: Union[Inventory, None] = None
+
+
 class ROSComponent(object):
     def __init__(self, parts: List[str] = None, uri: str = None,
                  classes: List[str] = None, index: str = None,
@@ -152,7 +246,8 @@ class ROSComponent(object):
         self.index = index
         self.text_color: Tuple[int, int, int] = text_color
 
-    def __call__(self, _name, raw_text: str, text: str,
+    def __call__(self, _name, raw_text: str, text: str, line: int = None,
+                 inliner: Inliner = None,
                  *args, **kwargs) -> Tuple[List[Node], List[Node]]:
         texts: List[str] = re.split(r'[ \n]+', text)
         parts_without_suffixes: List[str] = [part.split('-')[0]
@@ -168,6 +263,10 @@ class ROSComponent(object):
             text_color=self.text_color,
             text=texts[0],
             classes=['xref', 'pre', 'ros'] + self.classes,
+            # recorded by the domain, e.g. "turtlesim/turtlesim_node"
+            kind=parts_without_suffixes[0],
+            element='/'.join(reversed(texts)),
+            local='-i' in self.parts[0],
         )
 
         if self.index is not None:
@@ -184,12 +283,33 @@ class ROSComponent(object):
         )
         titled_node.append(literal_node)
 
-        if self.uri is None:
+        uri: Union[str, None] = self.uri
+        values: Dict[str, str] = dict(zip(self.parts, texts))
+        # only the elements of listed packages are validated, the others keep
+        # the links of the roles
+        if inventory is not None and inventory.lists(values):
+            unknown: Union[str, None] = inventory.unknown(self.parts[0],
+                                                          values)
+            if inliner is not None and unknown is not None:
+                logger.warning("Unknown ROS %s, which is not in the "
+                               "inventory of %s."
+                               % (unknown, inventory.distro),
+                               location=(inliner.document.settings.env.docname,
+                                         line),
+                               type='ros', subtype='inventory')
+            if uri is not None:
+                uri = (inventory.uris.get(self.parts[0], uri)
+                       if unknown is None else None)
+        if inventory is not None and inliner is not None:
+            # e.g. a package may be listed in the inventory later
+            inliner.document.settings.env.note_dependency(inventory.file_name)
+
+        if uri is None:
             return [titled_node], []
         else:
             reference_node = reference(
                 rawsource=raw_text,
-                refuri=self.uri % dict(zip(self.parts, texts)),
+                refuri=uri % values,
                 target='_blank',
             )
             reference_node.append(titled_node)
@@ -197,9 +317,72 @@ class ROSComponent(object):
             return [reference_node], []
 
 
+class ROSElementIndex(Index):
+    name: str = 'elementindex'
+    localname: str = "ROS Element Index"
+    shortname: str = "ROS elements"
+
+    def generate(self, docnames: Iterable[str] = None
+                 ) -> Tuple[List[Tuple[str, List[IndexEntry]]], bool]:
+        env: BuildEnvironment = self.domain.env
+        tags: Tags = env.app.builder.tags
+
+        def visible(expressions: List[str]) -> bool:
+            try:
+                return all(tags.eval_condition(expression)
+                           for expression in expressions)
+            except ValueError:
+                return True
+
+        content: Dict[str, List[IndexEntry]] = {}
+        for (kind, element, local), documents in sorted(
+                self.domain.data['elements'].items(),
+                key=lambda item: (ELEMENT_KINDS.index(item[0][0]),
+                                  item[0][1].lower(), item[0][2])):
+            # the first visible occurrence in each document is linked
+            anchors: List[Tuple[str, str]] = [
+                (doc_name, anchor) for doc_name, anchor in (
+                    (doc_name, next((anchor for anchor, expressions
+                                     in occurrences if visible(expressions)),
+                                    None))
+                    for doc_name, occurrences in sorted(documents.items())
+                    if docnames is None or doc_name in docnames)
+                if anchor is not None]
+            if not anchors:
+                continue
+
+            entries: List[IndexEntry] = content.setdefault(
+                "%ss" % kind.capitalize(), [])
+            qualifier: str = "local" if local else ''
+            if len(anchors) == 1:
+                entries.append(IndexEntry(element, 0, anchors[0][0],
+                                          anchors[0][1], '', qualifier,
+                                          title(env, anchors[0][0])))
+            else:
+                entries.append(IndexEntry(element, 1, anchors[0][0],
+                                          anchors[0][1], '', qualifier, ''))
+                entries += [IndexEntry(title(env, doc_name), 2, doc_name,
+                                       anchor, '', '', '')
+                            for doc_name, anchor in anchors]
+
+        return [(kind, content[kind]) for kind
+                in ["%ss" % kind.capitalize() for kind in ELEMENT_KINDS]
+                if kind in content], False
+
+
 class ROSDomain(Domain):
     name: str = 'ros'
     label: str = "Robot Operating System"
+    indices: List[Type[Index]] = [ROSElementIndex]
+    # the occurrences of every element by kind, name, and whether it is
+    # local, e.g. {('node', 'turtlesim/turtlesim_node', False):
+    # {'unit/a': [('ros-node-turtlesim-turtlesim-node', [])]}}, and the
+    # elements of every document, so a document is dropped without a scan
+    initial_data: Dict[str, Dict] = {
+        'elements': {},
+        'documents': {},
+    }
+    data_version: int = 1
     release_uri: str = 'https://docs.ros.org/melodic/api/'
     box_color: Tuple[int, int, int]
     index_color: Tuple[int, int, int]
@@ -294,13 +477,52 @@ class ROSDomain(Domain):
         ),
     }
 
+    def note_occurrence(self, doc_name: str, key: Tuple[str, str, bool],
+                        occurrences: List[Tuple[str, List[str]]]) -> None:
+        self.data['elements'].setdefault(key, {})[doc_name] = occurrences
+        self.data['documents'].setdefault(doc_name, set()).add(key)
+
+    def clear_doc(self, doc_name: str) -> None:
+        for key in self.data['documents'].pop(doc_name, set()):
+            documents: Dict[str, List] = self.data['elements'][key]
+            documents.pop(doc_name, None)
+            if not documents:
+                del self.data['elements'][key]
+
     # noinspection SpellCheckingInspection
-    def merge_domaindata(self, *args, **kwargs) -> None:
-        pass
+    def merge_domaindata(self, doc_names: List[str], other_data: Dict) -> None:
+        for doc_name in doc_names:
+            for key in other_data['documents'].get(doc_name, set()):
+                self.note_occurrence(doc_name, key,
+                                     other_data['elements'][key][doc_name])
+
+    def process_doc(self, env: BuildEnvironment, doc_name: str,
+                    document: nodes.document) -> None:
+        occurrences: Dict[Tuple[str, str, bool],
+                          List[Tuple[str, List[str]]]] = {}
+        for node in document.traverse(literal_text):
+            if 'element' not in node:
+                continue
+            if not node['ids']:
+                node['ids'].append(make_id(env, document,
+                                           'ros-%s' % node['kind'],
+                                           node['element']))
+                document.set_id(node)
+            occurrences.setdefault(
+                (node['kind'], node['element'], node['local']), []).append(
+                (node['ids'][0], conditions(node)))
+
+        for key, anchors in occurrences.items():
+            self.note_occurrence(doc_name, key, anchors)
 
     # noinspection SpellCheckingInspection
     def resolve_any_xref(self, *args, **kwargs) -> List[Tuple[str, Node]]:
-        pass
+        return []
+
+
+def title(env: BuildEnvironment, doc_name: str) -> str:
+    return env.titles[doc_name].astext() if doc_name in env.titles \
+        else doc_name
 
 
 def divide_parts(parts: List[str], texts: List[str]) -> List[str]:
@@ -332,7 +554,24 @@ def process_comm(_app, _doc_name, source: List[str]) -> None:
     )
 
 
-def config_inited(_app, config: Config) -> None:
+def load_inventory(file_name: str) -> None:
+    global inventory
+
+    # the inventory is only loaded again if it changed, e.g. for several
+    # builds in one process
+    if (inventory is None or inventory.file_name != file_name
+            or inventory.modified != os.path.getmtime(file_name)):
+        inventory = Inventory(file_name)
+
+
+def config_inited(app: Sphinx, config: Config) -> None:
+    global inventory
+
+    if config['ros_inventory']:
+        load_inventory(os.path.join(app.confdir, config['ros_inventory']))
+    else:
+        inventory = None
+
     ROSDomain.box_color = config['ros_element_box_color']
     ROSDomain.index_color = config['ros_element_index_color']
 
@@ -361,6 +600,7 @@ def setup(app: Sphinx) -> None:
     app.add_config_value('ros_element_action_color', (255, 69, 0), 'env')
     app.add_config_value('ros_element_topic_color', (160, 32, 240), 'env')
     app.add_config_value('ros_element_parameter_color', (47, 79, 79), 'env')
+    app.add_config_value('ros_inventory', None, 'env')
 
     app.add_domain(ROSDomain)
     app.add_stylesheet('style/ros_element.css')
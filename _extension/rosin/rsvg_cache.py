@@ -0,0 +1,180 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.RSVG_Cache extension of Sphinx wraps the `sphinxcontrib.rsvgconverter`
+and keeps every SVG image that was converted to PDF in a cache. The cache is
+keyed by the content of the SVG image and the converter settings, so an image is
+only converted again if it has actually been changed. All builds and editions
+share the same cache, and the converted images are hardlinked from there if the
+file system allows so, otherwise they are copied.
+
+Images missing in the cache are converted in parallel before the documents are
+written. After each build the least recently used images are evicted until the
+cache fits into `rsvg_cache_size` bytes again.
+
+Example:
+`conf.py`
+```
+extensions = [
+    'rosin.rsvg_cache',  # instead of 'sphinxcontrib.rsvgconverter'
+]
+rsvg_cache_directory = 'build/cache/rsvg'  # optional
+rsvg_cache_size = 256 * 1024 * 1024  # optional, in bytes
+rsvg_cache_jobs = 4  # optional, defaults to the number of CPUs
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.2"
+
+import hashlib
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+from sphinx.util import logging
+from sphinx.util.osutil import copyfile
+from sphinxcontrib.rsvgconverter import RSVGConverter
+
+logger = logging.getLogger(__name__)
+
+
+def cache_directory(app: Sphinx) -> str:
+    return os.path.join(app.srcdir, app.config.rsvg_cache_directory
+                        or os.path.join(app.doctreedir, 'rsvg'))
+
+
+def cache_file_name(app: Sphinx, _from: str) -> str:
+    content_hash = hashlib.sha256()
+    content_hash.update(repr([app.config.rsvg_converter_bin,
+                              app.config.rsvg_converter_args]).encode('utf-8'))
+    with open(_from, 'rb') as file:
+        content_hash.update(file.read())
+    digest: str = content_hash.hexdigest()
+
+    return os.path.join(cache_directory(app), digest[:2], '%s.pdf' % digest)
+
+
+def fill_cache(app: Sphinx, _from: str) -> str:
+    file_name: str = cache_file_name(app, _from)
+    if os.path.isfile(file_name):
+        os.utime(file_name)  # the least recently used images are evicted
+        return file_name
+
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    # several builds may convert the same image at the same time
+    temporary_file_name: str = '%s.%d.%d.tmp' % (file_name, os.getpid(),
+                                                 id(_from))
+    process = subprocess.run(
+        [app.config.rsvg_converter_bin] + app.config.rsvg_converter_args
+        + ['--format=pdf', '--output=' + temporary_file_name, _from],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if process.returncode != 0:
+        if os.path.isfile(temporary_file_name):
+            os.remove(temporary_file_name)
+        raise OSError(process.stderr.decode('utf-8', errors='replace'))
+    os.replace(temporary_file_name, file_name)
+
+    return file_name
+
+
+def link(source: str, destination: str) -> None:
+    if os.path.isfile(destination):
+        if os.path.samefile(source, destination):
+            return
+        # never write into an image, it might be a link into the cache
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        copyfile(source, destination)
+
+
+class CachedRSVGConverter(RSVGConverter):
+    # run before the original converter, which then has nothing left to do
+    default_priority: int = RSVGConverter.default_priority - 1
+
+    def convert(self, _from: str, _to: str) -> bool:
+        try:
+            link(fill_cache(self.app, _from), _to)
+        except OSError:
+            # the original converter reports why the conversion failed
+            return super().convert(_from, _to)
+
+        return True
+
+
+def env_updated(app: Sphinx, env: BuildEnvironment) -> List[str]:
+    # only builders that write output without native SVG support need
+    # converted images, e.g. not the `read` builder of rosin.Reader
+    if (not app.builder.format
+            or 'image/svg+xml' in app.builder.supported_image_types
+            or shutil.which(app.config.rsvg_converter_bin) is None):
+        return []
+
+    svg_file_names: List[str] = [
+        os.path.join(app.srcdir, image) for image in sorted(env.images)
+        if image.lower().endswith('.svg')
+        and os.path.isfile(os.path.join(app.srcdir, image))]
+    missing: List[str] = [file_name for file_name in svg_file_names
+                          if not os.path.isfile(cache_file_name(app,
+                                                                file_name))]
+    if not missing:
+        return []
+
+    def convert(file_name: str) -> None:
+        try:
+            fill_cache(app, file_name)
+        except OSError:
+            pass  # reported by the converter when the image is written
+
+    logger.info("converting %d SVG images in parallel" % len(missing))
+    with ThreadPoolExecutor(max_workers=app.config.rsvg_cache_jobs
+                            or os.cpu_count() or 1) as executor:
+        list(executor.map(convert, missing))
+
+    return []
+
+
+def build_finished(app: Sphinx, exception: Exception) -> None:
+    directory: str = cache_directory(app)
+    if exception is not None or not os.path.isdir(directory):
+        return
+
+    entries: List[Tuple[float, int, str]] = []
+    for path, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            if file_name.endswith('.tmp'):
+                continue  # still being converted by another build
+            full_file_name: str = os.path.join(path, file_name)
+            status = os.stat(full_file_name)
+            entries.append((status.st_mtime, status.st_size, full_file_name))
+
+    size: int = sum(entry[1] for entry in entries)
+    # linked images stay valid in the builds after their entry is evicted
+    for _, file_size, file_name in sorted(entries):
+        if size <= app.config.rsvg_cache_size:
+            break
+        try:
+            os.remove(file_name)
+        except OSError:
+            continue
+        size -= file_size
+
+
+def setup(app: Sphinx) -> None:
+    app.setup_extension('sphinxcontrib.rsvgconverter')
+    app.add_config_value('rsvg_cache_directory', None, '')
+    app.add_config_value('rsvg_cache_size', 256 * 1024 * 1024, '')
+    app.add_config_value('rsvg_cache_jobs', None, '')
+    app.add_post_transform(CachedRSVGConverter)
+    app.connect('env-updated', env_updated)
+    app.connect('build-finished', build_finished)
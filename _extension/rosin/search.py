@@ -0,0 +1,234 @@
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+The rosin.Search extension of Sphinx splits the search index of the HTML output
+into shards, so the browser no longer downloads the whole index of a course on
+the first search. The base of the index with the titles and objects of all
+documents is written to `_static/searchindex/base.js`, and the full-text terms
+are written to one shard per term prefix, e.g. `_static/searchindex/ro.js`. The
+search page loads the base instead of `searchindex.js`, and each query loads
+only the shards of its words. While a word is typed into any search box, its
+shard is already prefetched.
+
+Glossary terms, e.g. of `general_glossary.rst`, and the names of all ROS
+elements, e.g. :ros:node:`turtlesim_node turtlesim`, are indexed as objects, so
+they are found like the objects of other domains and ranked above full-text
+matches. ROS elements in an `only` directive are indexed only if they are part
+of the output.
+
+Partial matches of a word are searched for in its own shard, i.e. a query finds
+terms that start with the same two characters. Sphinx still writes
+`searchindex.js`, which it needs for incremental builds.
+
+Example:
+`conf.py`
+```
+extensions = [
+    'rosin.search',
+]
+search_sharding = True  # optional, disable to load the full index
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import glob
+import html
+import json
+import os
+import re
+from typing import Any, Dict, List, Set, Tuple
+
+from docutils import nodes
+from docutils.nodes import Node
+from sphinx import addnodes
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+PREFIX_LENGTH: int = 2  # must match `prefixLength` of `search_shards.js`
+ROS_CLASS_PATTERN = re.compile(r'^ros-([a-z]+)')
+SHARD_DIRECTORY: str = os.path.join('_static', 'searchindex')
+UNSAFE_PATTERN = re.compile(r'[^a-z0-9]')
+
+# kind of the ROS element, its name, the anchor of its section, and the
+# conditions of the enclosing `only`
+Element = Tuple[str, str, str, List[str]]
+
+
+def shard_key(term: str) -> str:
+    return UNSAFE_PATTERN.sub('_', term.lower()[:PREFIX_LENGTH])
+
+
+def conditions(node: Node) -> List[str]:
+    expressions: List[str] = []
+    while node is not None:
+        if isinstance(node, addnodes.only):
+            expressions.append(node['expr'])
+        node = node.parent
+
+    return expressions
+
+
+def section_anchor(node: Node) -> str:
+    while node is not None:
+        if isinstance(node, nodes.section) and node['ids']:
+            return node['ids'][0]
+        node = node.parent
+
+    return ''
+
+
+def doctree_read(app: Sphinx, doctree: nodes.document) -> None:
+    elements: List[Element] = []
+    for node in doctree.traverse(
+            lambda candidate: isinstance(candidate, nodes.Element)
+            and 'ros' in candidate.get('classes', [])):
+        kinds: List[str] = [match.group(1) for match
+                            in map(ROS_CLASS_PATTERN.match, node['classes'])
+                            if match is not None]
+        if kinds and len(node) > 0:
+            # the first child is the name, an index may follow as superscript
+            elements.append((kinds[0], node[0].astext(), section_anchor(node),
+                             conditions(node)))
+
+    if not hasattr(app.env, 'search_elements'):
+        app.env.search_elements = {}
+    app.env.search_elements[app.env.docname] = elements
+
+
+def env_purge_doc(_app: Sphinx, env: BuildEnvironment, doc_name: str) -> None:
+    if hasattr(env, 'search_elements'):
+        env.search_elements.pop(doc_name, None)
+
+
+# noinspection SpellCheckingInspection
+def env_merge_info(_app: Sphinx, env: BuildEnvironment, doc_names: Set[str],
+                   other: BuildEnvironment) -> None:
+    if not hasattr(env, 'search_elements'):
+        env.search_elements = {}
+    for doc_name in doc_names:
+        if doc_name in getattr(other, 'search_elements', {}):
+            env.search_elements[doc_name] = other.search_elements[doc_name]
+
+
+def add_objects(app: Sphinx, index: Dict[str, Any]) -> int:
+    """Adds glossary terms and ROS elements to the objects of the index."""
+    doc_indices: Dict[str, int] = {doc_name: position for position, doc_name
+                                   in enumerate(index['docnames'])}
+    type_indices: Dict[str, int] = {name: int(position) for position, name
+                                    in index['objtypes'].items()}
+
+    def add(object_type: str, type_name: str, name: str, doc_name: str,
+            anchor: str) -> bool:
+        if object_type not in type_indices:
+            type_indices[object_type] = len(type_indices)
+            index['objtypes'][type_indices[object_type]] = object_type
+            index['objnames'][type_indices[object_type]] = (
+                *object_type.split(':', 1), type_name)
+        prefix, _, last_name = html.escape(name).rpartition('.')
+        entries: Dict[str, Any] = index['objects'].setdefault(prefix, {})
+        if last_name in entries:
+            return False
+        # priority 1 ranks them like the objects of the other domains
+        entries[last_name] = (doc_indices[doc_name], type_indices[object_type],
+                              1, anchor)
+        return True
+
+    added: int = 0
+    for (object_type, name), (doc_name, anchor) in sorted(
+            app.env.get_domain('std').objects.items()):
+        if object_type == 'term' and doc_name in doc_indices:
+            added += add('std:term', "glossary term", name, doc_name, anchor)
+
+    def visible(expressions: List[str]) -> bool:
+        try:
+            return all(app.builder.tags.eval_condition(expression)
+                       for expression in expressions)
+        except ValueError:
+            return True
+
+    elements: Dict[str, List[Element]] = getattr(app.env, 'search_elements',
+                                                 {})
+    for doc_name in sorted(elements):
+        if doc_name not in doc_indices:
+            continue
+        for kind, name, anchor, expressions in elements[doc_name]:
+            if visible(expressions):
+                added += add('ros:%s' % kind, "ROS %s" % kind, name, doc_name,
+                             anchor)
+
+    return added
+
+
+def write_file(file_name: str, content: str) -> bool:
+    # unchanged shards keep their time, so they are not compressed and
+    # deployed again
+    if os.path.isfile(file_name):
+        with open(file_name, 'r', encoding='utf-8') as file:
+            if file.read() == content:
+                return False
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+    return True
+
+
+def dump(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'),
+                      sort_keys=True)
+
+
+def build_finished(app: Sphinx, exception: Exception) -> None:
+    if (exception is not None or app.builder.format != 'html'
+            or getattr(app.builder, 'indexer', None) is None):
+        return
+
+    directory: str = os.path.join(app.outdir, SHARD_DIRECTORY)
+    if not app.config.search_sharding:
+        for file_name in glob.glob(os.path.join(directory, '*.js')):
+            os.remove(file_name)
+        return
+
+    index: Dict[str, Any] = app.builder.indexer.freeze()
+    index.pop('envversion', None)
+    # the indexer keeps using its own mapping of the object names
+    index['objnames'] = dict(index['objnames'])
+    objects: int = add_objects(app, index)
+
+    shards: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for kind in ['terms', 'titleterms']:
+        for term, documents in index.pop(kind).items():
+            shards.setdefault(shard_key(term), {'terms': {}, 'titleterms': {}}
+                              )[kind][term] = documents
+        index[kind] = {}
+    index['shards'] = sorted(shards)
+
+    os.makedirs(directory, exist_ok=True)
+    written: int = 0
+    for key, shard in shards.items():
+        written += write_file(os.path.join(directory, '%s.js' % key),
+                              'SearchShards.add(%s,%s)' % (dump(key),
+                                                           dump(shard)))
+    written += write_file(os.path.join(directory, 'base.js'),
+                          'Search.setIndex(%s)' % dump(index))
+    for file_name in glob.glob(os.path.join(directory, '*.js')):
+        name: str = os.path.splitext(os.path.basename(file_name))[0]
+        if name != 'base' and name not in shards:
+            os.remove(file_name)
+
+    logger.info("search index: %d shards, %d objects added, %d files written"
+                % (len(shards), objects, written))
+
+
+def setup(app: Sphinx) -> None:
+    app.add_config_value('search_sharding', True, 'html')
+    app.add_js_file('script/search_shards.js')
+    app.connect('doctree-read', doctree_read)
+    app.connect('env-purge-doc', env_purge_doc)
+    app.connect('env-merge-info', env_merge_info)
+    app.connect('build-finished', build_finished)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Measures the size of a GUI-heavy page written by the rosin.GUI extension. A
+temporary Sphinx project with a page that repeats every GUI role is built with
+the HTML builder, and the size of the page is compared with the size it would
+have if every icon was still pasted as an inline data URI, which are now
+defined once in the cacheable `gui.css`.
+
+Example:
+```
+_script/benchmark_gui.py --repetitions 50
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import os
+import re
+import tempfile
+from typing import Dict
+
+from sphinx.cmd.build import build_main
+
+ROOT: str = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir)
+GUI_STYLE: str = os.path.join(ROOT, '_static', 'style', 'gui.css')
+ICON_PATTERN = re.compile(r'span\.gui-icon-([\w-]+) {\s*'
+                          r'background-image: url\("([^"]+)"\);')
+PARAGRAPH: str = """
+Click :gui:button:`Apply`, select :gui:radio:`Off` or
+:gui:radio-selected:`On`, toggle :gui:checkbox:`Verbose`,
+:gui:checkbox-selected:`Colored` and :gui:checkbox-indeterminate:`Partial`,
+type into :gui:textbox:`catkin_ws` and choose :gui:dropdown:`Melodic` in the
+:gui:label:`Settings` dialog.
+"""
+
+
+def build_page(directory: str, repetitions: int) -> str:
+    source: str = os.path.join(directory, 'source')
+    output: str = os.path.join(directory, 'html')
+    os.makedirs(source)
+
+    with open(os.path.join(source, 'conf.py'), 'w') as file:
+        file.write("import sys\n"
+                   "sys.path.append(%r)\n"
+                   "extensions = ['rosin.gui']\n"
+                   "master_doc = 'index'\n"
+                   % os.path.abspath(os.path.join(ROOT, '_extension')))
+    with open(os.path.join(source, 'index.rst'), 'w') as file:
+        file.write("GUI Benchmark\n=============\n")
+        file.write(PARAGRAPH * repetitions)
+
+    if build_main(['-q', '-b', 'html', source, output]) != 0:
+        raise RuntimeError("The benchmark page could not be built.")
+
+    return os.path.join(output, 'index.html')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures the page size saved by defining the icons of "
+                    "the GUI roles once in the style sheet.",
+    )
+    parser.add_argument('-r', '--repetitions',
+                        metavar='number',
+                        type=int,
+                        default=50,
+                        help="Specify how often the paragraph with all GUI "
+                             "roles is repeated on the page.",
+                        )
+    arguments = parser.parse_args()
+
+    with open(GUI_STYLE, 'r') as file:
+        icons: Dict[str, str] = dict(ICON_PATTERN.findall(file.read()))
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(build_page(directory, arguments.repetitions), 'r') as file:
+            page: str = file.read()
+
+    page_size: int = len(page.encode('utf-8'))
+    inline_size: int = page_size
+    occurrences: int = 0
+    for name, uri in icons.items():
+        reference: str = '<span class="gui-icon gui-icon-%s"></span>' % name
+        count: int = page.count(reference)
+        occurrences += count
+        inline_size += count * (len('<img src="%s"/>' % uri) - len(reference))
+
+    print("Icons on the page:     %8d" % occurrences)
+    print("Page with inline icons: %7d bytes" % inline_size)
+    print("Page with icon classes: %7d bytes" % page_size)
+    print("Saved:                  %7d bytes (%.1f %%)"
+          % (inline_size - page_size,
+             100.0 * (inline_size - page_size) / inline_size))
+    print("Icons in 'gui.css':     %7d bytes, loaded once and cached"
+          % sum(len(uri) for uri in icons.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Times the functions of the rosin extensions and the course generator that run
+for every document in isolation, and compares them with a stored baseline. The
+inputs are synthetic units of `benchmark_scaling.py` with a fixed seed, so the
+timings only change with the code and the machine. Each function is called
+`--number` times per repetition, and the fastest of `--repeat` repetitions is
+taken as the time per call.
+
+The first run writes the baseline, e.g. on the main branch, and later runs fail
+with exit code 1 if a function became slower than the baseline by more than
+`--threshold` percent. Baselines are only comparable on the same machine.
+
+Benchmarks:
+-  `process_selectors` and `generate_expression` of rosin.Didactic
+-  `process_comm` and `divide_parts` of rosin.ROS_Element
+-  `scan` of rosin.Meta, which tokenizes the meta directives of all units
+-  `generate_flags` of the course generator for a course of nested modules
+
+Example:
+```
+_script/benchmark_micro.py --save-baseline
+_script/benchmark_micro.py --threshold 10 --benchmarks process_comm scan
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple
+
+from sphinx.util.tags import Tags
+
+import benchmark_scaling
+import course_generator
+
+# the extensions are imported from next to the scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, '_extension'))
+from rosin import didactic, ros_element  # noqa: E402
+from rosin.meta import MetaDoc  # noqa: E402
+
+SEED: int = 0
+UNITS: int = 200
+DEFAULT_BASELINE: str = os.path.join('build', 'benchmark',
+                                     'micro_baseline.json')
+EXPRESSIONS: List[Tuple[str, str]] = [
+    ('level', 'beginner'),
+    ('level', 'intermediate advanced'),
+    ('scenario', 'linux'),
+    ('scenario', 'python cpp turtlesim'),
+]
+
+
+class Benchmark(object):
+    """A function and a factory of fresh arguments for every call."""
+
+    def __init__(self, function: Callable[..., Any],
+                 arguments: Callable[[], Tuple[Any, ...]]):
+        self.function = function
+        self.arguments = arguments
+
+    def measure(self, number: int, repeat: int) -> float:
+        best: float = float('inf')
+        for _ in range(repeat):
+            # arguments are created beforehand, e.g. sources are modified in
+            # place by the functions
+            calls: List[Tuple[Any, ...]] = [self.arguments()
+                                            for _ in range(number)]
+            start: float = time.perf_counter()
+            for arguments in calls:
+                self.function(*arguments)
+            best = min(best, time.perf_counter() - start)
+
+        return best / number
+
+
+def load_configuration() -> Dict[str, Any]:
+    """Executes the `conf.py` like Sphinx, e.g. for the didactic options."""
+    configuration: Dict[str, Any] = {'tags': Tags()}
+    with open(os.path.join(benchmark_scaling.ROOT, 'conf.py'), 'r') as file:
+        exec(file.read(), configuration)
+
+    return configuration
+
+
+def create_benchmarks(root: str) -> Dict[str, Benchmark]:
+    configuration: Dict[str, Any] = load_configuration()
+    didactic.config_inited(None, configuration)
+    app = SimpleNamespace(config=SimpleNamespace(
+        hex_hash=configuration['hex_hash']))
+
+    # the course of nested modules and the units are files, like in a build
+    benchmark_scaling.generate_corpus(root, UNITS, 10, 4, SEED)
+    found_docs: List[str] = [benchmark_scaling.unit_name(index, 10)
+                             for index in range(UNITS)]
+    contents: List[str] = []
+    for doc in found_docs:
+        with open(os.path.join(root, '%s.rst' % doc), 'r') as file:
+            contents.append(file.read())
+    sources: str = '\n'.join(contents)
+    parts: List[Tuple[List[str], List[str]]] = [
+        (ros_element.ROSDomain.roles[role].parts, texts) for role, texts in [
+            ('node', ['turtlesim_node', 'turtlesim']),
+            ('topic-inp', ['chatter', 'talker', 'short', 'rospy_tutorials']),
+            ('parameter-np', ['rate', 'short', 'node', 'package']),
+            ('package-i', ['local_package']),
+        ]]
+
+    course_generator.Arguments.root = root
+    course_generator.Arguments.indices = os.path.join('build', 'indices')
+    course_generator.Parse.load_sphinx_configuration(root)
+    config: dict = course_generator.Parse.load_configuration(
+        os.path.join(root, benchmark_scaling.COURSE))
+
+    return {
+        'process_selectors': Benchmark(
+            didactic.process_selectors,
+            lambda: (app, 'unit/benchmark', [sources])),
+        'generate_expression': Benchmark(
+            lambda: [didactic.generate_expression(app, 'unit/benchmark',
+                                                  directive, original)
+                     for directive, original in EXPRESSIONS],
+            tuple),
+        'process_comm': Benchmark(
+            ros_element.process_comm,
+            lambda: (None, 'unit/benchmark', [sources])),
+        'divide_parts': Benchmark(
+            lambda: [ros_element.divide_parts(role_parts, texts)
+                     for role_parts, texts in parts],
+            tuple),
+        'scan': Benchmark(MetaDoc.scan, lambda: (found_docs,)),
+        'generate_flags': Benchmark(
+            course_generator.Build.generate_flags,
+            lambda: (copy.deepcopy(config), 'course_synthetic')),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times the functions of the extensions and the course "
+                    "generator that run for every document, and fails if "
+                    "they regressed against the baseline.",
+    )
+    parser.add_argument('-b', '--benchmarks',
+                        metavar='name',
+                        nargs='+',
+                        help="Specify the benchmarks to run, defaults to all.",
+                        )
+    parser.add_argument('-n', '--number',
+                        metavar='calls',
+                        type=int,
+                        default=20,
+                        help="Specify how often a function is called in one "
+                             "repetition.",
+                        )
+    parser.add_argument('-r', '--repeat',
+                        metavar='repetitions',
+                        type=int,
+                        default=5,
+                        help="Specify how often the calls are repeated, the "
+                             "fastest repetition is taken.",
+                        )
+    parser.add_argument('-t', '--threshold',
+                        metavar='percent',
+                        type=float,
+                        default=20.0,
+                        help="Specify by how many percent a function may be "
+                             "slower than the baseline.",
+                        )
+    parser.add_argument('--baseline',
+                        metavar='file',
+                        default=DEFAULT_BASELINE,
+                        help="Specify the JSON file of the baseline.",
+                        )
+    parser.add_argument('--save-baseline',
+                        action='store_true',
+                        help="Save the results as new baseline instead of "
+                             "comparing them.",
+                        )
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_micro_') as root:
+        benchmarks: Dict[str, Benchmark] = create_benchmarks(root)
+        names: List[str] = arguments.benchmarks or list(benchmarks)
+        unknown: List[str] = [name for name in names if name not in benchmarks]
+        if unknown:
+            parser.error("unknown benchmarks %s, choose from %s"
+                         % (unknown, list(benchmarks)))
+        # the course generator resolves the components relative to the root
+        directory: str = os.getcwd()
+        os.chdir(root)
+        try:
+            results: Dict[str, float] = {
+                name: benchmarks[name].measure(arguments.number,
+                                               arguments.repeat)
+                for name in names}
+        finally:
+            os.chdir(directory)
+
+    baseline: Dict[str, Any] = {}
+    if not arguments.save_baseline and os.path.isfile(arguments.baseline):
+        with open(arguments.baseline, 'r') as file:
+            baseline = json.load(file)
+    regressions: List[str] = []
+    print("%-20s %12s %12s %8s" % ("benchmark", "ms per call", "baseline",
+                                   "ratio"))
+    for name, seconds in results.items():
+        before: float = baseline.get('results', {}).get(name)
+        ratio: float = seconds / before if before else None
+        if ratio is not None and ratio > 1 + arguments.threshold / 100:
+            regressions.append(name)
+        print("%-20s %12.4f %12s %8s%s"
+              % (name, seconds * 1000,
+                 '%.4f' % (before * 1000) if before else '-',
+                 '%.2f' % ratio if ratio is not None else '-',
+                 '  REGRESSION' if name in regressions else ''))
+
+    if arguments.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(arguments.baseline)),
+                    exist_ok=True)
+        with open(arguments.baseline, 'w') as file:
+            json.dump({**benchmark_scaling.commit(),
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'number': arguments.number,
+                       'repeat': arguments.repeat,
+                       'results': results}, file, indent=2, sort_keys=True)
+        print("Baseline written to %s." % arguments.baseline)
+    elif not baseline:
+        print("There is no baseline in %s yet, save one with "
+              "--save-baseline." % arguments.baseline)
+    elif regressions:
+        print("%d benchmarks are slower than the baseline by more than "
+              "%.0f %%: %s" % (len(regressions), arguments.threshold,
+                               ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Measures how the course generator, the rosin.Meta extension, and Sphinx scale
+with the number of units. For each size, a synthetic corpus is generated into a
+temporary root next to the extensions, style sheets, and resources of this
+repository. Every unit has a meta directive, a glossary, a program with an
+option, level and scenario directives, and uses the `:term:`, `:r-term:`,
+`:program:`, `:option:`, `:ros:`, and `:gui:` roles. The units are grouped into
+modules, the modules into chapters, and the chapters into one course. Every
+fourth unit is not part of a module and only shows up if another unit of the
+course requires or mentions it.
+
+The following phases are timed:
+-  `compile` loads the nested YAML files and writes the indices and flags
+-  `scan` parses the meta data of all documents
+-  `closure` resolves the required and mentioned documents of the course
+-  `read` reads all sources with Sphinx into the doctrees
+-  `write` writes the HTML output from the doctrees
+
+The results are written as JSON together with the commit of the repository, so
+they can be compared across commits with `--compare`. The corpus is generated
+with a fixed seed, i.e. the same size always yields the same units.
+
+Example:
+```
+_script/benchmark_scaling.py --sizes 100 1000 --phases compile scan closure
+_script/benchmark_scaling.py --compare build/benchmark/scaling_0123456.json
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Set
+
+import sphinx
+import yaml
+
+import course_generator
+
+# rosin.meta is imported from the extensions next to the scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, '_extension'))
+from rosin.meta import MetaDoc  # noqa: E402
+
+ROOT: str = os.path.abspath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir))
+LINKED_DIRECTORIES: List[str] = ['_extension', '_extra', '_resource',
+                                 '_static', '_template']
+COPIED_FILES: List[str] = ['conf.py', 'contributors.rst',
+                           'general_glossary.rst', 'guideline.rst']
+PHASES: List[str] = ['compile', 'scan', 'closure', 'read', 'write']
+COURSE: str = os.path.join('course', 'synthetic.yaml')
+EDITION: str = course_generator.LEARNER
+UNIT_TYPES: List[str] = ['lecture', 'tutorial', 'workshop', 'narrative']
+UNIT_INTERACTIONS: List[str] = ['theory', 'mixed', 'practice']
+LEVELS: List[str] = ['beginner', 'intermediate', 'advanced']
+SCENARIOS: List[str] = ['linux', 'windows', 'cpp', 'python', 'turtlesim',
+                        'turtlebot_3']
+GUI_ROLES: List[str] = ['button', 'checkbox-selected', 'dropdown', 'label',
+                        'radio', 'textbox']
+WORDS: List[str] = [
+    'robot', 'node', 'topic', 'message', 'service', 'action', 'parameter',
+    'launch', 'package', 'workspace', 'transform', 'frame', 'sensor', 'laser',
+    'camera', 'odometry', 'map', 'goal', 'trajectory', 'joint', 'gripper',
+    'controller', 'publisher', 'subscriber', 'callback', 'namespace', 'bag',
+    'visualization', 'simulation', 'driver', 'calibration', 'localization',
+]
+UNIT_TEMPLATE: str = """.. meta::
+   :keywords lang=en: {keywords}
+   :description lang=en: {description}
+   :unit-type: {type}
+   :unit-interaction: {interaction}
+   :unit-duration: beginner/{beginner}, advanced/{advanced}
+{requires}
+.. sidebar:: Document Info
+
+   .. sectionauthor::
+      :term:`Meeßen, Marcus`
+
+{rule}
+{title}
+{rule}
+
+Introduction
+============
+
+{paragraph} This unit builds on :r-term:`{required_term}` and refers to
+:term:`{mentioned_term}`. The node :ros:node-i:`{node} {package}` publishes
+:ros:topic-i:`{topic}`, which is shown by :ros:node:`rqt_graph rqt_graph`. Run
+:program:`{mentioned_program}` with :option:`{mentioned_program} --rate`,
+then click :gui:{gui_role}:`{gui_label}` to continue.
+
+.. level:: beginner
+
+   {paragraph}
+
+.. level:: intermediate advanced
+
+   {paragraph}
+
+.. scenario:: {scenario}
+
+   {paragraph}
+
+.. scenario:: python cpp
+
+   .. code-block:: python
+
+      import rospy
+      rospy.init_node('{node}')
+
+Usage
+=====
+
+.. program:: {program}
+
+.. option:: --rate
+
+   {paragraph}
+
+.. code-block:: bash
+
+   $ {program} --rate 10
+
+Glossary
+========
+
+.. glossary::
+
+   {term}
+      {paragraph}
+"""
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    words: List[str] = [rng.choice(WORDS) for _ in range(length)]
+
+    return '%s.' % ' '.join(words).capitalize()
+
+
+def unit_name(index: int, per_module: int) -> str:
+    return 'unit/m%04d/%s/u%05d' % (index // per_module,
+                                    UNIT_TYPES[index % len(UNIT_TYPES)], index)
+
+
+def unit_content(rng: random.Random, index: int, units: int,
+                 per_module: int) -> str:
+    title: str = 'Synthetic Unit %05d: %s' % (
+        index, sentence(rng, 3)[:-1].title())
+    # required terms are close, mentioned terms are anywhere in the corpus
+    required: int = rng.randrange(max(0, index - 20), index or 1)
+    requires: str = ('   :unit-requires: %s\n'
+                     % unit_name(index - 1, per_module)
+                     if index % 5 == 1 else '')
+
+    return UNIT_TEMPLATE.format(
+        keywords=', '.join(rng.sample(WORDS, 3)),
+        description=sentence(rng, 8),
+        type=UNIT_TYPES[index % len(UNIT_TYPES)],
+        interaction=rng.choice(UNIT_INTERACTIONS),
+        beginner=rng.randrange(10, 60, 5),
+        advanced=rng.randrange(5, 30, 5),
+        requires=requires,
+        rule='*' * len(title),
+        title=title,
+        paragraph=' '.join(sentence(rng, rng.randrange(6, 14))
+                           for _ in range(3)),
+        required_term='Synthetic Term %05d' % required,
+        mentioned_term='Synthetic Term %05d' % rng.randrange(units),
+        node='node_%05d' % index,
+        package='synthetic_%04d' % (index // per_module),
+        topic='/synthetic/%s_%05d' % (rng.choice(WORDS), index),
+        mentioned_program='tool_%05d' % rng.randrange(units),
+        gui_role=rng.choice(GUI_ROLES),
+        gui_label=rng.choice(WORDS).capitalize(),
+        scenario=' '.join(rng.sample(SCENARIOS, 2)),
+        program='tool_%05d' % index,
+        term='Synthetic Term %05d' % index,
+    )
+
+
+def write_yaml(file_name: str, config: dict) -> None:
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name, 'w') as file:
+        yaml.safe_dump(config, file, default_flow_style=None, sort_keys=False)
+
+
+def generate_corpus(root: str, units: int, per_module: int,
+                    per_chapter: int, seed: int) -> Dict[str, int]:
+    for directory in LINKED_DIRECTORIES:
+        os.symlink(os.path.join(ROOT, directory), os.path.join(root,
+                                                               directory))
+    for file_name in COPIED_FILES:
+        with open(os.path.join(ROOT, file_name), 'r') as source, \
+                open(os.path.join(root, file_name), 'w') as target:
+            target.write(source.read())
+
+    rng: random.Random = random.Random(seed)
+    modules: Dict[str, Dict[str, Any]] = {}
+    for index in range(units):
+        name: str = unit_name(index, per_module)
+        os.makedirs(os.path.join(root, os.path.dirname(name)), exist_ok=True)
+        with open(os.path.join(root, '%s.rst' % name), 'w') as file:
+            file.write(unit_content(rng, index, units, per_module))
+
+        module: str = 'module/m%04d' % (index // per_module)
+        components: Dict[str, Any] = modules.setdefault(module, {
+            course_generator.TITLE: 'Synthetic Module %04d'
+                                    % (index // per_module),
+            course_generator.COMPONENTS: {},
+        })[course_generator.COMPONENTS]
+        # every fourth unit is only reachable by its references
+        if index % 4 != 3:
+            components[name] = {
+                course_generator.LEVELS: [course_generator.DEFAULT,
+                                          rng.choice(LEVELS)],
+                course_generator.SCENARIOS: [rng.choice(
+                    SCENARIOS + [course_generator.ALL])],
+            }
+
+    chapters: Dict[str, Dict[str, Any]] = {}
+    for position, (module, config) in enumerate(sorted(modules.items())):
+        write_yaml(os.path.join(root, '%s.yaml' % module), config)
+        chapter: str = 'module/c%03d' % (position // per_chapter)
+        chapters.setdefault(chapter, {
+            course_generator.TITLE: 'Synthetic Chapter %03d'
+                                    % (position // per_chapter),
+            course_generator.COMPONENTS: {},
+        })[course_generator.COMPONENTS][module] = {}
+    for chapter, config in chapters.items():
+        write_yaml(os.path.join(root, '%s.yaml' % chapter), config)
+
+    write_yaml(os.path.join(root, COURSE), {
+        course_generator.TITLE: 'Synthetic Course',
+        course_generator.DEFAULT_SCENARIOS: ['linux'],
+        course_generator.DEFAULT_LEVELS: ['beginner'],
+        course_generator.DEFAULT_LECTURERS: ['John Doe'],
+        course_generator.COMPONENTS: {chapter: {} for chapter in chapters},
+    })
+
+    return {'units': units, 'modules': len(modules),
+            'chapters': len(chapters)}
+
+
+def find_documents() -> List[str]:
+    # the same documents the rosin.Meta extension scans
+    found_docs: List[str] = []
+    for root, _, files in os.walk(os.curdir):
+        for file in files:
+            if file.endswith('.rst'):
+                found_docs.append(os.path.splitext(os.path.relpath(
+                    os.path.join(root, file), start=os.curdir))[0])
+
+    return found_docs
+
+
+def run_sphinx(builder: str, flags: str, log_file_name: str) -> int:
+    """Runs a Sphinx builder like the course generator and counts warnings."""
+    command: str = course_generator.Build.generate_command(builder, EDITION,
+                                                           '%s -q' % flags)
+    with open(log_file_name, 'w') as log:
+        if subprocess.run(command, shell=True, stdout=subprocess.DEVNULL,
+                          stderr=log).returncode != 0:
+            raise RuntimeError("Sphinx failed, see '%s'." % log_file_name)
+    with open(log_file_name, 'r') as log:
+        return sum('WARNING' in line for line in log)
+
+
+def measure(units: int, phases: List[str], per_module: int, per_chapter: int,
+            seed: int) -> Dict[str, Any]:
+    result: Dict[str, Any] = {'phases': {}}
+    times: Dict[str, float] = result['phases']
+    directory: str = os.getcwd()
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_scaling_') as root:
+        start: float = time.perf_counter()
+        result.update(generate_corpus(root, units, per_module, per_chapter,
+                                      seed))
+        result['generate'] = time.perf_counter() - start
+        os.chdir(root)
+        try:
+            course_generator.Arguments.root = os.curdir
+            course_generator.Arguments.output = 'build'
+            course_generator.Arguments.source = COURSE
+            course_generator.Arguments.fragments = False
+            course_generator.Arguments.prepare_directories()
+
+            # the flags are needed by all later phases
+            start = time.perf_counter()
+            course_generator.Parse.load_sphinx_configuration(os.curdir)
+            config: dict = course_generator.Parse.load_configuration(COURSE)
+            flags: str = course_generator.Build.generate_course(config)
+            if 'compile' in phases:
+                times['compile'] = time.perf_counter() - start
+
+            if 'scan' in phases or 'closure' in phases:
+                start = time.perf_counter()
+                scanned, required_by, mentioned_by, provided_by = \
+                    MetaDoc.scan(find_documents())
+                if 'scan' in phases:
+                    times['scan'] = time.perf_counter() - start
+                result['documents'] = len(scanned)
+
+            if 'closure' in phases:
+                start = time.perf_counter()
+                tags: Set[str] = (set(flags.split(' -t ')[1:])
+                                  | set(course_generator.Parse.tags))
+                hex_hash = course_generator.hex_hash
+                course_docs: Set[str] = {doc for doc in scanned
+                                         if hex_hash(doc) in tags}
+                required, mentioned = MetaDoc.resolve(
+                    course_docs, required_by, mentioned_by, provided_by)
+                for doc in course_docs | required | mentioned:
+                    MetaDoc.tagged(hex_hash, doc, tags)
+                times['closure'] = time.perf_counter() - start
+                result.update({'course_documents': len(course_docs),
+                               'required': len(required),
+                               'mentioned': len(mentioned)})
+
+            for phase, builder in [
+                ('read', course_generator.READ_BUILDER),
+                ('write', 'html'),
+            ]:
+                if phase in phases:
+                    start = time.perf_counter()
+                    result['%s_warnings' % phase] = run_sphinx(
+                        builder, flags, os.path.join(
+                            directory, 'build', 'benchmark',
+                            'scaling_%d_%s.log' % (units, phase)))
+                    times[phase] = time.perf_counter() - start
+        finally:
+            os.chdir(directory)
+
+    return result
+
+
+def commit() -> Dict[str, Any]:
+    def git(*arguments: str) -> str:
+        return subprocess.run(['git', '-C', ROOT, *arguments],
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout.strip()
+
+    return {'commit': git('rev-parse', '--short', 'HEAD') or None,
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no',
+                              '--', '_extension', '_script'))}
+
+
+def print_results(results: Dict[str, Any],
+                  baseline: Dict[str, Any] = None) -> None:
+    previous: Dict[int, Dict[str, float]] = {
+        run['units']: run['phases'] for run in (baseline or {}).get('runs',
+                                                                     [])}
+    print("%8s %-8s %10s %10s %8s" % ("units", "phase", "seconds",
+                                      "baseline", "ratio"))
+    for run in results['runs']:
+        for phase, seconds in run['phases'].items():
+            before: float = previous.get(run['units'], {}).get(phase)
+            print("%8d %-8s %10.3f %10s %8s"
+                  % (run['units'], phase, seconds,
+                     '%.3f' % before if before else '-',
+                     '%.2f' % (seconds / before) if before else '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times the phases of a course build on synthetic corpora "
+                    "of several sizes.",
+    )
+    parser.add_argument('-s', '--sizes',
+                        metavar='units',
+                        type=int,
+                        nargs='+',
+                        default=[100, 1000, 10000],
+                        help="Specify the numbers of units of the generated "
+                             "corpora.",
+                        )
+    parser.add_argument('-p', '--phases',
+                        choices=PHASES,
+                        metavar='phase',
+                        nargs='+',
+                        default=PHASES,
+                        help="Specify the phases to time, choose from %s. "
+                             "The Sphinx phases take by far the longest."
+                             % ', '.join("'%s'" % phase for phase in PHASES),
+                        )
+    parser.add_argument('--units-per-module',
+                        metavar='number',
+                        type=int,
+                        default=10,
+                        help="Specify how many units are in a module.",
+                        )
+    parser.add_argument('--modules-per-chapter',
+                        metavar='number',
+                        type=int,
+                        default=10,
+                        help="Specify how many modules are in a chapter.",
+                        )
+    parser.add_argument('--seed',
+                        metavar='number',
+                        type=int,
+                        default=0,
+                        help="Specify the seed of the generated corpora.",
+                        )
+    parser.add_argument('-o', '--output',
+                        metavar='file',
+                        help="Specify the JSON file to write the results to, "
+                             "defaults to 'build/benchmark/scaling_<commit>"
+                             ".json'.",
+                        )
+    parser.add_argument('-c', '--compare',
+                        metavar='file',
+                        help="Specify the JSON file of a former run to "
+                             "compare the results with.",
+                        )
+    arguments = parser.parse_args()
+
+    os.makedirs(os.path.join('build', 'benchmark'), exist_ok=True)
+    results: Dict[str, Any] = {
+        **commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sphinx': sphinx.__version__,
+        'seed': arguments.seed,
+        'units_per_module': arguments.units_per_module,
+        'modules_per_chapter': arguments.modules_per_chapter,
+        'runs': [],
+    }
+    for units in arguments.sizes:
+        print("Measuring %d units..." % units)
+        results['runs'].append({'units': units, **measure(
+            units, arguments.phases, arguments.units_per_module,
+            arguments.modules_per_chapter, arguments.seed)})
+
+    output: str = arguments.output or os.path.join(
+        'build', 'benchmark', 'scaling_%s.json' % (results['commit']
+                                                   or 'unknown'))
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+    baseline: Dict[str, Any] = None
+    if arguments.compare is not None:
+        with open(arguments.compare, 'r') as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    print("Results written to %s." % output)
+
+
+if __name__ == "__main__":
+    main()
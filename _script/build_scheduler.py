@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Builds the full matrix of courses, editions, and formats of a release. Every
+course YAML file is expanded into a graph of jobs: the course is compiled into
+its indices first (scan), then the doctrees of each edition are read once
+(read), and finally the writers run on those doctrees (html, latex, pdf). The
+jobs are executed by a pool of local workers, ordered by their priority, so that
+quick HTML jobs are published before the slow PDF jobs. Failed jobs are retried,
+the state of every job is saved on disk to resume an interrupted or failed
+release, and a timing report is printed at the end. The state is removed after
+a successful release, so the next one builds all jobs again.
+
+Example:
+```
+_script/build_scheduler.py --sources course/*.yaml \\
+                           --editions author teacher+tutor learner \\
+                           --formats html pdf --jobs 8
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, \
+    wait
+from typing import Dict, List, Set, Tuple, Union
+
+import course_generator
+import deduplicate
+from course_generator import Arguments, Build, EDITION_CHOICES, LEARNER, \
+    Parse, READ_BUILDER
+
+FORMAT_CHOICES: List[str] = ['html', 'latex', 'pdf']
+PENDING: str = 'pending'
+RUNNING: str = 'running'
+DONE: str = 'done'
+FAILED: str = 'failed'
+SKIPPED: str = 'skipped'
+RESUMED: str = 'resumed'
+PRIORITIES: Dict[str, int] = {
+    'scan': 0,
+    'read': 1,
+    'html': 2,
+    'latex': 3,
+    'pdf': 4,
+}
+ROOT_LEASE: str = 'root'  # the generated 'index.rst' is shared by all courses
+
+
+class Job(object):
+    def __init__(self, name: str, command: str, kind: str,
+                 dependencies: List[str] = None, lease: Tuple[str, str] = None,
+                 pool: str = None, resumable: bool = True) -> None:
+        self.name: str = name
+        self.command: str = command
+        self.kind: str = kind
+        self.dependencies: List[str] = dependencies or []
+        self.priority: int = PRIORITIES[kind]
+        self.lease: Union[Tuple[str, str], None] = lease
+        self.pool: Union[str, None] = pool
+        self.resumable: bool = resumable
+        self.status: str = PENDING
+        self.attempts: int = 0
+        self.started: Union[float, None] = None
+        self.duration: float = 0.0
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.md5(self.command.encode('utf-8')).hexdigest()
+
+
+class State(object):
+    def __init__(self, file_name: str, fresh: bool = False) -> None:
+        self.file_name: str = file_name
+        self.jobs: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+        if not fresh and os.path.isfile(file_name):
+            with open(file_name, 'r') as file:
+                self.jobs = json.load(file).get('jobs', {})
+
+    def is_done(self, job: Job) -> bool:
+        entry: Union[dict, None] = self.jobs.get(job.name)
+        return (job.resumable and entry is not None
+                and entry['status'] == DONE
+                and entry['fingerprint'] == job.fingerprint)
+
+    def update(self, job: Job) -> None:
+        with self.lock:
+            self.jobs[job.name] = {
+                'status': job.status,
+                'fingerprint': job.fingerprint,
+                'attempts': job.attempts,
+                'duration': job.duration,
+            }
+
+            # write atomically, an interrupted run must leave a valid state
+            temporary_file_name: str = '%s.tmp' % self.file_name
+            with open(temporary_file_name, 'w') as file:
+                json.dump({'jobs': self.jobs}, file, indent=2, sort_keys=True)
+            os.replace(temporary_file_name, self.file_name)
+
+    def clear(self) -> None:
+        """Forgets all jobs, only an interrupted or failed run is resumed,
+        as the sources may change before the next one."""
+        with self.lock:
+            self.jobs = {}
+            if os.path.isfile(self.file_name):
+                os.remove(self.file_name)
+
+
+class Scheduler(object):
+    def __init__(self, jobs: List[Job], workers: int, retries: int,
+                 state: State, log_directory: str,
+                 pools: Dict[str, int] = None) -> None:
+        self.jobs: Dict[str, Job] = {job.name: job for job in jobs}
+        self.order: List[str] = [job.name for job in jobs]
+        self.workers: int = workers
+        self.retries: int = retries
+        self.state: State = state
+        self.log_directory: str = log_directory
+        self.pools: Dict[str, int] = pools or {}
+        self.lease_holders: Dict[str, str] = {}
+        self.lease_counts: Dict[Tuple[str, str], int] = {}
+
+        for job in jobs:
+            if job.lease is not None:
+                self.lease_counts.setdefault(job.lease, 0)
+                self.lease_counts[job.lease] += 1
+
+    def release(self, job: Job) -> None:
+        if job.lease is None:
+            return
+        self.lease_counts[job.lease] -= 1
+        resource, owner = job.lease
+        if (self.lease_counts[job.lease] == 0
+                and self.lease_holders.get(resource) == owner):
+            self.lease_holders.pop(resource)
+
+    def is_ready(self, job: Job, running: Set[str]) -> bool:
+        if job.status != PENDING:
+            return False
+        if any(self.jobs[dependency].status not in [DONE, RESUMED]
+               for dependency in job.dependencies):
+            return False
+        if job.pool is not None and self.pools.get(job.pool) is not None:
+            if (len([name for name in running
+                     if self.jobs[name].pool == job.pool])
+                    >= self.pools[job.pool]):
+                return False
+        if job.lease is not None:
+            resource, owner = job.lease
+            if self.lease_holders.get(resource, owner) != owner:
+                return False
+        return True
+
+    def skip_unreachable(self) -> None:
+        changed: bool = True
+        while changed:
+            changed = False
+            for job in self.jobs.values():
+                if job.status == PENDING and any(
+                        self.jobs[dependency].status in [FAILED, SKIPPED]
+                        for dependency in job.dependencies):
+                    job.status = SKIPPED
+                    self.release(job)
+                    changed = True
+
+    def execute(self, job: Job) -> bool:
+        log_file_name: str = os.path.join(self.log_directory, '%s.log'
+                                          % Build.flatten(job.name))
+        with open(log_file_name, 'a') as log:
+            log.write('$ %s\n' % job.command)
+            log.flush()
+            return subprocess.run(job.command, shell=True, stdout=log,
+                                  stderr=subprocess.STDOUT).returncode == 0
+
+    def run(self) -> bool:
+        os.makedirs(self.log_directory, exist_ok=True)
+
+        for job in self.jobs.values():
+            if self.state.is_done(job):
+                job.status = RESUMED
+                self.release(job)
+
+        running: Dict[Future, Job] = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                self.skip_unreachable()
+
+                # fill free workers with the most urgent jobs first
+                ready: List[Job] = sorted(
+                    [self.jobs[name] for name in self.order],
+                    key=lambda x: x.priority,
+                )
+                running_names: Set[str] = {job.name
+                                           for job in running.values()}
+                for job in ready:
+                    if len(running) >= self.workers:
+                        break
+                    if not self.is_ready(job, running_names):
+                        continue
+                    if job.lease is not None:
+                        resource, owner = job.lease
+                        self.lease_holders[resource] = owner
+                    job.status = RUNNING
+                    job.attempts += 1
+                    job.started = time.time()
+                    print("[%s] %s (attempt %d)"
+                          % (time.strftime('%H:%M:%S'), job.name,
+                             job.attempts))
+                    running[executor.submit(self.execute, job)] = job
+                    running_names.add(job.name)
+
+                if not running:
+                    break
+
+                finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = running.pop(future)
+                    job.duration += time.time() - job.started
+                    try:
+                        succeeded: bool = future.result()
+                    except OSError:
+                        succeeded = False
+
+                    if succeeded:
+                        job.status = DONE
+                    elif job.attempts <= self.retries:
+                        job.status = PENDING
+                        print("[%s] %s failed, retrying"
+                              % (time.strftime('%H:%M:%S'), job.name))
+                        continue
+                    else:
+                        job.status = FAILED
+                        print("[%s] %s failed, see the log in '%s'"
+                              % (time.strftime('%H:%M:%S'), job.name,
+                                 self.log_directory))
+
+                    self.release(job)
+                    self.state.update(job)
+
+        return all(job.status in [DONE, RESUMED] for job in self.jobs.values())
+
+    def report(self, wall_time: float) -> None:
+        width: int = max([len(name) for name in self.order] + [3])
+        print('-' * (width + 32))
+        print('%s  %-8s  %8s  %10s' % ('Job'.ljust(width), 'Status',
+                                       'Attempts', 'Time [s]'))
+        print('-' * (width + 32))
+        for name in self.order:
+            job = self.jobs[name]
+            print('%s  %-8s  %8d  %10.2f' % (name.ljust(width), job.status,
+                                             job.attempts, job.duration))
+        print('-' * (width + 32))
+
+        kinds: Dict[str, float] = {}
+        for job in self.jobs.values():
+            kinds.setdefault(job.kind, 0.0)
+            kinds[job.kind] += job.duration
+        for kind in sorted(kinds.keys(), key=lambda x: PRIORITIES[x]):
+            print('%s  %10.2f' % (('Total %s' % kind).ljust(width + 20),
+                                  kinds[kind]))
+        busy_time: float = sum(kinds.values())
+        print('%s  %10.2f' % ('Wall time'.ljust(width + 20), wall_time))
+        print('%s  %10.2f' % ('Parallelism'.ljust(width + 20),
+                              busy_time / wall_time if wall_time else 0.0))
+
+
+def generate_jobs(source: str, editions: List[str], formats: List[str],
+                  output: str, root: str) -> List[Job]:
+    course: str = Build.flatten(os.path.splitext(os.path.relpath(
+        source, start=root))[0])
+    lease: Tuple[str, str] = (ROOT_LEASE, course)
+
+    Arguments.source = source
+    Arguments.root = root
+    Arguments.output = os.path.join(output, course)
+    Arguments.prepare_directories()
+    flags: str = Build.generate_course_flags(Parse.load_configuration(source))
+
+    scan_name: str = 'scan:%s' % course
+    jobs: List[Job] = [
+        Job(scan_name,
+            '"%s" "%s" -s "%s" -r "%s" -o "%s" -e %s'
+            % (sys.executable, course_generator.__file__, source, root,
+               Arguments.output, ' '.join(editions)),
+            'scan',
+            lease=lease,
+            resumable=False,  # cheap, and the root index must be rewritten
+            ),
+    ]
+
+    for edition in editions:
+        read_name: str = 'read:%s/%s' % (course, edition)
+        jobs.append(Job(read_name,
+                        Build.generate_command(READ_BUILDER, edition,
+                                               flags),
+                        'read',
+                        dependencies=[scan_name],
+                        lease=lease,
+                        ))
+
+        for builder in ['html', 'latex']:
+            if builder in formats or (builder == 'latex' and 'pdf' in formats):
+                jobs.append(Job('%s:%s/%s' % (builder, course, edition),
+                                Build.generate_command(builder, edition, flags),
+                                builder,
+                                dependencies=[read_name],
+                                lease=lease,
+                                ))
+
+        if 'pdf' in formats:
+            # compiling LaTeX only touches the edition's own directory
+            jobs.append(Job('pdf:%s/%s' % (course, edition),
+                            Build.generate_pdf_command([edition]),
+                            'pdf',
+                            dependencies=['latex:%s/%s' % (course, edition)],
+                            pool='pdf',
+                            ))
+
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Builds several ROS-I Academy courses or programs in all "
+                    "requested editions and formats on a pool of workers.",
+    )
+    parser.add_argument('-s', '--sources',
+                        metavar='file',
+                        nargs='+',
+                        required=True,
+                        help="Specify the YAML files that describe the courses "
+                             "or programs.",
+                        )
+    parser.add_argument('-e', '--editions',
+                        choices=EDITION_CHOICES,
+                        metavar='edition',
+                        nargs='+',
+                        default=[LEARNER],
+                        help="Specify the editions to be generated, see "
+                             "'course_generator.py --help'.",
+                        )
+    parser.add_argument('-f', '--formats',
+                        choices=FORMAT_CHOICES,
+                        metavar='format',
+                        nargs='+',
+                        default=['html'],
+                        help="Specify the output formats, choose from %s."
+                             % ', '.join("'%s'" % x for x in FORMAT_CHOICES),
+                        )
+    parser.add_argument('-o', '--output',
+                        metavar='directory',
+                        default='./build',
+                        help="Specify where the courses are built, each course "
+                             "gets its own subdirectory.",
+                        )
+    parser.add_argument('-r', '--root',
+                        metavar='directory',
+                        default='.',
+                        help="Specify the root directory of the Sphinx "
+                             "documentation, i.e. where the 'conf.py' is "
+                             "located.",
+                        )
+    parser.add_argument('-j', '--jobs',
+                        metavar='number',
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help="Specify the number of parallel workers.",
+                        )
+    parser.add_argument('--pdf-jobs',
+                        metavar='number',
+                        type=int,
+                        default=None,
+                        help="Limit the number of workers compiling PDFs, "
+                             "defaults to one less than '--jobs' so that "
+                             "HTML jobs never starve.",
+                        )
+    parser.add_argument('--deduplicate',
+                        action='store_true',
+                        help="Hardlink identical files of the HTML output of "
+                             "all courses and editions after the build.",
+                        )
+    parser.add_argument('--pdf-fragments',
+                        dest='fragments',
+                        action='store_true',
+                        help="Compile every unit to a cached PDF fragment and "
+                             "assemble the course PDFs from these.",
+                        )
+    parser.add_argument('--retries',
+                        metavar='number',
+                        type=int,
+                        default=1,
+                        help="Specify how often a failed job is retried.",
+                        )
+    parser.add_argument('--state',
+                        metavar='file',
+                        default=None,
+                        help="Specify the file that stores the state of all "
+                             "jobs, defaults to '<output>/scheduler.json'.",
+                        )
+    parser.add_argument('--fresh',
+                        action='store_true',
+                        help="Ignore the saved state and run all jobs again.",
+                        )
+    arguments = parser.parse_args()
+
+    Parse.load_sphinx_configuration(arguments.root)
+    Arguments.fragments = arguments.fragments
+
+    jobs: List[Job] = []
+    for source in arguments.sources:
+        jobs += generate_jobs(source, arguments.editions, arguments.formats,
+                              arguments.output, arguments.root)
+
+    state = State(arguments.state or os.path.join(arguments.output,
+                                                  'scheduler.json'),
+                  fresh=arguments.fresh)
+    scheduler = Scheduler(jobs,
+                          workers=max(1, arguments.jobs),
+                          retries=arguments.retries,
+                          state=state,
+                          log_directory=os.path.join(arguments.output, 'logs'),
+                          pools={
+                              'pdf': (arguments.pdf_jobs
+                                      or max(1, arguments.jobs - 1)),
+                          },
+                          )
+
+    html_directories: List[str] = [
+        os.path.join(arguments.output, Build.flatten(os.path.splitext(
+            os.path.relpath(source, start=arguments.root))[0]), edition,
+            'html')
+        for source in arguments.sources for edition in arguments.editions
+    ] if arguments.deduplicate and 'html' in arguments.formats else []
+    store: str = os.path.join(arguments.root, deduplicate.DEFAULT_STORE)
+
+    start: float = time.time()
+    deduplicate.detach(html_directories)
+    succeeded: bool = scheduler.run()
+    if succeeded:
+        state.clear()
+    if succeeded and html_directories:
+        linked, saved = deduplicate.link(html_directories, store)
+        deduplicate.collect_garbage(store)
+        print("Linked %d identical files, saved %d bytes." % (linked, saved))
+    scheduler.report(time.time() - start)
+
+    sys.exit(0 if succeeded else 1)
+
+
+if __name__ == "__main__":
+    main()
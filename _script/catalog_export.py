@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Exports the meta data of all documents, the component trees of all courses,
+and the documents each course shows into an indexed SQLite catalog, so tools
+like duration calculators or dependency browsers can query them without
+running Sphinx. The meta data is parsed and validated by the rosin.Meta
+extension, and the course trees are compiled by the course generator, i.e. the
+levels, scenarios, and lecturers of every component are the resolved ones, and
+the documents of a course include the ones that are required or mentioned by
+its units.
+
+The catalog is written to a temporary file first and replaces the former one
+atomically, so readers always see a complete catalog.
+
+Example:
+```
+_script/catalog_export.py -o build/catalog.sqlite
+sqlite3 build/catalog.sqlite "SELECT v.document, d.type, v.reason
+    FROM visibility v JOIN documents d ON d.name = v.document
+    WHERE v.course = 'ros_basics'"
+```
+
+Tables:
+-  `documents` with the title, type, and interaction of every document
+-  `durations` with the minutes of every document and level
+-  `descriptors` with the descriptors each document requires, mentions, or
+   provides, and `providers` with the document that provides a descriptor
+-  `dependencies` as view of the documents that satisfy the descriptors
+-  `courses`, `components`, and `component_attributes` with the course trees
+   and the levels, scenarios, and lecturers of every component
+-  `visibility` and `visibility_attributes` with the documents of a course,
+   why they are shown, and their levels and scenarios
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+import course_generator
+
+# rosin.meta is imported from the extensions next to the scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, '_extension'))
+from rosin.meta import MetaDoc  # noqa: E402
+
+EXCLUDED_DIRECTORIES: List[str] = ['build']
+SCHEMA_VERSION: int = 1
+SCHEMA: str = """
+CREATE TABLE catalog (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE documents (
+    name TEXT PRIMARY KEY,
+    title TEXT,
+    type TEXT,
+    interaction TEXT
+);
+CREATE TABLE durations (
+    document TEXT NOT NULL REFERENCES documents (name),
+    level TEXT NOT NULL,
+    minutes INTEGER NOT NULL,
+    PRIMARY KEY (document, level)
+);
+CREATE TABLE descriptors (
+    document TEXT NOT NULL REFERENCES documents (name),
+    relation TEXT NOT NULL CHECK (relation IN ('requires', 'mentions',
+                                               'provides')),
+    descriptor TEXT NOT NULL,
+    PRIMARY KEY (document, relation, descriptor)
+);
+CREATE INDEX descriptors_by_descriptor ON descriptors (descriptor, relation);
+CREATE TABLE providers (
+    descriptor TEXT PRIMARY KEY,
+    document TEXT NOT NULL REFERENCES documents (name)
+);
+CREATE INDEX providers_by_document ON providers (document);
+CREATE VIEW dependencies AS
+    SELECT descriptors.document, descriptors.relation,
+           descriptors.descriptor, providers.document AS target
+    FROM descriptors JOIN providers USING (descriptor)
+    WHERE descriptors.relation IN ('requires', 'mentions');
+CREATE TABLE courses (
+    name TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    title TEXT
+);
+CREATE TABLE components (
+    course TEXT NOT NULL REFERENCES courses (name),
+    parent TEXT NOT NULL,
+    component TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('yaml', 'rst', 'all')),
+    title TEXT,
+    PRIMARY KEY (course, parent, component)
+);
+CREATE INDEX components_by_component ON components (component);
+CREATE TABLE component_attributes (
+    course TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    component TEXT NOT NULL,
+    attribute TEXT NOT NULL CHECK (attribute IN ('level', 'scenario',
+                                                 'lecturer')),
+    value TEXT NOT NULL,
+    PRIMARY KEY (course, parent, component, attribute, value)
+);
+CREATE TABLE visibility (
+    course TEXT NOT NULL REFERENCES courses (name),
+    document TEXT NOT NULL REFERENCES documents (name),
+    reason TEXT NOT NULL CHECK (reason IN ('course', 'required',
+                                           'mentioned')),
+    PRIMARY KEY (course, document)
+);
+CREATE INDEX visibility_by_document ON visibility (document);
+CREATE TABLE visibility_attributes (
+    course TEXT NOT NULL,
+    document TEXT NOT NULL,
+    attribute TEXT NOT NULL CHECK (attribute IN ('level', 'scenario')),
+    value TEXT NOT NULL,
+    PRIMARY KEY (course, document, attribute, value)
+);
+"""
+TITLE_PATTERN = re.compile(r'^(?:([=\-`:\'"~^_*+#<>])\1+\n)?'
+                           r'(?! )(.+)\n([=\-`:\'"~^_*+#<>])\3+$',
+                           re.MULTILINE)
+
+
+def find_documents() -> List[str]:
+    found_docs: List[str] = []
+    for root, directories, files in os.walk(os.curdir):
+        directories[:] = sorted(
+            directory for directory in directories
+            if directory not in EXCLUDED_DIRECTORIES
+            and not directory.startswith(('.', '_')))
+        for file in sorted(files):
+            if file.endswith('.rst'):
+                found_docs.append(os.path.splitext(os.path.relpath(
+                    os.path.join(root, file), start=os.curdir))[0].replace(
+                    os.sep, '/'))
+
+    return found_docs
+
+
+def document_title(doc: str) -> str:
+    with open('%s.rst' % doc, 'r') as file:
+        match = TITLE_PATTERN.search(file.read())
+
+    return match.group(2).strip() if match is not None else None
+
+
+def component_rows(course: str, parent: str, config: dict,
+                   rows: List[Tuple[Any, ...]],
+                   attributes: List[Tuple[str, ...]]) -> None:
+    for position, (component, item) in enumerate(
+            config[course_generator.COMPONENTS].items()):
+        if course_generator.SELF in item:
+            kind, title = 'yaml', item[course_generator.SELF].get(
+                course_generator.TITLE)
+        elif component == course_generator.ALL:
+            kind, title = 'all', None
+        else:
+            kind, title = 'rst', None
+        rows.append((course, parent, component, position, kind, title))
+        for key, attribute in [
+            (course_generator.LEVELS, 'level'),
+            (course_generator.SCENARIOS, 'scenario'),
+            (course_generator.LECTURERS, 'lecturer'),
+        ]:
+            attributes += [(course, parent, component, attribute, value)
+                           for value in sorted(set(item.get(key, [])))]
+        if kind == 'yaml':
+            component_rows(course, component, item[course_generator.SELF],
+                           rows, attributes)
+
+
+def course_tags(source: str, config: dict) -> Set[str]:
+    """Returns the tags the course generator passes to Sphinx."""
+    course_generator.Arguments.source = source
+    flags: str = course_generator.Build.generate_course_flags(config)
+
+    return set(flags.split(' -t ')[1:]) | set(course_generator.Parse.tags)
+
+
+def export(file_name: str, sources: List[str]) -> Dict[str, int]:
+    found_docs: List[str] = find_documents()
+    scanned, required_by, mentioned_by, provided_by = MetaDoc.scan(
+        found_docs)
+
+    temporary_file_name: str = '%s.%d.tmp' % (file_name, os.getpid())
+    if os.path.exists(temporary_file_name):
+        os.remove(temporary_file_name)
+    connection = sqlite3.connect(temporary_file_name)
+    connection.executescript(SCHEMA)
+    connection.executemany('INSERT INTO catalog VALUES (?, ?)', [
+        ('schema_version', str(SCHEMA_VERSION)),
+        ('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('meta_version', sys.modules[MetaDoc.__module__].__version__),
+    ])
+
+    for doc, unit in sorted(scanned.items()):
+        connection.execute('INSERT INTO documents VALUES (?, ?, ?, ?)',
+                           (doc, document_title(doc), unit.type,
+                            unit.interaction))
+        connection.executemany('INSERT INTO durations VALUES (?, ?, ?)',
+                               [(doc, level, minutes) for level, minutes
+                                in sorted(unit.durations.items())])
+        for relation in ['requires', 'mentions', 'provides']:
+            connection.executemany(
+                'INSERT INTO descriptors VALUES (?, ?, ?)',
+                [(doc, relation, descriptor)
+                 for descriptor in sorted(set(getattr(unit, relation)))])
+    connection.executemany('INSERT INTO providers VALUES (?, ?)',
+                           sorted(provided_by.items()))
+
+    counts: Dict[str, int] = {'documents': len(scanned), 'courses': 0}
+    for source in sources:
+        course: str = os.path.splitext(os.path.basename(source))[0]
+        try:
+            config: dict = course_generator.Parse.load_configuration(source)
+        except course_generator.ConfigurationError as error:
+            print("Skipped %s: %s" % (source, error), file=sys.stderr)
+            continue
+        tags: Set[str] = course_tags(source, config)
+        connection.execute('INSERT INTO courses VALUES (?, ?, ?)',
+                           (course, source.replace(os.sep, '/'),
+                            config.get(course_generator.TITLE)))
+
+        rows: List[Tuple[Any, ...]] = []
+        attributes: List[Tuple[str, ...]] = []
+        component_rows(course, '', config, rows, attributes)
+        connection.executemany(
+            'INSERT OR IGNORE INTO components VALUES (?, ?, ?, ?, ?, ?)', rows)
+        connection.executemany(
+            'INSERT OR IGNORE INTO component_attributes '
+            'VALUES (?, ?, ?, ?, ?)', attributes)
+
+        hex_hash = course_generator.hex_hash
+        course_docs: Set[str] = {doc for doc in scanned
+                                 if hex_hash(doc) in tags}
+        required, mentioned = MetaDoc.resolve(course_docs, required_by,
+                                              mentioned_by, provided_by)
+        for reason, docs in [
+            ('course', course_docs),
+            ('required', required - course_docs),
+            ('mentioned', mentioned - course_docs - required),
+        ]:
+            connection.executemany(
+                'INSERT INTO visibility VALUES (?, ?, ?)',
+                [(course, doc, reason) for doc in sorted(docs)])
+        for doc in sorted(course_docs | required | mentioned):
+            for key, values in MetaDoc.tagged(hex_hash, doc, tags).items():
+                connection.executemany(
+                    'INSERT INTO visibility_attributes VALUES (?, ?, ?, ?)',
+                    [(course, doc, key[:-1], value) for value in values])
+        counts['courses'] += 1
+
+    connection.commit()
+    connection.execute('ANALYZE')
+    connection.close()
+    os.replace(temporary_file_name, file_name)
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exports the unit meta data, the course trees, and the "
+                    "documents of each course into an SQLite catalog.",
+    )
+    parser.add_argument('-s', '--sources',
+                        metavar='file',
+                        nargs='+',
+                        help="Specify the YAML files of the courses, defaults "
+                             "to all files in 'course'.",
+                        )
+    parser.add_argument('-o', '--output',
+                        metavar='file',
+                        default=os.path.join('build', 'catalog.sqlite'),
+                        help="Specify the catalog file to write.",
+                        )
+    parser.add_argument('-r', '--root',
+                        metavar='directory',
+                        default='.',
+                        help="Specify the root directory of the Sphinx "
+                             "documentation, i.e. where the 'conf.py' is "
+                             "located.",
+                        )
+    arguments = parser.parse_args()
+
+    output: str = os.path.abspath(arguments.output)
+    sources: List[str] = [os.path.relpath(os.path.abspath(source),
+                                          start=arguments.root)
+                          for source in arguments.sources or []]
+    os.chdir(arguments.root)
+    if not sources:
+        sources = sorted(glob.glob(os.path.join('course', '*.yaml')))
+
+    # the course generator resolves the course trees relative to the root
+    course_generator.Arguments.root = os.curdir
+    course_generator.Arguments.indices = os.path.join('build', 'indices')
+    course_generator.Parse.load_sphinx_configuration(os.curdir)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    start: float = time.perf_counter()
+    counts: Dict[str, int] = export(output, sources)
+    print("Exported %d documents and %d courses to %s in %.2f s."
+          % (counts['documents'], counts['courses'], output,
+             time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Validates the units and the course YAML files without running Sphinx, e.g. in a
+pre-commit hook. The checks are the ones of a build, taken from the same code:
+
+-  every YAML file is checked like by the course generator, i.e. its keys, its
+   levels, scenarios, and lecturers, and whether its components exist
+-  the meta directive of every unit is parsed by rosin.Meta, and the required
+   and mentioned descriptors must be provided by a unit, but only once
+-  the expressions of the level and scenario directives are compiled by
+   rosin.Didactic
+-  every role of the ROS domain is split and created by rosin.ROS_Element,
+   and its official elements must be in the ROS inventory
+
+The files are checked in parallel, and all problems are reported at once with
+their file and line. The exit code is 1 if there are errors, or warnings with
+`-W`. If files are passed, only their problems are reported, but the
+descriptors of all units are still resolved.
+
+Example:
+```
+_script/check.py
+_script/check.py -W $(git diff --cached --name-only)
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.1"
+
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, List, Set, Tuple, Union
+
+import yaml
+from sphinx.errors import ExtensionError
+from sphinx.util.tags import Tags
+
+import catalog_export
+import course_generator
+
+# the extensions are imported from next to the scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, '_extension'))
+from rosin import didactic, ros_element  # noqa: E402
+from rosin.meta import MetaDoc  # noqa: E402
+from rosin.ros_element import ROSDomain, process_comm  # noqa: E402
+
+ERROR: str = 'error'
+WARNING: str = 'warning'
+ROLE_PATTERN = re.compile(r'(?<!`):ros:([\w\-]+):`([^`]*)`(?!`)')
+TOKEN_PATTERN = re.compile(r"Invalid token '([^']*)'")
+LITERAL_PATTERN = re.compile(r'^( *)(\.\. (code-block|code|sourcecode)::'
+                             r'|(?!\.\. ).*::$)')
+# the loader of libyaml is much faster, if available
+LOADER: Any = getattr(yaml, 'CFullLoader', getattr(yaml, 'FullLoader',
+                                                   yaml.Loader))
+DESCRIPTOR_PREFIXES: List[str] = ['term:', 'program:', 'option:']
+
+# a problem is reported as file, line, severity, and message
+Message = Tuple[str, int, str, str]
+
+app: Union[SimpleNamespace, None] = None
+
+
+class Collector(logging.Handler):
+    """Collects the warnings that rosin.Meta logs while scanning."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+def initialize(root: str) -> None:
+    """Loads the `conf.py` once per process, like Sphinx and the generator."""
+    global app
+
+    os.chdir(root)
+    configuration: Dict[str, Any] = {'tags': Tags()}
+    with open('conf.py', 'r') as file:
+        exec(file.read(), configuration)
+    didactic.config_inited(None, configuration)
+    if configuration.get('ros_inventory'):
+        ros_element.load_inventory(os.path.abspath(
+            configuration['ros_inventory']))
+    app = SimpleNamespace(config=SimpleNamespace(
+        hex_hash=configuration['hex_hash']))
+
+    course_generator.Arguments.root = os.curdir
+    course_generator.Parse.load_sphinx_configuration(os.curdir)
+
+
+def line_of(content: str, position: int) -> int:
+    return content.count('\n', 0, position) + 1
+
+
+def locate(lines: List[str], descriptor: str, default: int) -> int:
+    """Returns the first of the lowercase lines that names a descriptor."""
+    text: str = descriptor
+    for prefix in DESCRIPTOR_PREFIXES:
+        if descriptor.startswith(prefix):
+            text = descriptor[len(prefix):]
+    # descriptors spanning several lines are found by their last word
+    for candidate in [text, text.split(' ')[-1]]:
+        for index, line in enumerate(lines):
+            if candidate and candidate in line:
+                return index + 1
+
+    return default
+
+
+def literal_lines(content: str) -> Set[int]:
+    """Returns the lines of literal blocks, where roles are not parsed."""
+    lines: Set[int] = set()
+    indent: Union[int, None] = None
+    for number, line in enumerate(content.split('\n'), start=1):
+        if indent is not None and (not line.strip() or len(line)
+                                   - len(line.lstrip(' ')) > indent):
+            lines.add(number)
+            continue
+        match = LITERAL_PATTERN.match(line)
+        indent = len(match.group(1)) if match is not None else None
+
+    return lines
+
+
+def check_meta(doc: str, file_name: str, content: str,
+               messages: List[Message]) -> Tuple[Dict[str, int],
+                                                 Dict[str, int]]:
+    meta_match = re.search(r'^\.\. meta::', content, re.MULTILINE)
+    meta_line: int = line_of(content, meta_match.start()) if meta_match else 1
+
+    lines: List[str] = content.lower().split('\n')
+    meta_logger: logging.Logger = logging.getLogger('sphinx.rosin.meta')
+    collector: Collector = Collector()
+    meta_logger.addHandler(collector)
+    try:
+        _, required_by, mentioned_by, provided_by = MetaDoc.scan([doc])
+    except ExtensionError as error:
+        token: Any = TOKEN_PATTERN.search(str(error))
+        messages.append((file_name, locate(lines, token.group(1),
+                                           meta_line)
+                         if token else meta_line, ERROR, str(error)))
+        # the document is still known, so references to it are resolved
+        return {doc: 1}, {}
+    finally:
+        meta_logger.removeHandler(collector)
+
+    for message in collector.messages:
+        messages.append((file_name, meta_line, WARNING, message))
+
+    return ({descriptor: locate(lines, descriptor, meta_line)
+             for descriptor in provided_by},
+            {descriptor: locate(lines, descriptor, meta_line)
+             for descriptor in list(required_by) + list(mentioned_by)})
+
+
+def check_selectors(doc: str, file_name: str, content: str,
+                    messages: List[Message]) -> None:
+    # the directives are matched per group of lines like by rosin.Didactic
+    position: int = 0
+    for line_group in re.split(r'(\n{2,})', content):
+        match = didactic.SELECTOR_PATTERN.match(line_group)
+        if match is not None:
+            try:
+                didactic.generate_expression(app, doc, match.group(3),
+                                             match.group(4))
+            except ExtensionError as error:
+                messages.append((file_name, line_of(content, position),
+                                 ERROR, str(error)))
+        position += len(line_group)
+
+
+def check_roles(doc: str, file_name: str, content: str,
+                messages: List[Message]) -> None:
+    literal: Set[int] = literal_lines(content)
+    for match in ROLE_PATTERN.finditer(content):
+        line: int = line_of(content, match.start())
+        if line in literal:
+            continue
+        elif match.group(1) not in ROSDomain.roles:
+            messages.append((file_name, line, ERROR,
+                             "Unknown ROS role '%s', allowed roles are %s."
+                             % (match.group(1), list(ROSDomain.roles))))
+            continue
+
+        # roles with several parts are split into one role per part first
+        source: List[str] = [match.group(0)]
+        process_comm(None, doc, source)
+        for part in ROLE_PATTERN.finditer(source[0]):
+            role: ros_element.ROSComponent = ROSDomain.roles[part.group(1)]
+            try:
+                role(part.group(1), part.group(0), part.group(2))
+            except ExtensionError as error:
+                messages.append((file_name, line, ERROR, str(error)))
+                break
+            unknown: Union[str, None] = ros_element.inventory.unknown(
+                role.parts[0], dict(zip(role.parts, re.split(
+                    r'[ \n]+', part.group(2))))) \
+                if ros_element.inventory is not None else None
+            if unknown is not None:
+                messages.append((file_name, line, WARNING,
+                                 "Unknown ROS %s, which is not in the "
+                                 "inventory of %s."
+                                 % (unknown, ros_element.inventory.distro)))
+
+
+def check_document(doc: str) -> Tuple[List[Message], Dict[str, int],
+                                      Dict[str, int]]:
+    file_name: str = '%s.rst' % doc
+    with open(file_name, 'r') as file:
+        content: str = file.read()
+
+    messages: List[Message] = []
+    provides, references = check_meta(doc, file_name, content, messages)
+    check_selectors(doc, file_name, content, messages)
+    check_roles(doc, file_name, content, messages)
+
+    return messages, provides, references
+
+
+def check_yaml(file_name: str) -> List[Message]:
+    with open(file_name, 'r') as file:
+        loader: Any = LOADER(file.read())
+    try:
+        # the nodes carry the lines of the components, and are constructed
+        # like by the course generator, so the file is only parsed once
+        node: yaml.Node = loader.get_single_node()
+        config: Any = (loader.construct_document(node) if node is not None
+                       else None)
+    except yaml.YAMLError as error:
+        mark: Any = getattr(error, 'problem_mark', None)
+        return [(file_name, mark.line + 1 if mark else 1, ERROR,
+                 str(getattr(error, 'problem', None) or error))]
+    finally:
+        loader.dispose()
+
+    keys: Dict[str, int] = {key.value: key.start_mark.line + 1
+                            for key, _ in (node.value if isinstance(
+                                node, yaml.MappingNode) else [])
+                            if isinstance(key, yaml.ScalarNode)}
+    try:
+        course_generator.Consistency.is_dictionary('root', config)
+        course_generator.Consistency.check_root(config)
+    except course_generator.ConfigurationError as error:
+        # the messages name the key, e.g. "Item 0 of 'default_levels'"
+        return [(file_name, next((line for key, line in keys.items()
+                                  if "'%s'" % key in str(error)), 1),
+                 ERROR, str(error))]
+
+    lines: Dict[str, int] = {}
+    for key, value in node.value:
+        if key.value == course_generator.COMPONENTS:
+            lines = {component.value: component.start_mark.line + 1
+                     for component, _ in value.value}
+
+    messages: List[Message] = []
+    for component, item in config[course_generator.COMPONENTS].items():
+        try:
+            course_generator.Consistency.check_component(component, item)
+        except course_generator.ConfigurationError as error:
+            messages.append((file_name, lines.get(component, 1), ERROR,
+                             str(error)))
+
+    return messages
+
+
+def find_yaml_files() -> List[str]:
+    file_names: List[str] = []
+    for root, directories, files in os.walk(os.curdir):
+        directories[:] = sorted(
+            directory for directory in directories
+            if directory not in catalog_export.EXCLUDED_DIRECTORIES
+            and not directory.startswith(('.', '_')))
+        file_names += [os.path.relpath(os.path.join(root, file))
+                       for file in sorted(files) if file.endswith('.yaml')]
+
+    return file_names
+
+
+def check(documents: List[str], yaml_files: List[str],
+          jobs: int) -> List[Message]:
+    if jobs > 1:
+        executor: ProcessPoolExecutor = ProcessPoolExecutor(
+            jobs, initializer=initialize, initargs=(os.getcwd(),))
+        mapped = executor.map
+    else:
+        executor = None
+        mapped = map
+        initialize(os.curdir)
+
+    try:
+        chunk: Dict[str, Any] = {'chunksize': 16} if executor else {}
+        results: List[Tuple[List[Message], Dict[str, int], Dict[str, int]]] \
+            = list(mapped(check_document, documents, **chunk))
+        messages: List[Message] = [message
+                                   for yaml_messages in mapped(check_yaml,
+                                                               yaml_files)
+                                   for message in yaml_messages]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # the descriptors are resolved across all documents like by rosin.Meta,
+    # where the first document providing a descriptor wins, so the documents
+    # are taken in its order
+    order: Dict[str, int] = {doc.replace(os.sep, '/'): index for index, doc
+                             in enumerate(MetaDoc.find_docs())}
+    provided_by: Dict[str, str] = {}
+    for doc, (document_messages, provides, _) in sorted(
+            zip(documents, results),
+            key=lambda item: order.get(item[0], len(order))):
+        messages += document_messages
+        for descriptor, line in provides.items():
+            if descriptor in provided_by and provided_by[descriptor] != doc:
+                messages.append(('%s.rst' % doc, line, WARNING,
+                                 "Document '%s' provides '%s' which is "
+                                 "already done by '%s'."
+                                 % (doc, descriptor,
+                                    provided_by[descriptor])))
+            else:
+                provided_by[descriptor] = doc
+    for doc, (_, _, references) in zip(documents, results):
+        for descriptor, line in references.items():
+            if descriptor not in provided_by:
+                messages.append(('%s.rst' % doc, line, WARNING,
+                                 "Document '%s' uses '%s' which is not "
+                                 "provided by any other document."
+                                 % (doc, descriptor)))
+
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validates the units and course YAML files without "
+                    "running Sphinx, and reports all problems with their "
+                    "file and line.",
+    )
+    parser.add_argument('files',
+                        metavar='file',
+                        nargs='*',
+                        help="Specify the files whose problems are reported, "
+                             "defaults to all. Files other than .rst and "
+                             ".yaml files are ignored.",
+                        )
+    parser.add_argument('-r', '--root',
+                        metavar='directory',
+                        default='.',
+                        help="Specify the root directory of the Sphinx "
+                             "documentation, i.e. where the 'conf.py' is "
+                             "located.",
+                        )
+    parser.add_argument('-j', '--jobs',
+                        metavar='processes',
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help="Specify the number of processes, defaults to "
+                             "the number of CPUs.",
+                        )
+    parser.add_argument('-W',
+                        dest='warnings_are_errors',
+                        action='store_true',
+                        help="Turn warnings into errors.",
+                        )
+    arguments = parser.parse_args()
+
+    selected: Set[str] = {os.path.relpath(os.path.abspath(file_name),
+                                          start=arguments.root)
+                          for file_name in arguments.files
+                          if file_name.endswith(('.rst', '.yaml'))}
+    if arguments.files and not selected:
+        return
+
+    start: float = time.perf_counter()
+    os.chdir(arguments.root)
+    documents: List[str] = catalog_export.find_documents()
+    yaml_files: List[str] = [file_name for file_name in find_yaml_files()
+                             if not selected or file_name in selected]
+    messages: List[Message] = [
+        message for message in check(documents, yaml_files, arguments.jobs)
+        if not selected or message[0] in selected]
+
+    for file_name, line, severity, message in sorted(messages):
+        print("%s:%d: %s: %s" % (file_name, line, severity, message))
+    errors: int = sum(1 for message in messages if message[2] == ERROR)
+    print("Checked %d documents and %d YAML files in %.2f s: %d errors, %d "
+          "warnings." % (len(documents), len(yaml_files),
+                         time.perf_counter() - start, errors,
+                         len(messages) - errors))
+
+    if errors or (arguments.warnings_are_errors and messages):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,19 @@
 
 __author__ = "Meeßen, Marcus"
 __copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
-__version__ = "1.1"
+__version__ = "1.2"
 
 import argparse
 import os
+import subprocess
+import sys
 from typing import Any, Callable, Dict, Iterable, List, Union
 
 import yaml
 from sphinx.util.tags import Tags
 
+import deduplicate
+
 TITLE: str = 'title'
 DEFAULT_SCENARIOS: str = 'default_scenarios'
 SCENARIOS: str = 'scenarios'
@@ -38,6 +42,14 @@ EDITION_CHOICES: List[str] = [
     '+'.join([TEACHER, TUTOR]),
     '+'.join([AUTHOR, TEACHER, TUTOR]),
 ]
+FORMAT_CHOICES: List[str] = ['html', 'latex', 'pdf']
+FORMAT_BUILDERS: Dict[str, str] = {
+    'html': 'html',
+    'latex': 'latex',
+    'pdf': 'latex',  # compiled by the 'latex_pipeline.py' afterwards
+}
+READ_BUILDER: str = 'read'  # of the 'rosin.reader' extension
+LOW_MEMORY_BATCH_SIZE: int = 100
 FORBIDDEN_COMPONENT_NAMES: List[str] = [
     # ALL is explicitly allowed!
     TITLE,
@@ -64,13 +76,22 @@ class ConfigurationError(Exception):
     pass
 
 
+class BuildError(Exception):
+    pass
+
+
 class Arguments(object):
     source: str
-    format: str
+    format: List[str]
     output: str
     indices: str
     root: str
     editions: List[str]
+    deduplicate: bool = False
+    fragments: bool = False
+    profile: bool = False
+    memory_report: bool = False
+    low_memory: bool = False
     generate: bool
 
     @staticmethod
@@ -87,11 +108,16 @@ class Arguments(object):
                                  "course or program.",
                             )
         parser.add_argument('-f', '--format',
-                            choices=['html', 'latex''pdf'],
-                            default='html',
+                            choices=FORMAT_CHOICES,
+                            metavar='format',
+                            nargs='+',
+                            default=['html'],
                             type=str,
-                            help="Use either HTML as the output format or "
-                                 "generate a PDF instead.",
+                            help="Specify the output formats, choose from "
+                                 "'%s', '%s', and '%s'. The sources are read "
+                                 "only once per edition and all formats are "
+                                 "written from copies of the same doctrees."
+                                 % (*FORMAT_CHOICES,),
                             )
         parser.add_argument('-o', '--output',
                             metavar='directory',
@@ -121,6 +147,40 @@ class Arguments(object):
                                  "is always included in any combination."
                                  % (*EDITION_CHOICES, LEARNER),
                             )
+        parser.add_argument('--deduplicate',
+                            action='store_true',
+                            help="Hardlink identical files of the HTML output "
+                                 "of all editions and courses to a shared "
+                                 "content store after the build.",
+                            )
+        parser.add_argument('--pdf-fragments',
+                            dest='fragments',
+                            action='store_true',
+                            help="Compile every unit to a cached PDF fragment "
+                                 "and assemble the course PDF from these, so "
+                                 "only changed units are compiled again.",
+                            )
+        parser.add_argument('--profile',
+                            action='store_true',
+                            help="Profile the phases of Sphinx and the event "
+                                 "handlers of all extensions, and write a "
+                                 "summary and a trace next to the doctrees of "
+                                 "each edition.",
+                            )
+        parser.add_argument('--memory-report',
+                            action='store_true',
+                            help="Trace the memory of the extensions and "
+                                 "data structures after each phase of Sphinx, "
+                                 "and write a report next to the doctrees of "
+                                 "each edition.",
+                            )
+        parser.add_argument('--low-memory',
+                            action='store_true',
+                            help="Read and write the documents in batches of "
+                                 "%d and release their doctrees after each "
+                                 "batch, e.g. for courses with all units."
+                                 % LOW_MEMORY_BATCH_SIZE,
+                            )
         generation = parser.add_argument_group("Generation",
                                                "Automatically run the Sphinx "
                                                "documentation generator after "
@@ -142,6 +202,10 @@ class Arguments(object):
         for argument, value in vars(parser.parse_args()).items():
             setattr(Arguments, argument, value)
 
+        Arguments.prepare_directories()
+
+    @staticmethod
+    def prepare_directories() -> None:
         if not os.path.abspath(Arguments.output).startswith(
                 os.path.abspath(Arguments.root)):
             ArgumentError("Sphinx currently does not support processing .rst "
@@ -235,6 +299,12 @@ class Consistency(object):
 
     @staticmethod
     def check_consistency(config: dict) -> None:
+        Consistency.check_root(config)
+        for component, item in config[COMPONENTS].items():
+            Consistency.check_component(component, item)
+
+    @staticmethod
+    def check_root(config: dict) -> None:
         # all required keys must be present
         Consistency.is_valid_key_list('root', list(config.keys()),
                                       required=[
@@ -266,31 +336,48 @@ class Consistency(object):
         # components must be be contained in a dictionary
         Consistency.is_dictionary(COMPONENTS, config[COMPONENTS])
 
-        for component, item in config[COMPONENTS].items():
-            Consistency.is_dictionary(component, item)
-            Consistency.component_name_valid(component)
-            Consistency.component_exists(component)
-            Consistency.is_valid_key_list(component, (item or {}),
-                                          optional=[
-                                              SCENARIOS,
-                                              LEVELS,
-                                              LECTURERS,
-                                          ],
-                                          )
-
-            Consistency.is_restricted_list('%s/%s' % (component, SCENARIOS),
-                                           item.get(SCENARIOS, []),
-                                           allowed=Consistency.scenarios,
-                                           )
-            Consistency.is_restricted_list('%s/%s' % (component, LEVELS),
-                                           item.get(LEVELS, []),
-                                           allowed=Consistency.levels,
-                                           )
-            Consistency.is_list_of_strings('%s/%s' % (component, LECTURERS),
-                                           item.get(LEVELS, []))
+    @staticmethod
+    def check_component(component: str, item: Any) -> None:
+        Consistency.is_dictionary(component, item)
+        Consistency.component_name_valid(component)
+        Consistency.component_exists(component)
+        Consistency.is_valid_key_list(component, (item or {}),
+                                      optional=[
+                                          SCENARIOS,
+                                          LEVELS,
+                                          LECTURERS,
+                                      ],
+                                      )
+
+        Consistency.is_restricted_list('%s/%s' % (component, SCENARIOS),
+                                       item.get(SCENARIOS, []),
+                                       allowed=Consistency.scenarios,
+                                       )
+        Consistency.is_restricted_list('%s/%s' % (component, LEVELS),
+                                       item.get(LEVELS, []),
+                                       allowed=Consistency.levels,
+                                       )
+        Consistency.is_list_of_strings('%s/%s' % (component, LECTURERS),
+                                       item.get(LEVELS, []))
 
 
 class Parse(object):
+    tags: List[str] = []  # added by the 'conf.py' itself
+
+    @staticmethod
+    def load_sphinx_configuration(root: str) -> None:
+        global hex_hash
+
+        tags: Tags = Tags()
+        local = locals()
+        exec(open(os.path.join(root, 'conf.py')).read(), local)
+        Consistency.levels = (list(local['didactic_levels'].keys())
+                              + [ALL, DEFAULT])
+        Consistency.scenarios = (list(local['didactic_scenarios'].keys())
+                                 + [ALL, DEFAULT])
+        hex_hash = local['hex_hash']
+        Parse.tags = list(tags)
+
     @staticmethod
     def load_configuration(file_name: str) -> dict:
         with open(file_name, 'r') as file:
@@ -316,12 +403,25 @@ class Build(object):
         import re
         return re.sub(r'\W+', '_', file_name)
 
+    @staticmethod
+    def write_lines(file_name: str, lines: List[str]) -> None:
+        content: str = ''.join([line + '\n' for line in lines])
+
+        # keep the modification time if nothing changed, otherwise Sphinx
+        # rereads the file and every document that depends on it
+        if os.path.isfile(file_name):
+            with open(file_name, 'r') as file:
+                if file.read() == content:
+                    return
+
+        with open(file_name, 'w+') as file:
+            file.write(content)
+
     @staticmethod
     def generate_main_index(file_name: str) -> None:
         rst_file_name: str = os.path.join(Arguments.root, 'index.rst')
 
-        with open(rst_file_name, 'w+') as file:
-            file.writelines([line + '\n' for line in [
+        Build.write_lines(rst_file_name, [
                 '.. meta::',  # prevents warnings
                 '   :description lang=en: Table of Contents',
                 '',
@@ -341,6 +441,10 @@ class Build(object):
                 '',
                 '   contributors',
                 '',
+                '.. only:: html',
+                '',
+                '   :ref:`ros-elementindex`',
+                '',
                 '.. toc''tree::',
                 '   :hidden:',
                 '',
@@ -357,7 +461,7 @@ class Build(object):
                 '*' * 80,
                 '',
                 '.. toc''tree_mentioned::',
-            ]])
+            ])
 
     @staticmethod
     def generate_indices(component_config: dict, file_name: str) -> None:
@@ -368,38 +472,37 @@ class Build(object):
         rst_file_name: str = os.path.join(Arguments.indices, '%s.rst'
                                           % file_name)
 
-        with open(rst_file_name, 'w+') as file:
-            components: List[str] = []
-            # collect paths and file names to all components
-            for component, item in component_config[COMPONENTS].items():
-                # ALL is a phony target
-                if component == ALL:
-                    continue
-                # paths to .rst files must be relative
-                elif os.path.exists(os.path.join(Arguments.root,
-                                                 '%s.rst' % component)):
-                    components.append(os.path.join(root_relative, component))
-                # generated indices from .yaml files share the same directory
-                elif os.path.exists(os.path.join(Arguments.root,
-                                                 '%s.yaml' % component)):
-                    flat_component: str = Build.flatten(component)
-                    components.append(flat_component)
-                    # build .rst files for subordinate .yaml files recursively
-                    Build.generate_indices(item[SELF], flat_component)
-
-            file.writelines([line + '\n' for line in [
-                '.. meta::',  # prevents warnings
-                '   :description lang=en: Table of Contents',
-                '',
-                '#' * 80,
-                component_config[TITLE],
-                '#' * 80,
-                '',
-                '.. toc''tree::',
-                '   :max''depth: 2',
-                '',
-                *['   %s' % component for component in components]
-            ]])
+        components: List[str] = []
+        # collect paths and file names to all components
+        for component, item in component_config[COMPONENTS].items():
+            # ALL is a phony target
+            if component == ALL:
+                continue
+            # paths to .rst files must be relative
+            elif os.path.exists(os.path.join(Arguments.root,
+                                             '%s.rst' % component)):
+                components.append(os.path.join(root_relative, component))
+            # generated indices from .yaml files share the same directory
+            elif os.path.exists(os.path.join(Arguments.root,
+                                             '%s.yaml' % component)):
+                flat_component: str = Build.flatten(component)
+                components.append(flat_component)
+                # build .rst files for subordinate .yaml files recursively
+                Build.generate_indices(item[SELF], flat_component)
+
+        Build.write_lines(rst_file_name, [
+            '.. meta::',  # prevents warnings
+            '   :description lang=en: Table of Contents',
+            '',
+            '#' * 80,
+            component_config[TITLE],
+            '#' * 80,
+            '',
+            '.. toc''tree::',
+            '   :max''depth: 2',
+            '',
+            *['   %s' % component for component in components]
+        ])
 
     @staticmethod
     def generate_flags(component_config: dict, file_name: str,
@@ -457,7 +560,7 @@ class Build(object):
         return flags
 
     @staticmethod
-    def generate_build(config: dict) -> None:
+    def generate_course(config: dict) -> str:
         indices_directory: str = os.path.relpath(
             os.path.join(Arguments.output, 'indices'),
             start=Arguments.root,
@@ -467,36 +570,137 @@ class Build(object):
         Build.generate_main_index(os.path.join(indices_directory,
                                                flat_source_name))
         Build.generate_indices(config, flat_source_name)
-        flags: str = Build.generate_flags(config, flat_source_name)
+
+        return Build.generate_course_flags(config)
+
+    @staticmethod
+    def generate_course_flags(config: dict) -> str:
+        source_name: str = os.path.splitext(Arguments.source)[0]
+        flags: str = Build.generate_flags(config, Build.flatten(source_name))
         flags += ' -t %s' % hex_hash('index')  # main doc must be available
 
-        for edition in Arguments.editions:
-            for part in edition.split('+'):
-                flags += ' -t %s' % part
+        return flags
+
+    @staticmethod
+    def generate_edition_flags(flags: str, edition: str) -> str:
+        for part in edition.split('+'):
+            flags += ' -t %s' % part
 
-            command: str = ('sphinx-build -M %s "%s" "%s/%s" %s'
-                            % (Arguments.format, Arguments.root,
-                               Arguments.output, edition, flags))
+        return flags
 
-            if Arguments.generate:
-                os.system(command)
-            else:
-                print("To generate the '%s' edition output with Sphinx, run: "
-                      "\n%s\n%s\n%s" % (edition, '#' * 20, command, '#' * 20))
+    @staticmethod
+    def generate_command(builder: str, edition: str, flags: str) -> str:
+        if builder == 'latex' and Arguments.fragments:
+            flags += ' -D latex_fragments=1'
+        if Arguments.profile:
+            flags += ' -D profiling=1'
+        if Arguments.memory_report:
+            flags += ' -D memory_snapshots=1'
+        if Arguments.low_memory:
+            flags += ' -D memory_batch_size=%d' % LOW_MEMORY_BATCH_SIZE
+
+        # every writer starts from its own copy of the doctrees read once,
+        # as concurrent writers must not share their environment
+        if builder != READ_BUILDER:
+            flags += (' -d "%s/%s/doctrees_%s" -D reader_doctrees="%s"'
+                      % (Arguments.output, edition, builder,
+                         os.path.abspath(os.path.join(Arguments.output,
+                                                      edition, 'doctrees'))))
+
+        return ('sphinx-build -M %s "%s" "%s/%s" %s'
+                % (builder, Arguments.root, Arguments.output, edition,
+                   Build.generate_edition_flags(flags, edition)))
+
+    @staticmethod
+    def generate_writers(formats: List[str]) -> List[str]:
+        builders: List[str] = []
+        for builder in [FORMAT_BUILDERS[x] for x in FORMAT_CHOICES
+                        if x in formats]:
+            # the PDF is compiled from the output of the LaTeX builder anyway
+            if builder not in builders:
+                builders.append(builder)
+
+        return builders
+
+    @staticmethod
+    def generate_pdf_command(editions: List[str]) -> str:
+        return ('"%s" "%s" %s'
+                % (sys.executable,
+                   os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'latex_pipeline.py'),
+                   ' '.join(['"%s/%s/latex"' % (Arguments.output, edition)
+                             for edition in editions])))
+
+    @staticmethod
+    def run_commands(commands: List[str]) -> bool:
+        processes: List[subprocess.Popen] = [subprocess.Popen(command,
+                                                              shell=True)
+                                             for command in commands]
+
+        return all([process.wait() == 0 for process in processes])
+
+    @staticmethod
+    def generate_build(config: dict) -> None:
+        flags: str = Build.generate_course(config)
+
+        # read all sources of an edition once into its shared doctrees, then
+        # let the writers of all formats work on copies of them concurrently
+        read_commands: List[str] = []
+        write_commands: List[str] = []
+        for edition in Arguments.editions:
+            read_commands.append(Build.generate_command(READ_BUILDER, edition,
+                                                        flags))
+            write_commands += [Build.generate_command(builder, edition, flags)
+                               for builder
+                               in Build.generate_writers(Arguments.format)]
+        # all editions are compiled by parallel latexmk jobs
+        pdf_commands: List[str] = ([Build.generate_pdf_command(
+            Arguments.editions)] if 'pdf' in Arguments.format else [])
+
+        html_directories: List[str] = (
+            ['%s/%s/html' % (Arguments.output, edition)
+             for edition in Arguments.editions]
+            if Arguments.deduplicate and 'html' in Arguments.format else [])
+
+        if Arguments.generate:
+            # Sphinx writes in place, so linked files must be copies again
+            deduplicate.detach(html_directories)
+            if not Build.run_commands(read_commands):
+                raise BuildError("Sphinx could not read the sources.")
+            if not Build.run_commands(write_commands):
+                raise BuildError("Sphinx could not write the output.")
+            if not Build.run_commands(pdf_commands):
+                raise BuildError("LaTeX could not compile the PDF output.")
+            if html_directories:
+                linked, saved = deduplicate.link(
+                    html_directories, os.path.join(Arguments.root,
+                                                   deduplicate.DEFAULT_STORE))
+                deduplicate.collect_garbage(os.path.join(
+                    Arguments.root, deduplicate.DEFAULT_STORE))
+                print("Linked %d identical files, saved %d bytes."
+                      % (linked, saved))
+        else:
+            print("To generate the output of the editions %s with Sphinx, "
+                  "first read the sources by running:\n%s\n%s\n%s\n"
+                  "and then write the output by running, possibly in parallel:"
+                  "\n%s\n%s\n%s"
+                  % (Arguments.editions,
+                     '#' * 20, '\n'.join(read_commands), '#' * 20,
+                     '#' * 20, '\n'.join(write_commands), '#' * 20))
+            if pdf_commands:
+                print("Finally compile the PDF output by running:\n%s\n%s\n%s"
+                      % ('#' * 20, '\n'.join(pdf_commands), '#' * 20))
+            if html_directories:
+                print("Detach the HTML output before and link it afterwards "
+                      "by running:\n%s\n_script/deduplicate.py detach %s\n"
+                      "_script/deduplicate.py link %s\n%s"
+                      % ('#' * 20, ' '.join(html_directories),
+                         ' '.join(html_directories), '#' * 20))
 
 
 def main():
     Arguments.parse_arguments()
-
-    tags: Tags = Tags()
-    local = locals()
-    exec(open(os.path.join(Arguments.root, 'conf.py')).read(), local)
-    Consistency.levels = (list(local['didactic_levels'].keys())
-                          + [ALL, DEFAULT])
-    Consistency.scenarios = (list(local['didactic_scenarios'].keys())
-                             + [ALL, DEFAULT])
-    global hex_hash
-    hex_hash = local['hex_hash']
+    Parse.load_sphinx_configuration(Arguments.root)
 
     Build.generate_build(Parse.load_configuration(Arguments.source))
 
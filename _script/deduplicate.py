@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Deduplicates the HTML output of several editions and courses. Every file is
+moved into a content-addressed store, and identical files in all output trees
+become hardlinks to the same object in the store. The static assets, images and
+copied resources, as well as most pages without role notes, are identical
+across editions, so they are only kept once on the disk.
+
+Sphinx writes its files in place, which would change the content of all links
+at once. Therefore, the output trees have to be detached before
+they are built again, i.e. every linked file is replaced by its own copy with
+the same time stamp, so the incremental builds of Sphinx still work. The course
+generator and the build scheduler do both automatically with `--deduplicate`.
+
+Example:
+```
+_script/deduplicate.py detach build/*/html
+make html BUILD_DIR=build/author
+_script/deduplicate.py link build/*/html
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import hashlib
+import os
+import shutil
+from typing import List, Tuple
+
+DEFAULT_STORE: str = os.path.join('build', 'cache', 'store')
+MINIMUM_SIZE: int = 1024  # links of smaller files save hardly anything
+
+
+def find_files(directories: List[str]) -> List[str]:
+    file_names: List[str] = []
+    for directory in directories:
+        for path, _, names in os.walk(directory):
+            file_names += [os.path.join(path, name) for name in names
+                           if not os.path.islink(os.path.join(path, name))]
+
+    return sorted(file_names)
+
+
+def replace(source: str, destination: str, link: bool) -> None:
+    # the destination is never opened, so its other links stay untouched
+    temporary_file_name: str = '%s.%d.tmp' % (destination, os.getpid())
+    if link:
+        os.link(source, temporary_file_name)
+    else:
+        shutil.copy2(source, temporary_file_name)
+    os.replace(temporary_file_name, destination)
+
+
+def detach(directories: List[str]) -> int:
+    detached: int = 0
+    for file_name in find_files(directories):
+        if os.stat(file_name).st_nlink > 1:
+            replace(file_name, file_name, link=False)
+            detached += 1
+
+    return detached
+
+
+def link(directories: List[str], store: str) -> Tuple[int, int]:
+    linked: int = 0
+    saved: int = 0
+    for file_name in find_files(directories):
+        status = os.stat(file_name)
+        if status.st_size < MINIMUM_SIZE:
+            continue
+
+        with open(file_name, 'rb') as file:
+            digest: str = hashlib.sha256(file.read()).hexdigest()
+        object_name: str = os.path.join(store, digest[:2], digest)
+        try:
+            if not os.path.isfile(object_name):
+                os.makedirs(os.path.dirname(object_name), exist_ok=True)
+                os.link(file_name, object_name)
+            elif not os.path.samefile(file_name, object_name):
+                # the newest time keeps all incremental builds up to date
+                modified: int = max(status.st_mtime_ns,
+                                    os.stat(object_name).st_mtime_ns)
+                os.utime(object_name, ns=(modified, modified))
+                replace(object_name, file_name, link=True)
+                linked += 1
+                saved += status.st_size
+        except OSError:
+            continue  # e.g. the store is on another file system
+
+    return linked, saved
+
+
+def collect_garbage(store: str) -> int:
+    removed: int = 0
+    for file_name in find_files([store]):
+        # objects without any other link are no longer part of an output
+        if os.stat(file_name).st_nlink == 1:
+            os.remove(file_name)
+            removed += 1
+
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Hardlinks identical files of several output trees to a "
+                    "shared content store, or detaches them before a build.",
+    )
+    parser.add_argument('action',
+                        choices=['link', 'detach'],
+                        help="Specify whether to 'link' the files after a "
+                             "build or to 'detach' them before the next one.",
+                        )
+    parser.add_argument('directories',
+                        metavar='directory',
+                        nargs='+',
+                        help="Specify the output trees, e.g. 'build/*/html'.",
+                        )
+    parser.add_argument('--store',
+                        metavar='directory',
+                        default=DEFAULT_STORE,
+                        help="Specify the content store, which has to be on "
+                             "the same file system, defaults to '%s'."
+                             % DEFAULT_STORE,
+                        )
+    arguments = parser.parse_args()
+
+    if arguments.action == 'detach':
+        print("Detached %d files." % detach(arguments.directories))
+    else:
+        linked, saved = link(arguments.directories, arguments.store)
+        print("Linked %d files, saved %d bytes, removed %d unused objects."
+              % (linked, saved, collect_garbage(arguments.store)))
+
+
+if __name__ == "__main__":
+    main()
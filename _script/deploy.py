@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Deploys the HTML output of Sphinx incrementally. A manifest with the content
+hash of every file is written for each build and compared with the manifest of
+the last deployment, so only files with new content are transferred. The target
+keeps every file once in a content-addressed store and each deployment as a
+release of hardlinks to this store. At the end, the `current` symbolic link and
+the `manifest.json` of the target are switched to the new release atomically,
+so visitors never see a half-deployed site.
+
+The target is either a local directory, e.g. for testing, or a directory on a
+remote server given as `user@host:directory`, which is accessed via ssh and
+rsync. The web server has to serve `<directory>/current`, which is a symbolic
+link, and not the directory itself. If `current` is still a directory, e.g. of
+a former deployment by copying, the deployment stops until it is moved away.
+
+Example:
+```
+_script/deploy.py build/learner/html /tmp/deployment
+_script/deploy.py build/learner/html user@example.com:/var/www/academy
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.1"
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Set
+
+EXCLUDED_FILES: List[str] = ['.buildinfo', '.precompress.json']
+MANIFEST_FILE: str = 'manifest.json'
+REMOTE_PATTERN = re.compile(r'^([^/:]+):(.+)$')
+
+Manifest = Dict[str, Dict[str, Any]]
+
+
+class DeployError(Exception):
+    pass
+
+
+def release_id(manifest: Manifest) -> str:
+    return hashlib.sha256(json.dumps(
+        {path: entry['sha256'] for path, entry in manifest.items()},
+        sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def object_name(digest: str) -> str:
+    return os.path.join('objects', digest[:2], digest)
+
+
+def write_json(file_name: str, data: Any) -> None:
+    temporary_file_name: str = '%s.%d.tmp' % (file_name, os.getpid())
+    with open(temporary_file_name, 'w') as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+    os.replace(temporary_file_name, file_name)
+
+
+def read_json(file_name: str) -> Any:
+    if not os.path.isfile(file_name):
+        return {}
+    with open(file_name, 'r') as file:
+        return json.load(file)
+
+
+def generate_manifest(directory: str, previous: Manifest) -> Manifest:
+    manifest: Manifest = {}
+    for path, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            full_file_name: str = os.path.join(path, file_name)
+            relative: str = os.path.relpath(full_file_name, start=directory
+                                            ).replace(os.sep, '/')
+            if file_name in EXCLUDED_FILES or not os.path.isfile(
+                    full_file_name):
+                continue
+            status = os.stat(full_file_name)
+            entry: Dict[str, Any] = previous.get(relative, {})
+            # files that were not written again need not be hashed again
+            if (entry.get('size') != status.st_size
+                    or entry.get('mtime') != status.st_mtime_ns):
+                with open(full_file_name, 'rb') as file:
+                    entry = {'sha256': hashlib.sha256(file.read()).hexdigest(),
+                             'size': status.st_size,
+                             'mtime': status.st_mtime_ns}
+            manifest[relative] = entry
+
+    return manifest
+
+
+def materialize(root: str, identifier: str, keep: int) -> None:
+    """Links a release from the object store and switches to it atomically."""
+    manifest: Manifest = read_json(os.path.join(root, 'manifests',
+                                                '%s.json' % identifier))
+    release: str = os.path.join(root, 'releases', identifier)
+    if not os.path.isdir(release):
+        temporary_release: str = '%s.%d.tmp' % (release, os.getpid())
+        for path, entry in manifest.items():
+            file_name: str = os.path.join(temporary_release, path)
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            source: str = os.path.join(root, object_name(entry['sha256']))
+            try:
+                os.link(source, file_name)
+            except OSError:
+                shutil.copy2(source, file_name)
+        os.makedirs(temporary_release, exist_ok=True)  # for empty releases
+        os.replace(temporary_release, release)
+
+    current: str = os.path.join(root, 'current')
+    # e.g. a site that was copied there before the releases were introduced
+    if os.path.isdir(current) and not os.path.islink(current):
+        raise DeployError("'%s' is a directory, but must be the link to the "
+                          "current release. Move it away, and let the web "
+                          "server serve the link instead." % current)
+    temporary_link: str = '%s.%d.tmp' % (current, os.getpid())
+    os.symlink(os.path.join('releases', identifier), temporary_link)
+    os.replace(temporary_link, current)
+    write_json(os.path.join(root, MANIFEST_FILE), manifest)
+
+    # keep some releases for a quick rollback, then drop unused objects
+    releases: List[str] = sorted(
+        (name for name in os.listdir(os.path.join(root, 'releases'))
+         if not name.endswith('.tmp')),
+        key=lambda name: os.path.getmtime(os.path.join(root, 'releases',
+                                                       name)),
+        reverse=True)
+    kept: List[str] = [identifier] + [name for name in releases
+                                      if name != identifier][:max(0, keep - 1)]
+    for name in releases:
+        if name not in kept:
+            shutil.rmtree(os.path.join(root, 'releases', name))
+            os.remove(os.path.join(root, 'manifests', '%s.json' % name))
+    used: Set[str] = set()
+    for name in kept:
+        used.update(entry['sha256'] for entry in read_json(os.path.join(
+            root, 'manifests', '%s.json' % name)).values())
+    for path, _, file_names in os.walk(os.path.join(root, 'objects')):
+        for file_name in file_names:
+            if file_name not in used:
+                os.remove(os.path.join(path, file_name))
+
+
+class LocalTarget(object):
+    def __init__(self, root: str) -> None:
+        self.root: str = os.path.abspath(root)
+
+    def read_manifest(self) -> Manifest:
+        return read_json(os.path.join(self.root, MANIFEST_FILE))
+
+    def upload(self, staging: str) -> None:
+        for path, _, file_names in os.walk(staging):
+            for file_name in file_names:
+                source: str = os.path.join(path, file_name)
+                destination: str = os.path.join(
+                    self.root, os.path.relpath(source, start=staging))
+                if os.path.isfile(destination):
+                    continue  # objects never change
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.copy2(source, destination)
+
+    def switch(self, identifier: str, keep: int) -> None:
+        materialize(self.root, identifier, keep)
+
+
+class RemoteTarget(object):
+    def __init__(self, host: str, root: str) -> None:
+        self.host: str = host
+        self.root: str = root
+
+    def run(self, arguments: List[str], **kwargs) -> bytes:
+        process = subprocess.run(['ssh', self.host] + arguments,
+                                 stdout=subprocess.PIPE, **kwargs)
+        if process.returncode != 0:
+            raise DeployError("The command %s failed on %s."
+                              % (arguments, self.host))
+        return process.stdout
+
+    def read_manifest(self) -> Manifest:
+        content: bytes = self.run(['cat "%s/%s" 2>/dev/null || echo "{}"'
+                                   % (self.root, MANIFEST_FILE)])
+        return json.loads(content.decode('utf-8'))
+
+    def upload(self, staging: str) -> None:
+        if subprocess.run(['rsync', '-rlptz', '--ignore-existing',
+                           staging + '/', '%s:%s/' % (self.host, self.root)]
+                          ).returncode != 0:
+            raise DeployError("The upload to %s failed." % self.host)
+
+    def switch(self, identifier: str, keep: int) -> None:
+        # the remote server runs this script to link the release
+        with open(os.path.abspath(__file__), 'rb') as file:
+            self.run(['python3', '-', '--materialize', self.root, identifier,
+                      '--keep', str(keep)], input=file.read())
+
+
+def create_target(target: str) -> Any:
+    if os.path.exists(target) or (target and ':' not in target):
+        return LocalTarget(target)
+
+    # e.g. "@:" of the Makefile if the remote variables are not set
+    match = REMOTE_PATTERN.match(target)
+    if match is None or '' in match.group(1).split('@'):
+        raise DeployError("The target '%s' has no host or no directory, "
+                          "expected 'user@host:directory' or a local "
+                          "directory." % target)
+    return RemoteTarget(match.group(1), match.group(2))
+
+
+def deploy(directory: str, target: Any, keep: int, dry_run: bool) -> None:
+    manifest_file_name: str = os.path.join(directory, os.pardir,
+                                           'deploy_manifest.json')
+    manifest: Manifest = generate_manifest(directory,
+                                           read_json(manifest_file_name))
+    write_json(manifest_file_name, manifest)
+
+    deployed: Set[str] = {entry['sha256']
+                          for entry in target.read_manifest().values()}
+    changed: Dict[str, str] = {}
+    for path, entry in sorted(manifest.items()):
+        if entry['sha256'] not in deployed:
+            changed.setdefault(entry['sha256'], path)
+    identifier: str = release_id(manifest)
+
+    print("%d files, %d new objects (%d bytes), release %s"
+          % (len(manifest), len(changed),
+             sum(manifest[path]['size'] for path in changed.values()),
+             identifier))
+    if dry_run:
+        for path in sorted(changed.values()):
+            print("  %s" % path)
+        return
+
+    with tempfile.TemporaryDirectory() as staging:
+        for digest, path in changed.items():
+            file_name: str = os.path.join(staging, object_name(digest))
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            shutil.copy2(os.path.join(directory, path), file_name)
+        os.makedirs(os.path.join(staging, 'manifests'))
+        write_json(os.path.join(staging, 'manifests', '%s.json' % identifier),
+                   manifest)
+        target.upload(staging)
+
+    target.switch(identifier, keep)
+    print("Switched to release %s." % identifier)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Deploys only the changed files of the HTML output and "
+                    "switches to the new release atomically.",
+    )
+    parser.add_argument('directory',
+                        help="Specify the HTML directory written by Sphinx.",
+                        )
+    parser.add_argument('target',
+                        help="Specify the target directory, either local or "
+                             "remote as 'user@host:directory'.",
+                        )
+    parser.add_argument('-k', '--keep',
+                        metavar='number',
+                        type=int,
+                        default=3,
+                        help="Specify how many releases are kept for a "
+                             "rollback.",
+                        )
+    parser.add_argument('-n', '--dry-run',
+                        action='store_true',
+                        help="Only show which files would be transferred.",
+                        )
+    parser.add_argument('--materialize',
+                        action='store_true',
+                        help=argparse.SUPPRESS,  # used on the remote server
+                        )
+    arguments = parser.parse_args()
+
+    try:
+        if arguments.materialize:
+            materialize(arguments.directory, arguments.target, arguments.keep)
+        else:
+            deploy(arguments.directory, create_target(arguments.target),
+                   arguments.keep, arguments.dry_run)
+    except DeployError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Compiles the LaTeX output of several courses and editions to PDF in parallel.
+Every document found in the given LaTeX directories is compiled by its own
+latexmk job. The auxiliary files of a document (.aux, .toc, ...) are saved in a
+state directory after each run and restored before the next one, so a document
+that has not changed converges in a single pass even if its LaTeX directory has
+been written from scratch.
+
+If a LaTeX directory contains a `fragments.json` written by `rosin.fragment`,
+each unit is compiled to a standalone PDF fragment instead. Fragments are cached
+by the content of their sources and the visibility tags of the edition, so after
+editing a single unit only this unit is compiled again. The course PDF is then
+assembled from the fragments with a cover, a table of contents and continuous
+page numbers.
+
+Example:
+```
+_script/latex_pipeline.py build/author/latex build/learner/latex --jobs 4
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple, Union
+
+LATEXMK: List[str] = ['latexmk', '-pdf', '-dvi-', '-ps-',
+                      '-interaction=nonstopmode', '-halt-on-error']
+STATE_EXTENSIONS: List[str] = [
+    '.aux',
+    '.fdb_latexmk',
+    '.fls',
+    '.idx',
+    '.ilg',
+    '.ind',
+    '.lof',
+    '.lot',
+    '.out',
+    '.toc',
+]
+FRAGMENTS: str = 'fragments.json'
+DATE_PATTERN = re.compile(rb'^\\date{.*}$', re.MULTILINE)
+GRAPHICS_PATTERN = re.compile(
+    r'includegraphics(?:\[[^\]]*\])?{((?:{[^}]*}|[^{}])+)}')
+LEVELS: List[Tuple[str, int]] = [
+    ('part', -1),
+    ('chapter', 0),
+    ('section', 1),
+    ('subsection', 2),
+    ('subsubsection', 3),
+]
+LATEX_ESCAPES: Dict[str, str] = {
+    '\\': r'\textbackslash{}',
+    '{': r'\{',
+    '}': r'\}',
+    '#': r'\#',
+    '$': r'\$',
+    '%': r'\%',
+    '&': r'\&',
+    '_': r'\_',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+}
+COURSE_TEMPLATE: str = r"""\documentclass[a4paper,oneside]{report}
+\usepackage[utf8]{inputenc}
+\usepackage[T1]{fontenc}
+\usepackage[margin=1in]{geometry}
+\usepackage{fancyhdr}
+\usepackage{pdfpages}
+\usepackage[hidelinks,bookmarks,bookmarksnumbered=false]{hyperref}
+\setlength{\headheight}{36pt}
+\fancypagestyle{fragment}{%%
+  \fancyhf{}%%
+  \fancyfoot[C]{\thepage}%%
+  \renewcommand{\headrulewidth}{0pt}%%
+  \renewcommand{\footrulewidth}{0pt}%%
+}
+\title{%(title)s}
+\author{%(author)s}
+\date{%(release)s}
+\begin{document}
+\pagenumbering{roman}
+\maketitle
+\tableofcontents
+\cleardoublepage
+\pagenumbering{arabic}
+%(fragments)s
+\end{document}
+"""
+
+
+def escape(text: str) -> str:
+    return ''.join(LATEX_ESCAPES.get(character, character)
+                   for character in text)
+
+
+class Document(object):
+    def __init__(self, latex_directory: str, name: str,
+                 state_directory: str = None) -> None:
+        self.latex_directory: str = latex_directory
+        self.name: str = name
+        self.state_directory: str = (state_directory or os.path.join(
+            latex_directory, os.pardir, 'latex_state'))
+
+    @property
+    def tex_file_name(self) -> str:
+        return os.path.join(self.latex_directory, '%s.tex' % self.name)
+
+    def state_files(self) -> List[Tuple[str, str]]:
+        return [(os.path.join(self.latex_directory, self.name + extension),
+                 os.path.join(self.state_directory, self.name + extension))
+                for extension in STATE_EXTENSIONS]
+
+    def restore(self) -> None:
+        for output_file_name, state_file_name in self.state_files():
+            if (os.path.isfile(state_file_name)
+                    and not os.path.isfile(output_file_name)):
+                shutil.copy2(state_file_name, output_file_name)
+
+    def save(self) -> None:
+        os.makedirs(self.state_directory, exist_ok=True)
+        for output_file_name, state_file_name in self.state_files():
+            if os.path.isfile(output_file_name):
+                shutil.copy2(output_file_name, state_file_name)
+
+    def compile(self, latexmk: List[str] = None) -> Tuple[bool, float]:
+        start: float = time.time()
+        self.restore()
+
+        with open(os.path.join(self.latex_directory, '%s.pipeline.log'
+                               % self.name), 'w') as log:
+            succeeded: bool = subprocess.run(
+                (latexmk or LATEXMK) + ['%s.tex' % self.name],
+                cwd=self.latex_directory,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            ).returncode == 0
+
+        if succeeded:
+            self.save()
+
+        return succeeded, time.time() - start
+
+
+class Fragment(Document):
+    def __init__(self, latex_directory: str, name: str, tags: List[str],
+                 cache_directory: str, state_directory: str = None) -> None:
+        super().__init__(latex_directory, name, state_directory)
+        self.tags: List[str] = tags
+        self.cache_directory: str = cache_directory
+
+    @property
+    def pdf_file_name(self) -> str:
+        return os.path.join(self.latex_directory, '%s.pdf' % self.name)
+
+    def content_hash(self) -> str:
+        content_hash = hashlib.sha256()
+        content_hash.update(repr(self.tags).encode('utf-8'))
+        with open(self.tex_file_name, 'rb') as file:
+            content = file.read()
+        # the build date is part of each document, but never shown
+        content_hash.update(DATE_PATTERN.sub(b'', content))
+
+        # the style files and the graphics are shared by all fragments
+        file_names: List[str] = [
+            os.path.join(self.latex_directory, file_name)
+            for file_name in sorted(os.listdir(self.latex_directory))
+            if os.path.splitext(file_name)[1] in ['.cls', '.sty']]
+        for graphic in sorted(set(GRAPHICS_PATTERN.findall(
+                content.decode('utf-8', errors='replace')))):
+            file_names.append(os.path.join(self.latex_directory,
+                                           re.sub(r'[{}]', '', graphic)))
+
+        for file_name in file_names:
+            content_hash.update(os.path.basename(file_name).encode('utf-8'))
+            if os.path.isfile(file_name):
+                with open(file_name, 'rb') as file:
+                    content_hash.update(file.read())
+
+        return content_hash.hexdigest()
+
+    def compile(self, latexmk: List[str] = None) -> Tuple[bool, float]:
+        start: float = time.time()
+        digest: str = self.content_hash()
+        cache_file_name: str = os.path.join(self.cache_directory, digest[:2],
+                                            '%s.pdf' % digest)
+
+        if os.path.isfile(cache_file_name):
+            shutil.copy2(cache_file_name, self.pdf_file_name)
+            return True, time.time() - start
+
+        succeeded, _ = super().compile(latexmk)
+        if succeeded:
+            os.makedirs(os.path.dirname(cache_file_name), exist_ok=True)
+            # editions of several courses share the cache
+            temporary_file_name: str = '%s.%d.tmp' % (cache_file_name,
+                                                      os.getpid())
+            shutil.copy2(self.pdf_file_name, temporary_file_name)
+            os.replace(temporary_file_name, cache_file_name)
+
+        return succeeded, time.time() - start
+
+
+class Course(object):
+    def __init__(self, latex_directory: str, manifest: Dict[str, Any],
+                 cache_directory: str, state_directory: str = None) -> None:
+        self.latex_directory: str = latex_directory
+        self.manifest: Dict[str, Any] = manifest
+        self.state_directory: str = state_directory
+        self.fragments: List[Fragment] = [
+            Fragment(latex_directory, entry['fragment'], manifest['tags'],
+                     cache_directory, state_directory=state_directory)
+            for entry in manifest['entries']
+            if entry['fragment'] is not None]
+
+    def generate_tex(self) -> str:
+        lines: List[str] = []
+        contents: List[str] = []
+        for entry in self.manifest['entries']:
+            name, level = LEVELS[min(entry['level'], len(LEVELS) - 1)]
+            # page of the fragment, section name, level, heading and label
+            contents.append('1, %s, %d, {%s}, %s' % (
+                name, level, escape(entry['title']),
+                entry['doc_name'].replace('/', '.')))
+            # units that structure the course are listed with the next fragment
+            if entry['fragment'] is None:
+                continue
+            lines.append(
+                '\\includepdf[pages=-,pagecommand={\\thispagestyle{fragment}},'
+                'addtotoc={%s}]{%s.pdf}' % (', '.join(contents),
+                                            entry['fragment']))
+            contents = []
+
+        return COURSE_TEMPLATE % {
+            'title': escape(self.manifest['title']),
+            'author': self.manifest['author'],  # already LaTeX, e.g. '\\and'
+            'release': escape(self.manifest['release']),
+            'fragments': '\n'.join(lines),
+        }
+
+    def assemble(self, latexmk: List[str] = None) -> Tuple[bool, float]:
+        document: Document = Document(self.latex_directory,
+                                      self.manifest['target'],
+                                      state_directory=self.state_directory)
+        with open(document.tex_file_name, 'w') as file:
+            file.write(self.generate_tex())
+
+        return document.compile(latexmk)
+
+
+class Pipeline(object):
+    @staticmethod
+    def find_documents(latex_directory: str,
+                       state_directory: str = None) -> List[Document]:
+        documents: List[Document] = []
+        for file_name in sorted(os.listdir(latex_directory)):
+            name, extension = os.path.splitext(file_name)
+            if extension != '.tex':
+                continue
+            # only complete documents, no included parts or style files
+            with open(os.path.join(latex_directory, file_name), 'r',
+                      errors='replace') as file:
+                if '\\documentclass' not in file.read(4096):
+                    continue
+            documents.append(Document(latex_directory, name,
+                                      state_directory=state_directory))
+
+        return documents
+
+    @staticmethod
+    def find_course(latex_directory: str, cache_directory: str,
+                    state_directory: str = None) -> Union[Course, None]:
+        file_name: str = os.path.join(latex_directory, FRAGMENTS)
+        if not os.path.isfile(file_name):
+            return None
+
+        with open(file_name, 'r') as file:
+            return Course(latex_directory, json.load(file),
+                          cache_directory or os.path.join(
+                              latex_directory, os.pardir, os.pardir,
+                              'fragment_cache'),
+                          state_directory=state_directory)
+
+    @staticmethod
+    def run(documents: List[Document], jobs: int,
+            courses: List[Course] = None) -> bool:
+        def compile_document(document: Document) -> bool:
+            succeeded, duration = document.compile()
+            print("%s %s (%.2f s)" % ("Compiled" if succeeded else "FAILED",
+                                      document.tex_file_name, duration))
+            return succeeded
+
+        def assemble_course(course: Course) -> bool:
+            succeeded, duration = course.assemble()
+            print("%s %s (%.2f s)" % ("Assembled" if succeeded else "FAILED",
+                                      course.manifest['target'], duration))
+            return succeeded
+
+        courses = courses or []
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            # the fragments of all courses first, then the fast merges
+            if not all(list(executor.map(compile_document, documents + [
+                    fragment for course in courses
+                    for fragment in course.fragments]))):
+                return False
+            return all(list(executor.map(assemble_course, courses)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compiles the LaTeX output of Sphinx to PDF with latexmk "
+                    "in parallel and keeps the auxiliary files between runs.",
+    )
+    parser.add_argument('directories',
+                        metavar='directory',
+                        nargs='+',
+                        help="Specify the LaTeX directories written by Sphinx.",
+                        )
+    parser.add_argument('-j', '--jobs',
+                        metavar='number',
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help="Specify the number of parallel latexmk jobs.",
+                        )
+    parser.add_argument('--state',
+                        metavar='directory',
+                        default=None,
+                        help="Specify where the auxiliary files are kept, "
+                             "defaults to 'latex_state' next to each LaTeX "
+                             "directory.",
+                        )
+    parser.add_argument('--cache',
+                        metavar='directory',
+                        default=None,
+                        help="Specify where the compiled fragments are cached, "
+                             "defaults to 'fragment_cache' next to the "
+                             "editions.",
+                        )
+    arguments = parser.parse_args()
+
+    documents: List[Document] = []
+    courses: List[Course] = []
+    for directory in arguments.directories:
+        state_directory: str = None
+        if arguments.state is not None:
+            state_directory = os.path.join(
+                arguments.state,
+                os.path.abspath(directory).strip(os.sep).replace(os.sep, '_'))
+        course: Course = Pipeline.find_course(directory, arguments.cache,
+                                              state_directory=state_directory)
+        if course is not None:
+            courses.append(course)
+        else:
+            documents += Pipeline.find_documents(
+                directory, state_directory=state_directory)
+
+    sys.exit(0 if Pipeline.run(documents, arguments.jobs, courses) else 1)
+
+
+if __name__ == "__main__":
+    main()
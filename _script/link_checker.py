@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Checks the external links of the HTML output of Sphinx, e.g. the links to
+wiki.ros.org and docs.ros.org generated by the rosin.ROS_Element extension and
+the links in the units. In contrast to the `linkcheck` builder of Sphinx, the
+links are checked concurrently by asyncio, the connections to a host are kept
+alive and reused, and the number of concurrent requests is limited per host and
+in total, so a large course does not flood a single server.
+
+The results are kept in a cache file with a time to live, so only new links and
+links whose result expired are checked again. Working links are kept longer
+than broken ones. A link is first requested with HEAD, and with GET if the
+server refuses HEAD. Redirects are followed, and anchors are not checked.
+
+Any HTTP server can stand in for the real hosts, e.g. the preview server.
+
+Example:
+```
+_script/link_checker.py build/learner/html
+_script/link_checker.py build/author/html build/learner/html --per-host 2
+_script/preview_server.py build/learner/html --port 8008 &
+_script/link_checker.py --url http://localhost:8008/index.html --no-cache
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import ssl
+import sys
+import time
+import urllib.parse
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+CACHE_VERSION: int = 1
+DEFAULT_CACHE: str = os.path.join('build', 'cache', 'link_checker.json')
+HOUR: int = 3600
+MAXIMUM_BODY: int = 1024 * 1024  # larger bodies are not read to reuse
+MAXIMUM_HEADERS: int = 100
+MAXIMUM_REDIRECTS: int = 10
+MAXIMUM_RETRY_AFTER: int = 60
+REDIRECTS: List[int] = [301, 302, 303, 307, 308]
+SKIPPED_DIRECTORIES: List[str] = ['_images', '_sources', '_static']
+USER_AGENT: str = 'rosin-link-checker/%s' % __version__
+
+# status, code, and detail, e.g. ('broken', 404, 'Not Found') or
+# ('redirected', 301, 'https://...')
+Result = Dict[str, Any]
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class LinkParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.links: List[Tuple[str, int]] = []
+
+    def handle_starttag(self, tag: str,
+                        attributes: List[Tuple[str, Optional[str]]]) -> None:
+        if tag != 'a':
+            return
+        href: Optional[str] = dict(attributes).get('href')
+        if href and href.startswith(('http://', 'https://')):
+            self.links.append((href.strip(), self.getpos()[0]))
+
+
+def find_links(directories: List[str]) -> Dict[str, List[Tuple[str, int]]]:
+    """Returns the files and lines of every external link by its URL."""
+    links: Dict[str, List[Tuple[str, int]]] = {}
+    for directory in directories:
+        for path, directory_names, file_names in os.walk(directory):
+            directory_names[:] = sorted(name for name in directory_names
+                                        if name not in SKIPPED_DIRECTORIES)
+            for file_name in sorted(file_names):
+                if not file_name.endswith('.html'):
+                    continue
+                file_name = os.path.join(path, file_name)
+                parser: LinkParser = LinkParser()
+                with open(file_name, 'r', encoding='utf-8',
+                          errors='replace') as file:
+                    parser.feed(file.read())
+                for href, line in parser.links:
+                    # anchors are not checked, so the page is checked once
+                    url: str = urllib.parse.urldefrag(href)[0]
+                    links.setdefault(url, []).append((file_name, line))
+
+    return links
+
+
+class Host(object):
+    """The idle connections to a host and the limit of concurrent requests."""
+
+    def __init__(self, limit: int) -> None:
+        self.semaphore: asyncio.Semaphore = asyncio.Semaphore(limit)
+        self.idle: List[Connection] = []
+
+
+class Checker(object):
+    def __init__(self, per_host: int, total: int, timeout: float) -> None:
+        self.per_host: int = per_host
+        self.limit: asyncio.Semaphore = asyncio.Semaphore(total)
+        self.timeout: float = timeout
+        self.hosts: Dict[Tuple[str, str, int], Host] = {}
+        self.context: ssl.SSLContext = ssl.create_default_context()
+        self.connections: int = 0
+        self.requests: int = 0
+
+    @staticmethod
+    async def read_head(reader: asyncio.StreamReader
+                        ) -> Tuple[int, str, Dict[str, str]]:
+        line: bytes = await reader.readline()
+        if not line:
+            raise ConnectionResetError("connection closed by the server")
+        version, _, rest = line.decode('latin-1').strip().partition(' ')
+        code, _, reason = rest.partition(' ')
+        if not version.startswith('HTTP/') or not code.isdigit():
+            raise ValueError("malformed status line")
+
+        headers: Dict[str, str] = {}
+        for _ in range(MAXIMUM_HEADERS):
+            line = await reader.readline()
+            if line in [b'\r\n', b'\n', b'']:
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ValueError("too many headers")
+
+        return int(code), reason, headers
+
+    @staticmethod
+    async def read_body(reader: asyncio.StreamReader, method: str,
+                        code: int, headers: Dict[str, str]) -> bool:
+        """Skips the body of a response, returns whether the connection can
+        be reused."""
+        if method == 'HEAD' or code in [204, 304] or code < 200:
+            return True
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            read: int = 0
+            while read <= MAXIMUM_BODY:
+                size: int = int((await reader.readline()).split(b';')[0],
+                                16)
+                if size == 0:
+                    # trailers up to the empty line
+                    while (await reader.readline()) not in [b'\r\n', b'\n',
+                                                            b'']:
+                        pass
+                    return True
+                await reader.readexactly(size + 2)
+                read += size
+            return False
+        length: str = headers.get('content-length', '')
+        if length.isdigit() and int(length) <= MAXIMUM_BODY:
+            await reader.readexactly(int(length))
+            return True
+
+        return False  # the body ends with the connection
+
+    async def exchange(self, host: Host, name: str, port: int, secure: bool,
+                       head: bytes, method: str
+                       ) -> Tuple[int, str, Dict[str, str]]:
+        while True:
+            reused: bool = bool(host.idle)
+            if reused:
+                reader, writer = host.idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(
+                    name, port, ssl=self.context if secure else None)
+                self.connections += 1
+            try:
+                writer.write(head)
+                await writer.drain()
+                code, reason, headers = await self.read_head(reader)
+                reusable: bool = await self.read_body(reader, method, code,
+                                                      headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue  # closed by the server while idle
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            self.requests += 1
+
+            if reusable and headers.get('connection', '').lower() != 'close':
+                host.idle.append((reader, writer))
+            else:
+                writer.close()
+            return code, reason, headers
+
+    async def request(self, method: str, url: str, timeout: float
+                      ) -> Tuple[int, str, Dict[str, str], float]:
+        """Requests a URL within the timeout, and returns the response and
+        the time it took. The time waiting for a free slot of the host is not
+        counted."""
+        parts: urllib.parse.SplitResult = urllib.parse.urlsplit(url)
+        secure: bool = parts.scheme == 'https'
+        name: str = (parts.hostname or '').encode('idna').decode('ascii')
+        port: int = parts.port or (443 if secure else 80)
+        target: str = urllib.parse.quote(
+            (parts.path or '/') + ('?' + parts.query if parts.query else ''),
+            safe="/%?=&;:@!$'()*+,~")
+        head: bytes = ('%s %s HTTP/1.1\r\nHost: %s%s\r\nUser-Agent: %s\r\n'
+                       'Accept: */*\r\nConnection: keep-alive\r\n\r\n'
+                       % (method, target, name,
+                          ':%d' % parts.port if parts.port else '',
+                          USER_AGENT)).encode('latin-1')
+
+        host: Host = self.hosts.setdefault((parts.scheme, name, port),
+                                           Host(self.per_host))
+        async with host.semaphore:
+            started: float = time.monotonic()
+            code, reason, headers = await asyncio.wait_for(
+                self.exchange(host, name, port, secure, head, method),
+                timeout)
+            return code, reason, headers, time.monotonic() - started
+
+    async def check(self, url: str) -> Result:
+        method: str = 'HEAD'
+        current: str = url
+        redirects: int = 0
+        retried: bool = False
+        # one timeout for the link and all its redirects
+        remaining: float = self.timeout
+        async with self.limit:
+            while True:
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    code, reason, headers, elapsed = await self.request(
+                        method, current, remaining)
+                    remaining -= elapsed
+                except asyncio.TimeoutError:
+                    return result('broken', 0, "timed out after %g s"
+                                  % self.timeout)
+                except (OSError, ValueError, asyncio.IncompleteReadError,
+                        UnicodeError) as error:
+                    return result('broken', 0, str(error)
+                                  or error.__class__.__name__)
+
+                if code == 429 and not retried:
+                    # too many requests, wait once as told by the server
+                    retried = True
+                    delay: str = headers.get('retry-after', '')
+                    await asyncio.sleep(min(int(delay), MAXIMUM_RETRY_AFTER)
+                                        if delay.isdigit() else 1)
+                    continue
+                if code >= 400 and method == 'HEAD':
+                    method = 'GET'  # some servers refuse HEAD
+                    continue
+                if code in REDIRECTS and 'location' in headers:
+                    if redirects == MAXIMUM_REDIRECTS:
+                        return result('broken', code, "too many redirects")
+                    redirects += 1
+                    current = urllib.parse.urldefrag(urllib.parse.urljoin(
+                        current, headers['location']))[0]
+                    method = 'HEAD'
+                    continue
+                if code >= 400:
+                    return result('broken', code, reason)
+                if current != url:
+                    return result('redirected', code, current)
+                return result('working', code, reason)
+
+    def close(self) -> None:
+        for host in self.hosts.values():
+            for _, writer in host.idle:
+                writer.close()
+            host.idle.clear()
+
+
+def result(status: str, code: int, detail: str) -> Result:
+    return {'status': status, 'code': code, 'detail': detail,
+            'checked': time.time()}
+
+
+def load_cache(file_name: Optional[str]) -> Dict[str, Result]:
+    if file_name is None or not os.path.isfile(file_name):
+        return {}
+    try:
+        with open(file_name, 'r') as file:
+            data: Dict[str, Any] = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    return data['results'] if data.get('version') == CACHE_VERSION else {}
+
+
+def save_cache(file_name: Optional[str], results: Dict[str, Result]) -> None:
+    if file_name is None:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    temporary_file_name: str = '%s.%d.tmp' % (file_name, os.getpid())
+    with open(temporary_file_name, 'w') as file:
+        json.dump({'version': CACHE_VERSION, 'results': results}, file,
+                  indent=1, sort_keys=True)
+    os.replace(temporary_file_name, file_name)
+
+
+def expired(cached: Optional[Result], ttl: float, broken_ttl: float) -> bool:
+    if cached is None:
+        return True
+    age: float = time.time() - cached['checked']
+    return age >= (broken_ttl if cached['status'] == 'broken' else ttl)
+
+
+async def check_all(urls: List[str], per_host: int, total: int,
+                    timeout: float) -> Tuple[Dict[str, Result], int, int]:
+    checker: Checker = Checker(per_host, total, timeout)
+    try:
+        results: List[Result] = await asyncio.gather(*[checker.check(url)
+                                                       for url in urls])
+    finally:
+        checker.close()
+
+    return dict(zip(urls, results)), checker.connections, checker.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Checks the external links of the HTML output of Sphinx "
+                    "concurrently, and caches the results.",
+    )
+    parser.add_argument('directories',
+                        metavar='directory',
+                        nargs='*',
+                        help="Specify the HTML directories written by "
+                             "Sphinx, whose links are checked.",
+                        )
+    parser.add_argument('-u', '--url',
+                        action='append',
+                        default=[],
+                        help="Specify a URL to check in addition, e.g. of a "
+                             "local server.",
+                        )
+    parser.add_argument('-i', '--ignore',
+                        metavar='pattern',
+                        action='append',
+                        default=[],
+                        help="Specify a regular expression of URLs which are "
+                             "not checked.",
+                        )
+    parser.add_argument('--per-host',
+                        metavar='number',
+                        type=int,
+                        default=4,
+                        help="Specify the maximum number of concurrent "
+                             "requests to a host.",
+                        )
+    parser.add_argument('-j', '--jobs',
+                        metavar='number',
+                        type=int,
+                        default=32,
+                        help="Specify the maximum number of concurrent "
+                             "requests in total.",
+                        )
+    parser.add_argument('-t', '--timeout',
+                        metavar='seconds',
+                        type=float,
+                        default=30.0,
+                        help="Specify the time after which a link, "
+                             "including its redirects, is broken. The time "
+                             "waiting for a free request to a host is not "
+                             "counted.",
+                        )
+    parser.add_argument('--cache',
+                        metavar='file',
+                        default=DEFAULT_CACHE,
+                        help="Specify the file which keeps the results "
+                             "between runs.",
+                        )
+    parser.add_argument('--no-cache',
+                        action='store_true',
+                        help="Check all links, and neither read nor write "
+                             "the cache.",
+                        )
+    parser.add_argument('--ttl',
+                        metavar='hours',
+                        type=float,
+                        default=168.0,
+                        help="Specify how long the result of a working link "
+                             "is kept.",
+                        )
+    parser.add_argument('--broken-ttl',
+                        metavar='hours',
+                        type=float,
+                        default=6.0,
+                        help="Specify how long the result of a broken link "
+                             "is kept.",
+                        )
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help="Also print redirected links.",
+                        )
+    arguments = parser.parse_args()
+
+    for directory in arguments.directories:
+        if not os.path.isdir(directory):
+            parser.error("The directory '%s' does not exist." % directory)
+    if not arguments.directories and not arguments.url:
+        parser.error("Specify at least one directory or URL.")
+    if arguments.per_host < 1 or arguments.jobs < 1:
+        parser.error("The limits of concurrent requests must be positive.")
+
+    start: float = time.time()
+    links: Dict[str, List[Tuple[str, int]]] = find_links(
+        arguments.directories)
+    for url in arguments.url:
+        links.setdefault(urllib.parse.urldefrag(url)[0], [])
+    ignored: List[Pattern] = [re.compile(pattern)
+                              for pattern in arguments.ignore]
+    urls: List[str] = sorted(url for url in links
+                             if not any(pattern.match(url)
+                                        for pattern in ignored))
+
+    cache_file: Optional[str] = None if arguments.no_cache \
+        else arguments.cache
+    results: Dict[str, Result] = load_cache(cache_file)
+    pending: List[str] = [url for url in urls
+                          if expired(results.get(url), arguments.ttl * HOUR,
+                                     arguments.broken_ttl * HOUR)]
+    connections: int = 0
+    requests: int = 0
+    if pending:
+        try:
+            checked, connections, requests = asyncio.run(check_all(
+                pending, arguments.per_host, arguments.jobs,
+                arguments.timeout))
+        except KeyboardInterrupt:
+            sys.exit(1)
+        results.update(checked)
+        save_cache(cache_file, results)
+
+    counts: Dict[str, int] = {'working': 0, 'redirected': 0, 'broken': 0}
+    for url in urls:
+        current: Result = results[url]
+        counts[current['status']] += 1
+        if current['status'] == 'working' or (current['status'] == 'redirected'
+                                              and not arguments.verbose):
+            continue
+        message: str = (
+            "broken: %s (%s)" % (url, ' '.join(str(part) for part in [
+                current['code'] or '', current['detail']] if part))
+            if current['status'] == 'broken'
+            else "redirected: %s to %s" % (url, current['detail']))
+        # URLs given on the command line have no location
+        for location in ['%s:%d: ' % occurrence for occurrence in links[url]
+                         ] or ['']:
+            print(location + message)
+
+    print("Checked %d links to %d URLs in %.1f s, %d from the cache, with %d "
+          "requests over %d connections: %d broken, %d redirected."
+          % (sum(len(links[url]) for url in urls), len(urls),
+             time.time() - start, len(urls) - len(pending), requests,
+             connections, counts['broken'], counts['redirected']))
+    sys.exit(1 if counts['broken'] else 0)
+
+
+if __name__ == "__main__":
+    main()
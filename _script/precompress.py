@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Writes precompressed `.gz` and `.br` siblings for every compressible file in the
+HTML output of Sphinx, so web servers can deliver them without compressing on
+every request. The files are compressed in parallel on all cores. The content
+hash of each file is kept in `.precompress.json` in the output directory, so a
+file is only compressed again if it has changed since the last run. Brotli is
+only written if the `brotli` package is installed. Variants that are not written
+anymore, e.g. of removed or too small files or of a disabled encoding, are
+removed.
+
+Example:
+```
+_script/precompress.py build/author/html build/learner/html
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.1"
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS: List[str] = [
+    '.css',
+    '.html',
+    '.ico',
+    '.js',
+    '.json',
+    '.map',
+    '.svg',
+    '.txt',
+    '.xml',
+]
+MINIMUM_SIZE: int = 256  # smaller files do not benefit from compression
+STATE_FILE: str = '.precompress.json'
+
+
+def encodings() -> List[str]:
+    return ['.gz', '.br'] if brotli is not None else ['.gz']
+
+
+def compress(file_name: str) -> Tuple[str, str, int, int]:
+    with open(file_name, 'rb') as file:
+        content: bytes = file.read()
+
+    sizes: List[int] = []
+    for encoding in encodings():
+        if encoding == '.gz':
+            # no file name and time in the header, so the output is stable
+            compressed: bytes = gzip.compress(content, compresslevel=9,
+                                              mtime=0)
+        else:
+            compressed = brotli.compress(content,
+                                         mode=brotli.MODE_TEXT, quality=11)
+        temporary_file_name: str = '%s%s.%d.tmp' % (file_name, encoding,
+                                                    os.getpid())
+        with open(temporary_file_name, 'wb') as file:
+            file.write(compressed)
+        # servers compare the time of the variant with the original file
+        status = os.stat(file_name)
+        os.utime(temporary_file_name, (status.st_atime, status.st_mtime))
+        os.replace(temporary_file_name, file_name + encoding)
+        sizes.append(len(compressed))
+
+    return (file_name, hashlib.sha256(content).hexdigest(), len(content),
+            min(sizes))
+
+
+def content_hash(file_name: str) -> str:
+    with open(file_name, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def find_files(directory: str) -> List[str]:
+    file_names: List[str] = []
+    for path, _, names in os.walk(directory):
+        for name in names:
+            file_name: str = os.path.join(path, name)
+            if (os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS
+                    and os.path.getsize(file_name) >= MINIMUM_SIZE):
+                file_names.append(file_name)
+
+    return sorted(file_names)
+
+
+def remove_orphans(directory: str, hashes: Dict[str, str]) -> int:
+    """Removes the variants that are not written anymore, i.e. of files that
+    were removed or are too small now, and of encodings that are disabled."""
+    removed: int = 0
+    for path, _, names in os.walk(directory):
+        for name in names:
+            base_name, extension = os.path.splitext(name)
+            if (extension in ['.gz', '.br']
+                    and os.path.splitext(base_name)[1]
+                    in COMPRESSIBLE_EXTENSIONS
+                    and (extension not in encodings()
+                         or os.path.relpath(os.path.join(path, base_name),
+                                            start=directory) not in hashes)):
+                os.remove(os.path.join(path, name))
+                removed += 1
+
+    return removed
+
+
+def precompress(directory: str, jobs: int) -> None:
+    state_file_name: str = os.path.join(directory, STATE_FILE)
+    state: Dict[str, str] = {}
+    if os.path.isfile(state_file_name):
+        with open(state_file_name, 'r') as file:
+            state = json.load(file)
+
+    pending: List[str] = []
+    hashes: Dict[str, str] = {}
+    for file_name in find_files(directory):
+        relative_name: str = os.path.relpath(file_name, start=directory)
+        hashes[relative_name] = content_hash(file_name)
+        if (state.get(relative_name) != hashes[relative_name]
+                or not all(os.path.isfile(file_name + encoding)
+                           for encoding in encodings())):
+            pending.append(file_name)
+
+    original_size: int = 0
+    compressed_size: int = 0
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for _, _, original, compressed in executor.map(compress, pending,
+                                                       chunksize=16):
+            original_size += original
+            compressed_size += compressed
+
+    removed: int = remove_orphans(directory, hashes)
+    with open(state_file_name, 'w') as file:
+        json.dump(hashes, file, indent=2, sort_keys=True)
+
+    print("%s: compressed %d of %d files (%d -> %d bytes), skipped %d "
+          "unchanged, removed %d stale variants"
+          % (directory, len(pending), len(hashes), original_size,
+             compressed_size, len(hashes) - len(pending), removed))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Writes gzip and brotli compressed siblings of all "
+                    "compressible files in the HTML output.",
+    )
+    parser.add_argument('directories',
+                        metavar='directory',
+                        nargs='+',
+                        help="Specify the HTML directories written by Sphinx.",
+                        )
+    parser.add_argument('-j', '--jobs',
+                        metavar='number',
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help="Specify the number of parallel processes.",
+                        )
+    arguments = parser.parse_args()
+
+    if brotli is None:
+        print("The 'brotli' package is not installed, only gzip is written.",
+              file=sys.stderr)
+    for directory in arguments.directories:
+        precompress(directory, arguments.jobs)
+
+
+if __name__ == "__main__":
+    main()
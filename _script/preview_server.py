@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Serves the HTML output of Sphinx for a local preview. In contrast to
+`python3 -m http.server`, all requests are handled concurrently by asyncio, so a
+large lecture PDF or video does not block the pages requested meanwhile. The
+server delivers the `.br` and `.gz` variants written by `precompress.py`,
+supports range requests for media and PDFs, and answers conditional requests
+with the ETag and the Last-Modified date of a file.
+
+Several editions can be served on one port by mounting each build directory
+under its own path prefix.
+
+Example:
+```
+_script/preview_server.py build/author/html
+_script/preview_server.py /author=build/author/html /learner=build/learner/html
+```
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import asyncio
+import email.utils
+import html
+import mimetypes
+import os
+import re
+import sys
+import time
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+ENCODINGS: List[Tuple[str, str]] = [('br', '.br'), ('gzip', '.gz')]
+FINGERPRINT_PATTERN = re.compile(r'\.[0-9a-f]{12}\.min\.')
+MAXIMUM_HEADERS: int = 100
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+REASONS: Dict[int, str] = {
+    200: 'OK',
+    206: 'Partial Content',
+    301: 'Moved Permanently',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    416: 'Range Not Satisfiable',
+}
+
+
+class Request(object):
+    def __init__(self, method: str, target: str, version: str,
+                 headers: Dict[str, str]) -> None:
+        self.method: str = method
+        self.target: str = target
+        self.version: str = version
+        self.headers: Dict[str, str] = headers
+
+    @property
+    def path(self) -> str:
+        return urllib.parse.unquote(urllib.parse.urlsplit(self.target).path)
+
+    @property
+    def keep_alive(self) -> bool:
+        connection: str = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    def accepts(self, encoding: str) -> bool:
+        return any(part.split(';')[0].strip() == encoding
+                   and not part.replace(' ', '').endswith(';q=0')
+                   for part in self.headers.get('accept-encoding', ''
+                                                ).split(','))
+
+
+class Server(object):
+    def __init__(self, mounts: List[Tuple[str, str]]) -> None:
+        # the longest prefix is matched first
+        self.mounts: List[Tuple[str, str]] = sorted(
+            mounts, key=lambda mount: len(mount[0]), reverse=True)
+
+    @staticmethod
+    async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+        line: bytes = await reader.readline()
+        if not line:
+            return None
+        parts: List[str] = line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise ValueError("malformed request line")
+
+        headers: Dict[str, str] = {}
+        for _ in range(MAXIMUM_HEADERS):
+            line = await reader.readline()
+            if line in [b'\r\n', b'\n', b'']:
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ValueError("too many headers")
+
+        return Request(*parts, headers)
+
+    def resolve(self, path: str) -> Tuple[Optional[str], Optional[str]]:
+        for prefix, directory in self.mounts:
+            if path == prefix.rstrip('/') and prefix != '/':
+                return None, prefix  # redirect to the directory
+            if not path.startswith(prefix):
+                continue
+            relative: str = path[len(prefix):].lstrip('/')
+            file_name: str = os.path.normpath(os.path.join(directory,
+                                                           relative))
+            # never leave the mounted directory
+            if os.path.commonpath([file_name, directory]) != directory:
+                return None, None
+            if os.path.isdir(file_name):
+                if not path.endswith('/'):
+                    return None, path + '/'
+                file_name = os.path.join(file_name, 'index.html')
+            return (file_name if os.path.isfile(file_name) else None), None
+
+        return None, None
+
+    def index(self) -> bytes:
+        links: str = ''.join('<li><a href="%s">%s</a> (%s)</li>'
+                             % (html.escape(prefix), html.escape(prefix),
+                                html.escape(directory))
+                             for prefix, directory in sorted(self.mounts))
+        return ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>'
+                'Preview</title></head><body><ul>%s</ul></body></html>'
+                % links).encode('utf-8')
+
+    @staticmethod
+    def write_head(writer: asyncio.StreamWriter, status: int,
+                   headers: Dict[str, str]) -> None:
+        lines: List[str] = ['HTTP/1.1 %d %s' % (status, REASONS[status])]
+        lines += ['%s: %s' % item for item in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+    async def respond(self, request: Request,
+                      writer: asyncio.StreamWriter) -> int:
+        headers: Dict[str, str] = {
+            'Date': email.utils.formatdate(usegmt=True),
+            'Server': 'rosin-preview',
+            'Connection': 'keep-alive' if request.keep_alive else 'close',
+        }
+
+        if request.method not in ['GET', 'HEAD']:
+            headers.update({'Allow': 'GET, HEAD', 'Content-Length': '0'})
+            self.write_head(writer, 405, headers)
+            return 405
+
+        file_name, location = self.resolve(request.path)
+        if location is not None:
+            headers.update({'Location': location, 'Content-Length': '0'})
+            self.write_head(writer, 301, headers)
+            return 301
+        if file_name is None:
+            body: bytes = (self.index() if request.path == '/' else
+                           b'Not Found')
+            status: int = 200 if request.path == '/' else 404
+            headers.update({'Content-Type': 'text/html; charset=utf-8',
+                            'Content-Length': str(len(body))})
+            self.write_head(writer, status, headers)
+            if request.method == 'GET':
+                writer.write(body)
+            return status
+
+        status = await self.send_file(request, writer, file_name, headers)
+        return status
+
+    async def send_file(self, request: Request, writer: asyncio.StreamWriter,
+                        file_name: str, headers: Dict[str, str]) -> int:
+        content_type, _ = mimetypes.guess_type(file_name)
+        if content_type is None:
+            content_type = 'application/octet-stream'
+        elif content_type.startswith('text/') or content_type in [
+                'application/javascript', 'application/json']:
+            content_type += '; charset=utf-8'
+        status = os.stat(file_name)
+
+        # ranges always refer to the original file, never to a variant
+        byte_range: Optional[str] = request.headers.get('range')
+        encoding: Optional[str] = None
+        if byte_range is None:
+            for name, extension in ENCODINGS:
+                if (request.accepts(name)
+                        and os.path.isfile(file_name + extension)
+                        and os.stat(file_name + extension).st_mtime
+                        >= status.st_mtime):
+                    encoding = name
+                    file_name += extension
+                    break
+
+        entity_tag: str = '"%x-%x%s"' % (status.st_mtime_ns, status.st_size,
+                                         '-' + encoding if encoding else '')
+        headers.update({
+            'Content-Type': content_type,
+            'ETag': entity_tag,
+            'Last-Modified': email.utils.formatdate(status.st_mtime,
+                                                    usegmt=True),
+            'Accept-Ranges': 'bytes',
+            'Vary': 'Accept-Encoding',
+            # bundles with a hash in their file name never change
+            'Cache-Control': ('public, max-age=31536000, immutable'
+                              if FINGERPRINT_PATTERN.search(file_name)
+                              else 'no-cache'),
+        })
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+
+        if self.not_modified(request, entity_tag, status.st_mtime):
+            self.write_head(writer, 304, headers)
+            return 304
+
+        size: int = os.path.getsize(file_name)
+        offset, count = 0, size
+        response_status: int = 200
+        if byte_range is not None and self.range_applies(request, entity_tag,
+                                                         status.st_mtime):
+            parsed: Optional[Tuple[int, int]] = self.parse_range(byte_range,
+                                                                 size)
+            if parsed is None:
+                headers.update({'Content-Range': 'bytes */%d' % size,
+                                'Content-Length': '0'})
+                self.write_head(writer, 416, headers)
+                return 416
+            offset, count = parsed
+            response_status = 206
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (
+                offset, offset + count - 1, size)
+
+        headers['Content-Length'] = str(count)
+        self.write_head(writer, response_status, headers)
+        if request.method == 'GET' and count > 0:
+            await writer.drain()
+            with open(file_name, 'rb') as file:
+                await asyncio.get_event_loop().sendfile(
+                    writer.transport, file, offset, count)
+
+        return response_status
+
+    @staticmethod
+    def not_modified(request: Request, entity_tag: str,
+                     modified: float) -> bool:
+        if 'if-none-match' in request.headers:
+            return entity_tag in [tag.strip().lstrip('W/') for tag in
+                                  request.headers['if-none-match'].split(',')
+                                  ] or request.headers['if-none-match'] == '*'
+        if 'if-modified-since' in request.headers:
+            try:
+                since = email.utils.parsedate_to_datetime(
+                    request.headers['if-modified-since'])
+            except (TypeError, ValueError):
+                return False
+            return since is not None and int(modified) <= since.timestamp()
+        return False
+
+    @staticmethod
+    def range_applies(request: Request, entity_tag: str,
+                      modified: float) -> bool:
+        condition: Optional[str] = request.headers.get('if-range')
+        if condition is None:
+            return True
+        if condition.startswith('"') or condition.startswith('W/'):
+            return condition == entity_tag
+        return condition == email.utils.formatdate(modified, usegmt=True)
+
+    @staticmethod
+    def parse_range(byte_range: str, size: int) -> Optional[Tuple[int, int]]:
+        # several ranges at once are not supported, only a single one
+        match = RANGE_PATTERN.match(byte_range.strip())
+        if match is None or match.group(1) == match.group(2) == '':
+            return None
+        if match.group(1) == '':
+            length: int = min(int(match.group(2)), size)
+            return (size - length, length) if length > 0 else None
+        start: int = int(match.group(1))
+        end: int = (min(int(match.group(2)), size - 1)
+                    if match.group(2) else size - 1)
+        if start >= size or end < start:
+            return None
+        return start, end - start + 1
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                try:
+                    request: Optional[Request] = await self.read_request(
+                        reader)
+                except ValueError:
+                    self.write_head(writer, 400, {'Content-Length': '0',
+                                                  'Connection': 'close'})
+                    break
+                if request is None:
+                    break
+
+                start: float = time.time()
+                status: int = await self.respond(request, writer)
+                await writer.drain()
+                print('%s - "%s %s" %d (%.1f ms)'
+                      % (peer[0] if peer else '-', request.method,
+                         request.target, status, 1000 * (time.time() - start)))
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def parse_mount(argument: str) -> Tuple[str, str]:
+    prefix, separator, directory = argument.rpartition('=')
+    if not separator:
+        prefix, directory = '/', argument
+    prefix = '/' + prefix.strip('/') + '/' if prefix.strip('/') else '/'
+    return prefix, os.path.realpath(directory)
+
+
+async def serve(server: Server, bind: str, port: int) -> None:
+    listener = await asyncio.start_server(server.handle, bind or None, port)
+    for prefix, directory in sorted(server.mounts):
+        print("Serving %s under http://%s:%d%s" % (directory,
+                                                   bind or 'localhost',
+                                                   port, prefix))
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serves one or more HTML directories written by Sphinx "
+                    "for a local preview.",
+    )
+    parser.add_argument('mounts',
+                        metavar='[prefix=]directory',
+                        nargs='+',
+                        help="Specify the HTML directories to serve, each "
+                             "optionally under its own path prefix.",
+                        )
+    parser.add_argument('-b', '--bind',
+                        metavar='address',
+                        default='',
+                        help="Specify the address to listen on, defaults to "
+                             "all interfaces.",
+                        )
+    parser.add_argument('-p', '--port',
+                        metavar='number',
+                        type=int,
+                        default=8000,
+                        help="Specify the port to listen on.",
+                        )
+    arguments = parser.parse_args()
+
+    mounts: List[Tuple[str, str]] = [parse_mount(argument)
+                                     for argument in arguments.mounts]
+    for _, directory in mounts:
+        if not os.path.isdir(directory):
+            parser.error("The directory '%s' does not exist." % directory)
+
+    try:
+        asyncio.run(serve(Server(mounts), arguments.bind, arguments.port))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
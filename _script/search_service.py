@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+
+"""
+Serves a full-text search across all built courses and editions as an HTTP
+service with a JSON API, e.g. for a learning management system. The inverted
+index is built from the doctrees of the builds and includes the meta data of
+each unit, which the rosin.Meta extension writes to `units.json` next to the
+doctrees, like its type, interaction, durations, levels, and scenarios. Parts
+of a document in an `only` directive are indexed only if they are part of the
+build.
+
+The course and the edition of a build are the names of its directories, e.g.
+`build/ros_basics/learner/doctrees` belongs to the course `ros_basics` and the
+edition `learner`. The builds are checked for changes periodically, and only
+changed doctrees are read again. The index is kept in a cache file, so a
+restarted service only reads the doctrees that changed in the meantime.
+
+Results are ranked by BM25, where words in titles count more. Units without
+levels or scenarios, e.g. the glossary, match every level or scenario.
+
+Example:
+```
+_script/search_service.py build --port 8001
+curl 'http://localhost:8001/search?q=topic&level=beginner&scenario=linux'
+_script/search_service.py build --query 'ros topic' --course ros_basics
+```
+
+The API knows the following requests:
+-  `/search?q=<words>` with the optional filters `course`, `edition`, `level`,
+   `scenario`, `type`, and `interaction`, as well as `limit` and `offset`
+-  `/status` with the number of documents and terms and the last update
+"""
+
+__author__ = "Meeßen, Marcus"
+__copyright__ = "Copyright (C) 2019-2020 MASCOR Institute"
+__version__ = "1.0"
+
+import argparse
+import glob
+import json
+import math
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from docutils import nodes
+from sphinx import addnodes
+from sphinx.search.en import SearchEnglish
+from sphinx.util.tags import Tags
+
+BM25_B: float = 0.75
+BM25_K1: float = 1.2
+CACHE_VERSION: int = 1
+DEFAULT_CACHE: str = os.path.join('build', 'cache', 'search_service.pickle')
+FILTERS: List[str] = ['course', 'edition', 'level', 'scenario', 'type',
+                      'interaction']
+SKIPPED_NODES: Tuple[type, ...] = (addnodes.meta, nodes.comment, nodes.raw,
+                                   nodes.system_message)
+SUMMARY_LENGTH: int = 240
+TITLE_WEIGHT: int = 3
+UNITS_FILE: str = 'units.json'
+
+language = SearchEnglish({})
+
+# the doctrees contain the nodes of the rosin extensions
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, '_extension'))
+
+# course, edition, and name of a document
+Key = Tuple[str, str, str]
+
+
+class Document(object):
+    __slots__ = ['key', 'path', 'stamp', 'title', 'summary', 'unit',
+                 'frequencies', 'length']
+
+    def __init__(self, key: Key, path: str, stamp: Tuple[int, ...],
+                 title: str, summary: str, unit: Dict[str, Any],
+                 frequencies: Dict[str, int]) -> None:
+        self.key: Key = key
+        self.path: str = path
+        self.stamp: Tuple[int, ...] = stamp
+        self.title: str = title
+        self.summary: str = summary
+        self.unit: Dict[str, Any] = unit
+        self.frequencies: Dict[str, int] = frequencies
+        self.length: int = sum(frequencies.values())
+
+    def matches(self, filters: Dict[str, str]) -> bool:
+        for name, value in filters.items():
+            if name == 'course' and self.key[0] != value:
+                return False
+            elif name == 'edition' and self.key[1] != value:
+                return False
+            elif name in ['level', 'scenario']:
+                values: List[str] = self.unit.get('%ss' % name, [])
+                if values and value not in values and 'all' not in values:
+                    return False
+            elif name in ['type', 'interaction'] and self.unit.get(
+                    name) != value:
+                return False
+
+        return True
+
+    def to_json(self, score: float) -> Dict[str, Any]:
+        return {
+            'score': round(score, 4),
+            'course': self.key[0],
+            'edition': self.key[1],
+            'document': self.key[2],
+            'title': self.title,
+            'path': self.path,
+            'summary': self.summary,
+            **{name: self.unit.get(name) for name in [
+                'type', 'interaction', 'durations', 'levels', 'scenarios',
+                'provides']},
+        }
+
+
+def terms(text: str) -> List[str]:
+    return [language.stem(word.lower()) for word in language.split(text)
+            if word.lower() not in language.stopwords
+            and language.word_filter(word)]
+
+
+def shown(node: nodes.Node, tags: Tags) -> bool:
+    if not isinstance(node, addnodes.only):
+        return True
+    try:
+        return tags.eval_condition(node['expr'])
+    except ValueError:
+        return True  # keep the content if in doubt
+
+
+def parents(node: nodes.Node) -> List[nodes.Node]:
+    ancestors: List[nodes.Node] = []
+    while node.parent is not None:
+        node = node.parent
+        ancestors.append(node)
+
+    return ancestors
+
+
+def collect_text(node: nodes.Node, tags: Tags, parts: List[str]) -> None:
+    if isinstance(node, SKIPPED_NODES) or not shown(node, tags):
+        return
+    if isinstance(node, nodes.Text):
+        parts.append(node.astext())
+    for child in node.children:
+        collect_text(child, tags, parts)
+
+
+def read_doctree(file_name: str, tags: Tags) -> Tuple[str, str, Counter]:
+    with open(file_name, 'rb') as file:
+        doctree: nodes.document = pickle.load(file)
+
+    # the title of the first section, not e.g. the one of the sidebar
+    title_node: nodes.title = doctree.next_node(
+        lambda node: isinstance(node, nodes.title)
+        and isinstance(node.parent, nodes.section))
+    title: str = title_node.astext() if title_node is not None else ''
+    parts: List[str] = []
+    collect_text(doctree, tags, parts)
+    frequencies: Counter = Counter(terms(' '.join(parts)))
+    for term in terms(title):
+        frequencies[term] += TITLE_WEIGHT - 1  # once as part of the text
+
+    # the summary starts with the first paragraph outside of the sidebar
+    summary: List[str] = [
+        paragraph.astext() for paragraph in doctree.traverse(nodes.paragraph)
+        if all(shown(parent, tags) and not isinstance(parent, nodes.sidebar)
+               for parent in parents(paragraph))]
+
+    return (title, ' '.join(' '.join(summary).split())[:SUMMARY_LENGTH],
+            frequencies)
+
+
+def stamp_of(file_name: str) -> Tuple[int, int]:
+    status = os.stat(file_name)
+    return status.st_mtime_ns, status.st_size
+
+
+class Index(object):
+    def __init__(self, roots: List[str], cache: Optional[str]) -> None:
+        self.roots: List[str] = roots
+        self.cache: Optional[str] = cache
+        self.documents: Dict[Key, Document] = {}
+        self.postings: Dict[str, Dict[Key, int]] = {}
+        self.total_length: int = 0
+        self.updated: float = 0.0
+        self.lock = threading.Lock()
+
+    def load(self) -> None:
+        if self.cache is None or not os.path.isfile(self.cache):
+            return
+        try:
+            with open(self.cache, 'rb') as file:
+                version, documents = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return
+        if version == CACHE_VERSION:
+            for document in documents:
+                self.add(document)
+
+    def save(self) -> None:
+        if self.cache is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache)),
+                    exist_ok=True)
+        temporary_file_name: str = '%s.%d.tmp' % (self.cache, os.getpid())
+        with open(temporary_file_name, 'wb') as file:
+            pickle.dump((CACHE_VERSION, list(self.documents.values())), file,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file_name, self.cache)
+
+    def add(self, document: Document) -> None:
+        self.remove(document.key)
+        self.documents[document.key] = document
+        self.total_length += document.length
+        for term, frequency in document.frequencies.items():
+            self.postings.setdefault(term, {})[document.key] = frequency
+
+    def remove(self, key: Key) -> None:
+        document: Document = self.documents.pop(key, None)
+        if document is None:
+            return
+        self.total_length -= document.length
+        for term in document.frequencies:
+            self.postings[term].pop(key, None)
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def scan(self) -> Dict[Key, Tuple[str, Tuple[int, ...], Dict[str, Any],
+                                      List[str], str]]:
+        """Finds the doctrees of all builds with their meta data."""
+        found: Dict[Key, Tuple[str, Tuple[int, ...], Dict[str, Any],
+                               List[str], str]] = {}
+        for root in self.roots:
+            for units_file_name in sorted(glob.glob(os.path.join(
+                    root, '**', 'doctrees', UNITS_FILE), recursive=True)):
+                doctree_directory: str = os.path.dirname(units_file_name)
+                edition_directory: str = os.path.dirname(doctree_directory)
+                edition: str = os.path.basename(edition_directory)
+                course: str = os.path.basename(os.path.dirname(
+                    edition_directory))
+                try:
+                    with open(units_file_name, 'r') as file:
+                        data: Dict[str, Any] = json.load(file)
+                    units_stamp: Tuple[int, int] = stamp_of(units_file_name)
+                except (OSError, ValueError):
+                    continue  # e.g. written right now
+                for doc, unit in data['units'].items():
+                    file_name: str = os.path.join(doctree_directory,
+                                                  '%s.doctree' % doc)
+                    if not os.path.isfile(file_name):
+                        continue
+                    # the tags of the build decide about `only` directives
+                    found[(course, edition, doc)] = (
+                        file_name, stamp_of(file_name) + units_stamp, unit,
+                        data['tags'], os.path.relpath(os.path.join(
+                            edition_directory, 'html', '%s.html' % doc),
+                            start=root).replace(os.sep, '/'))
+
+        return found
+
+    def update(self) -> Tuple[int, int]:
+        found = self.scan()
+        changed: List[Document] = []
+        for key, (file_name, stamp, unit, tags, path) in found.items():
+            document: Document = self.documents.get(key)
+            if document is not None and document.stamp == stamp:
+                continue
+            try:
+                title, summary, frequencies = read_doctree(file_name,
+                                                           Tags(tags))
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue  # read again with the next update
+            changed.append(Document(key, path, stamp, title, summary, unit,
+                                    frequencies))
+        removed: List[Key] = [key for key in self.documents
+                              if key not in found]
+
+        if changed or removed:
+            with self.lock:
+                for document in changed:
+                    self.add(document)
+                for key in removed:
+                    self.remove(key)
+            self.save()
+        self.updated = time.time()
+
+        return len(changed), len(removed)
+
+    def search(self, query: str, filters: Dict[str, str], limit: int,
+               offset: int) -> Dict[str, Any]:
+        start: float = time.perf_counter()
+        scores: Dict[Key, float] = {}
+        with self.lock:
+            count: int = len(self.documents)
+            average_length: float = self.total_length / max(1, count)
+            for term in set(terms(query)):
+                postings: Dict[Key, int] = self.postings.get(term, {})
+                idf: float = math.log(1 + (count - len(postings) + 0.5)
+                                      / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    document: Document = self.documents[key]
+                    if not document.matches(filters):
+                        continue
+                    scores[key] = scores.get(key, 0.0) + idf * (
+                        frequency * (BM25_K1 + 1)
+                        / (frequency + BM25_K1 * (
+                            1 - BM25_B + BM25_B * document.length
+                            / average_length)))
+            ranked: List[Tuple[Key, float]] = sorted(
+                scores.items(), key=lambda item: (-item[1], item[0]))
+            results: List[Dict[str, Any]] = [
+                self.documents[key].to_json(score)
+                for key, score in ranked[offset:offset + limit]]
+
+        return {
+            'query': query,
+            'filters': filters,
+            'total': len(ranked),
+            'results': results,
+            'milliseconds': round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'documents': len(self.documents),
+                'terms': len(self.postings),
+                'courses': sorted({key[0] for key in self.documents}),
+                'editions': sorted({key[1] for key in self.documents}),
+                'updated': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                         time.localtime(self.updated)),
+            }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    index: Index = None
+
+    def send_json(self, status: int, data: Any) -> None:
+        content: bytes = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(content)
+
+    # noinspection PyPep8Naming
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        parameters: Dict[str, str] = {name: values[-1] for name, values
+                                      in parse_qs(url.query).items()}
+        if url.path == '/search':
+            try:
+                limit: int = max(0, min(100, int(parameters.get('limit',
+                                                                10))))
+                offset: int = max(0, int(parameters.get('offset', 0)))
+            except ValueError:
+                self.send_json(400, {'error': "'limit' and 'offset' must be "
+                                              "integers."})
+                return
+            self.send_json(200, self.index.search(
+                parameters.get('q', ''),
+                {name: parameters[name] for name in FILTERS
+                 if parameters.get(name)},
+                limit, offset))
+        elif url.path == '/status':
+            self.send_json(200, self.index.status())
+        else:
+            self.send_json(404, {'error': "Unknown request, use '/search' or "
+                                          "'/status'."})
+
+    def log_message(self, message_format: str, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(message_format, *args)
+
+
+def watch(index: Index, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        changed, removed = index.update()
+        if changed or removed:
+            print("Updated %d and removed %d documents." % (changed, removed))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serves a ranked full-text search across all built "
+                    "courses and editions as JSON API.",
+    )
+    parser.add_argument('roots',
+                        metavar='directory',
+                        nargs='+',
+                        help="Specify the directories with the builds, e.g. "
+                             "'build'.",
+                        )
+    parser.add_argument('-b', '--bind',
+                        metavar='address',
+                        default='127.0.0.1',
+                        help="Specify the address to listen on.",
+                        )
+    parser.add_argument('-p', '--port',
+                        type=int,
+                        default=8001,
+                        help="Specify the port to listen on.",
+                        )
+    parser.add_argument('-i', '--interval',
+                        metavar='seconds',
+                        type=float,
+                        default=5.0,
+                        help="Specify how often the builds are checked for "
+                             "changes.",
+                        )
+    parser.add_argument('--cache',
+                        metavar='file',
+                        default=DEFAULT_CACHE,
+                        help="Specify the cache file of the index, defaults "
+                             "to '%s', or 'none'." % DEFAULT_CACHE,
+                        )
+    parser.add_argument('-q', '--query',
+                        metavar='words',
+                        help="Print the results of a single query as JSON "
+                             "instead of serving the API.",
+                        )
+    for name in FILTERS:
+        parser.add_argument('--%s' % name,
+                            help="Only search for units of the given %s."
+                                 % name,
+                            )
+    parser.add_argument('--quiet',
+                        action='store_true',
+                        help="Do not log every request.",
+                        )
+    arguments = parser.parse_args()
+
+    index = Index(arguments.roots,
+                  None if arguments.cache == 'none' else arguments.cache)
+    index.load()
+    start: float = time.perf_counter()
+    changed, removed = index.update()
+    print("Indexed %d documents in %.2f s, %d read again, %d removed."
+          % (len(index.documents), time.perf_counter() - start, changed,
+             removed), file=sys.stderr)
+
+    if arguments.query is not None:
+        print(json.dumps(index.search(
+            arguments.query,
+            {name: getattr(arguments, name) for name in FILTERS
+             if getattr(arguments, name)},
+            10, 0), ensure_ascii=False, indent=2))
+        return
+
+    RequestHandler.index = index
+    server = ThreadingHTTPServer((arguments.bind, arguments.port),
+                                 RequestHandler)
+    server.quiet = arguments.quiet
+    threading.Thread(target=watch, args=(index, arguments.interval),
+                     daemon=True).start()
+    print("Serving the search on http://%s:%d/search?q="
+          % server.server_address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
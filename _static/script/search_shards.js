@@ -0,0 +1,144 @@
+/*
+ * search_shards.js
+ * ~~~~~~~~~~~~~~~~
+ *
+ * Loads the shards of the search index, which are written by the rosin.Search
+ * extension, on demand. The search page loads only the base of the index, and
+ * each query loads the shards of its words first. While a word is typed into a
+ * search box, its shard is prefetched, so it is usually cached on submit.
+ *
+ * Copyright (C) 2019-2020 MASCOR Institute. All rights reserved.
+ */
+
+var SearchShards = {
+
+  // must match `PREFIX_LENGTH` of `search.py`
+  prefixLength : 2,
+
+  _callbacks : {},
+  _prefetched : {},
+
+  url : function(name) {
+    return DOCUMENTATION_OPTIONS.URL_ROOT + '_static/searchindex/' + name +
+      '.js';
+  },
+
+  key : function(word) {
+    return word.toLowerCase().substr(0, this.prefixLength)
+      .replace(/[^a-z0-9]/g, '_');
+  },
+
+  keys : function(query) {
+    var keys = [];
+    var stemmer = (typeof Stemmer !== 'undefined') ? new Stemmer() : null;
+    $.each(query.split(/\s+/), function(index, word) {
+      word = word.toLowerCase().replace(/^-/, '');
+      if (word === '')
+        return;
+      var words = [word];
+      if (stemmer !== null)
+        words.push(stemmer.stemWord(word));
+      $.each(words, function(index, word) {
+        var key = SearchShards.key(word);
+        if ($.inArray(key, keys) === -1)
+          keys.push(key);
+      });
+    });
+    return keys;
+  },
+
+  inject : function(url, success, failure) {
+    var script = document.createElement('script');
+    script.type = 'text/javascript';
+    script.src = url;
+    script.onload = success;
+    script.onerror = failure;
+    document.getElementsByTagName('head')[0].appendChild(script);
+  },
+
+  /**
+   * called by each shard to merge its terms into the loaded index
+   */
+  add : function(key, shard) {
+    $.each(['terms', 'titleterms'], function(index, kind) {
+      $.each(shard[kind], function(term, documents) {
+        Search._index[kind][term] = documents;
+      });
+    });
+  },
+
+  /**
+   * load the missing shards of the given keys, then call back once
+   */
+  load : function(keys, callback) {
+    var pending = 0;
+    function done() {
+      if (--pending === 0)
+        callback();
+    }
+    $.each(keys, function(index, key) {
+      var callbacks = SearchShards._callbacks[key];
+      if ($.inArray(key, Search._index.shards) === -1 || callbacks === true)
+        return;
+      pending++;
+      if (callbacks !== undefined) {
+        callbacks.push(done);
+        return;
+      }
+      // a shard that failed to load only lacks its terms in the results
+      SearchShards._callbacks[key] = [done];
+      function finish() {
+        var waiting = SearchShards._callbacks[key];
+        SearchShards._callbacks[key] = true;
+        $.each(waiting, function(index, next) { next(); });
+      }
+      SearchShards.inject(SearchShards.url(key), finish, finish);
+    });
+    if (pending === 0)
+      callback();
+  },
+
+  prefetch : function(name) {
+    if (this._prefetched[name])
+      return;
+    this._prefetched[name] = true;
+    $('<link rel="prefetch">').attr('href', this.url(name))
+      .appendTo('head');
+  }
+};
+
+$(function() {
+  $('input[name="q"]').on('focus', function() {
+    SearchShards.prefetch('base');
+  }).on('input', function() {
+    var words = this.value.split(/\s+/);
+    // the last word might still be incomplete, but its prefix is not
+    $.each(words, function(index, word) {
+      word = word.replace(/^-/, '');
+      if (word.length >= SearchShards.prefixLength ||
+          (word.length > 0 && index < words.length - 1))
+        SearchShards.prefetch(SearchShards.key(word));
+    });
+  });
+
+  if (typeof Search === 'undefined')
+    return;
+
+  // the base of the sharded index replaces `searchindex.js`, which is still
+  // loaded if the index of this build is not sharded
+  var loadIndex = Search.loadIndex;
+  Search.loadIndex = function(url) {
+    SearchShards.inject(SearchShards.url('base'), null, function() {
+      loadIndex.call(Search, url);
+    });
+  };
+
+  var query = Search.query;
+  Search.query = function(text) {
+    if (this._index.shards === undefined)
+      return query.call(this, text);
+    SearchShards.load(SearchShards.keys(text), function() {
+      query.call(Search, text);
+    });
+  };
+});
@@ -15,11 +15,19 @@ extensions = [
     'sphinx.ext.ifconfig',
     'sphinx.ext.mathjax',
     'sphinx.ext.todo',
-    'sphinxcontrib.rsvgconverter',
+    'rosin.assets',
     'rosin.didactic',
+    'rosin.fragment',
     'rosin.gui',
+    'rosin.memory',
     'rosin.meta',
+    'rosin.navigation',
+    'rosin.profiler',
+    'rosin.reader',
+    'rosin.resource',
     'rosin.ros_element',
+    'rosin.rsvg_cache',
+    'rosin.search',
 ]
 master_doc = 'index'
 templates_path = ['_template']
@@ -56,6 +64,7 @@ latex_elements = {
     'preamble': r'''
     \usepackage{fancyhdr}
     \setlength{\headheight}{36pt}
+    \providecommand{\rosinpagenumber}{\thepage}
     \makeatletter
       \pagestyle{normal}
       \fancypagestyle{normal}{
@@ -86,7 +95,7 @@ latex_elements = {
         }
         \fancyfoot[C,CO,CE]{%
           \centering%
-          \py@HeaderFamily\thepage%
+          \py@HeaderFamily\rosinpagenumber%
         }
         \fancyfoot[R,RO,RE]{%
           \includegraphics[height=.6cm]{../../_resource/image/logo/european_union.pdf}%
@@ -195,3 +204,10 @@ didactic_scenarios = {
     'universal_robots_ur5': "Universal Robots UR5",
     'yaskawa_sia10f': "YASKAWA SIA10F",
 }
+
+# Options for rosin.ROS_Element, the inventory of the taught ROS distribution
+ros_inventory = '_resource/data/ros_melodic.yaml'
+
+# Options for rosin.RSVG_Cache, shared by all builds and editions
+rsvg_cache_directory = 'build/cache/rsvg'
+rsvg_cache_size = 256 * 1024 * 1024